@@ -0,0 +1,47 @@
+"""
+Cost of one dispatcher tick when many cron schedules share a fire time.
+
+Loads N schedules into CronDispatcher (all "0 17 * * *" by default, plus a spread of other
+expressions), then fires the 17:00 slot once with a no-op submit. Compare with APScheduler's
+per-job path, which looks up, runs and updates every due job individually.
+
+    python benchmarks/bench_cron_dispatch.py --schedules 10000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytz
+from src.cron_dispatch import CronDispatcher
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--schedules", type=int, default=10000)
+    parser.add_argument("--other-expressions", type=int, default=50,
+                        help="Schedules in addition to the 17:00 ones, spread over distinct minutes")
+    args = parser.parse_args()
+
+    tz = pytz.timezone('Asia/Tokyo')
+    submitted = []
+    dispatcher = CronDispatcher(tz, submit=lambda fn, *a: submitted.append(a), run=lambda *a: None)
+    now = tz.localize(datetime(2025, 1, 6, 16, 59, 30))
+
+    entries = [(i, "0 17 * * *", (i,)) for i in range(args.schedules)]
+    entries += [(args.schedules + i, f"{i % 60} {i // 60 % 24} * * *", (args.schedules + i,)) for i in range(args.other_expressions)]
+    started = time.perf_counter()
+    dispatcher.load(entries, now=now)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    dispatcher.tick(now=now + timedelta(seconds=30))
+    tick_ms = (time.perf_counter() - started) * 1000
+
+    print(f"load {len(entries)} schedules: {load_ms:.1f} ms")
+    print(f"tick at 17:00: {tick_ms:.1f} ms, {len(submitted)} runs submitted, stats={dispatcher.stats()}")
+
+if __name__ == "__main__":
+    main()
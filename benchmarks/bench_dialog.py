@@ -0,0 +1,115 @@
+"""
+Wall time of a multi-question voice dialog, sequential vs pipelined, from recorded answers.
+
+Each answer WAV (16-bit mono) is played into the recognizer at real-time pace when its question
+has been asked, followed by silence, the way a microphone would hear it. TTS is the real
+pyttsx3 engine, or simulated with --fake-tts SYNTH_SECONDS PLAY_SECONDS. Needs Vosk and its model.
+
+    python benchmarks/bench_dialog.py ans1.wav ans2.wav ans3.wav --timeout 8
+    python benchmarks/bench_dialog.py ans1.wav ans2.wav --fake-tts 0.8 1.5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+class RecordedAnswers:
+    """Audio source that starts the next recorded answer on every drain() (= every new question)."""
+    def __init__(self, paths, block_frames=4000):
+        self.answers = []
+        for path in paths:
+            with wave.open(path, "rb") as wav:
+                self.sample_rate = wav.getframerate()
+                self.answers.append(wav.readframes(wav.getnframes()))
+        self._block_bytes = block_frames * 2
+        self._index = -1
+        self._pos = 0
+        self._started = time.monotonic()
+
+    @property
+    def speaking_seconds(self):
+        return sum(len(a) for a in self.answers) / 2 / self.sample_rate
+
+    def start(self):
+        return self
+
+    def drain(self):
+        self._index += 1
+        self._pos = 0
+        self._started = time.monotonic()
+
+    def read(self, timeout):
+        available_at = self._started + (self._pos + self._block_bytes) / 2 / self.sample_rate
+        delay = available_at - time.monotonic()
+        if delay > timeout:
+            time.sleep(max(timeout, 0))
+            return b""
+        if delay > 0:
+            time.sleep(delay)
+        answer = self.answers[self._index] if self._index < len(self.answers) else b""
+        block = answer[self._pos:self._pos + self._block_bytes]
+        # Silence once the answer is over
+        block += b"\x00" * (self._block_bytes - len(block))
+        self._pos += self._block_bytes
+        return block
+
+    def close(self):
+        pass
+
+def install_fake_tts(tts, dialog, synth_seconds, play_seconds):
+    class FakeEngine:
+        def setProperty(self, name, value):
+            pass
+        def save_to_file(self, text, path):
+            self._path = path
+        def runAndWait(self):
+            time.sleep(synth_seconds)
+            with wave.open(self._path, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(16000)
+                wav.writeframes(b"\x00" * 3200)
+    tts._engine = FakeEngine()
+    import src.audio
+    src.audio.play_file = lambda path: time.sleep(play_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("answers", nargs="+", help="One recorded answer (WAV) per question")
+    parser.add_argument("--timeout", type=float, default=8)
+    parser.add_argument("--fake-tts", nargs=2, type=float, metavar=("SYNTH_SECONDS", "PLAY_SECONDS"))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_dialog_")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    os.environ["VOICE_JOURNAL_DIR"] = os.path.join(tmp, "journal")
+    import db
+    from models import Schedule
+    from src.voice import dialog, tts, stt
+    db.init_db()
+    with db.SessionLocal() as session:
+        session.add(Schedule(description="bench", interval_minutes=60))
+        session.commit()
+    if args.fake_tts:
+        install_fake_tts(tts, dialog, *args.fake_tts)
+    recognizer = stt.StreamingRecognizer()  # loaded once, outside the measurement
+
+    prompts = [f"質問{i + 1}" for i in range(len(args.answers))]
+    print(f"{len(prompts)} questions, {RecordedAnswers(args.answers).speaking_seconds:.1f}s of speech, "
+          f"sum of timeouts {args.timeout * len(prompts):.0f}s")
+    for label, pipelined in (("sequential", False), ("pipelined", True)):
+        # Fresh TTS cache per mode so neither benefits from the other's renders
+        tts._cache = tts.TTSCache(os.path.join(tmp, f"tts_{label}"))
+        source = RecordedAnswers(args.answers)
+        started = time.perf_counter()
+        answers = dialog.run_voice_dialog(1, prompts, timeout=args.timeout, audio_source=source,
+                                          pipelined=pipelined, recognizer=recognizer)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<12}{elapsed:>8.1f}s  {list(answers.values())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Diffed, batched Graph Excel writes vs one full PATCH per sheet, against a local mock Graph.
+
+The mock keeps every workbook in memory and applies PATCH range(address=...) requests, sent
+directly or inside $batch, throttling a share of the batched ones with 429. Each round
+appends rows to every sheet and updates a few scattered cells, like a daily report log; the
+run reports HTTP requests, request bytes and time per round, and checks that the mock ends
+up with exactly the expected values.
+
+    python benchmarks/bench_graph_excel.py --files 5 --sheets 3 --rows 200 --cols 20
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.graph_excel import GraphExcelWriter
+from src.http_client import get_client, GRAPH
+
+RANGE_RE = re.compile(r"/me/drive/root:/(?P<file>[^:]+):/workbook/worksheets/(?P<sheet>[^/]+)/range\(address='(?P<address>[A-Z0-9:]+)'\)")
+CELL_RE = re.compile(r"([A-Z]+)(\d+)")
+
+
+def _parse_cell(cell):
+    letters, row = CELL_RE.fullmatch(cell).groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord("A") + 1
+    return int(row) - 1, col - 1
+
+
+class MockGraph(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    workbooks = {}
+    lock = threading.Lock()
+    requests = 0
+    bytes_received = 0
+    throttle_rate = 0.0
+
+    def _apply(self, url, body):
+        match = RANGE_RE.search(url)
+        if not match:
+            return 404
+        top, left = _parse_cell(match["address"].split(":")[0])
+        with MockGraph.lock:
+            sheet = MockGraph.workbooks.setdefault((unquote(match["file"]), unquote(match["sheet"])), {})
+            for r, row in enumerate(body["values"]):
+                for c, value in enumerate(row):
+                    sheet[(top + r, left + c)] = value
+        return 200
+
+    def _read(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with MockGraph.lock:
+            MockGraph.requests += 1
+            MockGraph.bytes_received += len(raw)
+        return json.loads(raw)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PATCH(self):
+        self._reply(self._apply(self.path, self._read()), {})
+
+    def do_POST(self):
+        if not self.path.endswith("/$batch"):
+            return self._reply(404, {})
+        responses = []
+        failed = set()
+        for request in self._read()["requests"]:
+            if failed.intersection(request.get("dependsOn", [])):
+                status = 424
+            elif random.random() < MockGraph.throttle_rate:
+                status = 429
+            else:
+                status = self._apply(request["url"], request["body"])
+            if status != 200:
+                failed.add(request["id"])
+            responses.append({"id": request["id"], "status": status, "headers": {"Retry-After": "0"} if status == 429 else {}})
+        self._reply(200, {"responses": responses})
+
+    def log_message(self, *args):
+        pass
+
+
+def expected_cells(values):
+    return {(r, c): v for r, row in enumerate(values) for c, v in enumerate(row) if v != ""}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--sheets", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--append-rows", type=int, default=5)
+    parser.add_argument("--updates", type=int, default=10, help="Scattered cell updates per sheet and round")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Share of batched requests answered with 429")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(1)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGraph)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1.0"
+    sheets = [(f"reports/team{f}.xlsx", f"Sheet{s}") for f in range(args.files) for s in range(args.sheets)]
+
+    def rounds():
+        data = {sheet: [[f"{r}-{c}" for c in range(args.cols)] for r in range(args.rows)] for sheet in sheets}
+        for _ in range(args.rounds):
+            for values in data.values():
+                for _ in range(args.updates):
+                    values[random.randrange(len(values))][random.randrange(args.cols)] = f"v{random.random():.6f}"
+                for _ in range(args.append_rows):
+                    values.append([f"n{len(values)}-{c}" for c in range(args.cols)])
+            yield {sheet: [list(row) for row in values] for sheet, values in data.items()}
+
+    def full_patch(sheet, values):
+        url = f"{base_url}/me/drive/root:/{sheet[0]}:/workbook/worksheets/{sheet[1]}/range(address='A1')"
+        get_client(GRAPH).patch(url, json={"values": values}).raise_for_status()
+
+    writer = GraphExcelWriter(token_provider=lambda: "mock-token", base_url=base_url, sleep=lambda s: None)
+    for label in ("full", "diffed"):
+        MockGraph.workbooks.clear()
+        MockGraph.requests = MockGraph.bytes_received = 0
+        MockGraph.throttle_rate = args.throttle_rate if label == "diffed" else 0.0
+        started = time.perf_counter()
+        for data in rounds():
+            for sheet, values in data.items():
+                if label == "full":
+                    full_patch(sheet, values)
+                else:
+                    writer.queue(sheet[0], sheet[1], values)
+            if label == "diffed":
+                writer.flush()
+        elapsed = time.perf_counter() - started
+        ok = all(
+            {cell: v for cell, v in MockGraph.workbooks.get(sheet, {}).items() if v != ""} == expected_cells(values)
+            for sheet, values in data.items()
+        )
+        print(f"{label:>6}: {MockGraph.requests / args.rounds:.1f} requests/round, "
+              f"{MockGraph.bytes_received / args.rounds / 1024:.1f} KiB/round, "
+              f"{elapsed / args.rounds * 1000:.1f} ms/round, final sheets {'match' if ok else 'DIFFER'}")
+    print(f"writer stats: {writer.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Pooled, retrying IntegrationClient vs bare requests.post against a local stub server.
+
+The stub (HTTP/1.1 with keep-alive) answers every --fail-every-th request with 429 +
+Retry-After (or 503), so the run shows both the saved connection setup and the retries.
+Bare requests.post opens a new connection per call and gives up on the first error.
+
+    python benchmarks/bench_http_client.py --requests 500 --fail-every 50
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from src.http_client import IntegrationClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs add ~40 ms per keep-alive request
+    disable_nagle_algorithm = True
+    counter = 0
+    connections = 0
+    lock = threading.Lock()
+    fail_every = 0
+    fail_status = 429
+    retry_after = "0.05"
+
+    def setup(self):
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with StubHandler.lock:
+            StubHandler.counter += 1
+            fail = StubHandler.fail_every and StubHandler.counter % StubHandler.fail_every == 0
+        body = b'{"ok": false}' if fail else b'{"ok": true}'
+        self.send_response(StubHandler.fail_status if fail else 200)
+        if fail and StubHandler.fail_status == 429:
+            self.send_header("Retry-After", StubHandler.retry_after)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, post, url, count):
+    StubHandler.counter = StubHandler.connections = 0
+    failures = 0
+    started = time.perf_counter()
+    for i in range(count):
+        try:
+            post(url, json={"text": f"message {i}"}).raise_for_status()
+        except requests.RequestException:
+            failures += 1
+    elapsed = time.perf_counter() - started
+    print(f"{label:>8}: {elapsed / count * 1000:.2f} ms/request, {StubHandler.connections} connections, "
+          f"{failures} failed, {StubHandler.counter} requests seen by the server")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--fail-every", type=int, default=50, help="0 disables injected failures")
+    parser.add_argument("--fail-status", type=int, default=429, choices=(429, 500, 502, 503, 504))
+    args = parser.parse_args()
+
+    # One warning per retry otherwise
+    logging.getLogger("src.http_client").setLevel(logging.ERROR)
+    StubHandler.fail_every = args.fail_every
+    StubHandler.fail_status = args.fail_status
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    run("bare", lambda u, **kw: requests.post(u, timeout=5, **kw), url, args.requests)
+    client = IntegrationClient("stub", backoff_base=0.01)
+    run("pooled", client.post, url, args.requests)
+    print(f"client stats: {client.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Startup import time of src.app, with a budget to catch regressions.
+
+Imports the app in a fresh interpreter under `python -X importtime` (in a scratch directory
+with its own databases), reports the cumulative import time of src.app and the slowest
+top-level imports, and fails (exit code 1) when the time exceeds --budget-ms or when a module
+that should only load on first use (integrations, msal, requests, openpyxl, ...) was imported.
+
+    python benchmarks/bench_import_time.py --budget-ms 1500
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Must not be imported by `import src.app`; see src/integrations.py
+LAZY_MODULES = (
+    "src.ms_teams", "src.google_forms", "src.graph_excel", "src.voice.dialog", "src.voice.matcher",
+    "msal", "requests", "openpyxl", "vosk", "pyttsx3",
+)
+LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure():
+    """Returns ({module: cumulative_us}, [(cumulative_us, module)] of top-level imports)."""
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ,
+                   PYTHONPATH=ROOT,
+                   DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'app.db')}",
+                   SCHEDULER_JOBSTORE_URL=f"sqlite:///{os.path.join(scratch, 'jobs.sqlite')}",
+                   VOICE_WARMUP="false")
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import src.app"],
+                                cwd=scratch, env=env, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        sys.exit(f"import src.app failed:\n{result.stderr[-2000:]}")
+    cumulative, top_level = {}, []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        _, total, indent, module = match.groups()
+        cumulative[module] = int(total)
+        if len(indent) == 3:  # imported directly by src.app
+            top_level.append((int(total), module))
+    return cumulative, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.repeat)]
+    cumulative, top_level = min(runs, key=lambda run: run[0].get("src.app", 0))
+    app_ms = cumulative.get("src.app", 0) / 1000
+    print(f"import src.app: {app_ms:.0f} ms (budget {args.budget_ms:.0f} ms, best of {args.repeat})")
+    for total, module in sorted(top_level, reverse=True)[:args.top]:
+        print(f"  {total / 1000:8.1f} ms  {module}")
+
+    eager = [module for module in LAZY_MODULES if module in cumulative]
+    if eager:
+        print(f"FAIL: imported at startup but should load on first use: {', '.join(eager)}")
+    if app_ms > args.budget_ms:
+        print(f"FAIL: over budget by {app_ms - args.budget_ms:.0f} ms")
+    sys.exit(1 if eager or app_ms > args.budget_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Lookup cost of OptionMatcher for large option lists.
+
+Builds a question with N options ("オプション{i}番目の選択肢"), then maps recognized answers that
+differ from their option in script (hiragana instead of katakana) and one character, and
+reports the mean lookup time and how many answers mapped to the intended option.
+
+    python benchmarks/bench_matcher.py --options 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.voice.matcher import OptionMatcher
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--options", type=int, default=5000)
+    parser.add_argument("--answers", type=int, default=1000)
+    args = parser.parse_args()
+
+    options = [f"オプション{i}番目の選択肢" for i in range(args.options)]
+    started = time.perf_counter()
+    matcher = OptionMatcher(options)
+    print(f"index: {args.options} options in {time.perf_counter() - started:.2f}s")
+
+    step = max(1, args.options // args.answers)
+    answers = [(i, f"おぷしょん{i}番目の選択し") for i in range(0, args.options, step)]
+    correct = 0
+    started = time.perf_counter()
+    for i, text in answers:
+        match = matcher.match(text)
+        correct += match is not None and match.value == options[i]
+    elapsed = time.perf_counter() - started
+    print(f"match: {elapsed / len(answers) * 1000:.3f} ms/answer, {correct}/{len(answers)} mapped correctly")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Concurrent read/write throughput of the SQLite engine profiles in db.py.
+
+Writers insert ReportHistory rows one transaction at a time (the pre-batching completion path),
+readers fetch history pages the way /api/report_history does. Each profile runs against a fresh
+database file.
+
+    python benchmarks/bench_sqlite.py --seconds 5 --writers 4 --readers 8
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.orm import sessionmaker
+from db import Base, create_db_engine
+from models import Schedule, ReportHistory
+
+SCENARIOS = [
+    # (label, profile, echo) - "before" mirrors the old engine: SQLite defaults and echo=True
+    ("before (legacy, echo)", "legacy", True),
+    ("after (production)", "production", False),
+]
+
+def run_scenario(profile: str, echo: bool, seconds: float, writers: int, readers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile=profile, echo=echo)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            session.add_all(Schedule(description=f"bench {i}", interval_minutes=5) for i in range(20))
+            session.commit()
+
+        counts = {"writes": 0, "reads": 0, "errors": 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def writer(worker_id):
+            n = 0
+            while not stop.is_set():
+                try:
+                    with Session() as session:
+                        session.add(ReportHistory(schedule_id=(worker_id + n) % 20 + 1))
+                        session.commit()
+                    key = "writes"
+                except Exception:
+                    key = "errors"
+                n += 1
+                with lock:
+                    counts[key] += 1
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    with Session() as session:
+                        (session.query(ReportHistory.id, ReportHistory.completed_at, Schedule.description)
+                         .join(Schedule, ReportHistory.schedule_id == Schedule.id)
+                         .order_by(ReportHistory.completed_at.desc(), ReportHistory.id.desc())
+                         .limit(100).all())
+                    key = "reads"
+                except Exception:
+                    key = "errors"
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+    return {key: value / elapsed for key, value in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+
+    # Keep echo output off the terminal while still paying for its formatting
+    echo_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    echo_logger.addHandler(logging.FileHandler(os.devnull))
+
+    print(f"{args.writers} writers / {args.readers} readers, {args.seconds:.0f}s per scenario")
+    print(f"{'scenario':<24}{'writes/s':>12}{'reads/s':>12}{'errors/s':>12}")
+    for label, profile, echo in SCENARIOS:
+        result = run_scenario(profile, echo, args.seconds, args.writers, args.readers)
+        print(f"{label:<24}{result['writes']:>12.1f}{result['reads']:>12.1f}{result['errors']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+CPU use and latency of speech recognition on recorded answers.
+
+Feeds a 16-bit mono WAV at real-time pace (like a microphone) and compares the old polling loop
+(`while True: if not q.empty(): ...`) with the blocking-queue StreamingRecognizer. Reports wall
+time, CPU time and the delay between the end of the audio and the final result.
+
+    python benchmarks/bench_stt.py answer.wav --timeout 8
+    python benchmarks/bench_stt.py answer.wav --recognizer null   # waiting overhead only, no Vosk model
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.voice.stt import PcmSource, StreamingRecognizer, _load_model
+
+class NullRecognizer:
+    """KaldiRecognizer stand-in that never detects an utterance end."""
+    def AcceptWaveform(self, data):
+        return False
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+    def Result(self):
+        return json.dumps({"text": ""})
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+    def Reset(self):
+        pass
+
+def make_recognizer(kind, sample_rate):
+    if kind == "null":
+        return NullRecognizer()
+    from vosk import KaldiRecognizer
+    return KaldiRecognizer(_load_model(), sample_rate)
+
+def run_polling(args, source):
+    """The previous listen(): audio callback -> queue, main thread polls q.empty()."""
+    rec = make_recognizer(args.recognizer, source.sample_rate)
+    q = queue.Queue()
+
+    def feed():
+        while True:
+            block = source.read(1.0)
+            if block is None:
+                return
+            if block:
+                q.put(block)
+
+    threading.Thread(target=feed, daemon=True).start()
+    start_time = time.time()
+    while True:
+        if not q.empty():
+            if rec.AcceptWaveform(q.get()):
+                return json.loads(rec.Result()).get("text", "")
+        if time.time() - start_time > args.timeout:
+            return json.loads(rec.FinalResult()).get("text", "")
+
+def run_streaming(args, source):
+    recognizer = StreamingRecognizer(recognizer=make_recognizer(args.recognizer, source.sample_rate))
+    return recognizer.recognize(source, timeout=args.timeout)
+
+def measure(label, fn, args):
+    source = PcmSource.from_wav(args.wav, realtime=True).start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    text = fn(args, source)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    latency = wall - source.duration
+    print(f"{label:<12}{wall:>9.2f}{cpu:>9.2f}{cpu / wall * 100:>8.0f}%{latency:>12.2f}  {text!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("wav", help="16-bit mono WAV with a recorded answer")
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--recognizer", choices=["vosk", "null"], default="vosk")
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'wall s':>9}{'cpu s':>9}{'cpu':>9}{'latency s':>12}  text")
+    measure("polling", run_polling, args)
+    measure("streaming", run_streaming, args)
+
+if __name__ == "__main__":
+    main()
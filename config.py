@@ -1,44 +1,217 @@
 from dotenv import load_dotenv, dotenv_values
+import logging
 import os
+import re
+import threading
 from db import SessionLocal
-from models import ServiceConfig
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env
 load_dotenv()
 
+DOTENV_PATH = ".env"
+# Seconds between checks of the .env modification time by Settings.watch (0 = no hot reload)
+SETTINGS_RELOAD_INTERVAL_SECONDS = float(os.getenv("SETTINGS_RELOAD_INTERVAL_SECONDS", "5"))
+
+
+class SettingsError(ValueError):
+    """Raised when a .env value does not have the expected type or format."""
+
+
+def _url(value: str) -> str:
+    if not re.match(r"https?://", value):
+        raise ValueError("expected an http(s) URL")
+    return value
+
+
+def _path(value: str) -> str:
+    return os.path.abspath(os.path.expanduser(value))
+
+
+def _entry_id(value: str) -> str:
+    if not re.fullmatch(r"entry\.\d+", value):
+        raise ValueError("expected a form entry ID like entry.123456789")
+    return value
+
+
+# Typed settings: key -> (parser, default). Empty values count as unset. Keys not listed here
+# are still available as plain strings (settings.SOME_KEY).
+SETTINGS_SCHEMA = {
+    "TEAMS_WEBHOOK_URL": (_url, None),
+    "GOOGLE_FORM_ID": (str, None),
+    "MS_CLIENT_ID": (str, None),
+    "MS_TENANT_ID": (str, None),
+    "MS_CLIENT_SECRET": (str, None),
+    "EXCEL_BASE_PATH": (str, None),
+    "EXCEL_FILE_PATH": (str, None),
+    "PORT": (int, 5001),
+    "VOSK_MODEL_PATH": (str, "models/vosk-model-small-ja-0.22"),
+    "VOSK_SAMPLE_RATE": (int, 16000),
+}
+GOOGLE_ENTRY_PREFIX = "GOOGLE_ENTRY"
+
+
+class _Snapshot:
+    """One parsed and validated version of the .env file (replaced as a whole on reload)."""
+    def __init__(self, raw: dict, mtime_ns: int):
+        self.raw = raw
+        self.mtime_ns = mtime_ns
+        self.values = dict(raw)
+        errors = []
+        for key, (parse, default) in SETTINGS_SCHEMA.items():
+            value = raw.get(key)
+            try:
+                self.values[key] = parse(value.strip()) if value and value.strip() else default
+            except ValueError as e:
+                errors.append(f"{key}={value!r}: {e}")
+        # Derived values, computed once per load
+        self.google_entry_ids = {}
+        for key, value in raw.items():
+            if key.startswith(GOOGLE_ENTRY_PREFIX) and value and value.strip():
+                try:
+                    self.google_entry_ids[key] = _entry_id(value.strip())
+                except ValueError as e:
+                    errors.append(f"{key}={value!r}: {e}")
+        base_path = self.values["EXCEL_BASE_PATH"]
+        self.excel_base_path = _path(base_path) if base_path else None
+        if errors:
+            raise SettingsError("Invalid settings in .env: " + "; ".join(errors))
+
+
 class Settings:
     """
     Load key-value pairs from .env into attributes
+
+    Parsed and validated once (SETTINGS_SCHEMA gives known keys their types and defaults) and
+    re-read only when the file's modification time changes (reload_if_changed / watch).
+    Values are read at call time, so code using settings.X picks up a reload; os.getenv
+    tuning knobs read at import still need a restart.
     """
-    def __init__(self, dotenv_path: str = ".env"):
-        self._config = dotenv_values(dotenv_path)
-        for key, value in self._config.items():
-            setattr(self, key, value)
+    def __init__(self, dotenv_path: str = DOTENV_PATH):
+        self.dotenv_path = dotenv_path
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._watcher = None
+        self._snapshot = self._load()
+
+    def _mtime_ns(self) -> int:
+        try:
+            return os.stat(self.dotenv_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _load(self) -> _Snapshot:
+        mtime_ns = self._mtime_ns()
+        raw = dotenv_values(self.dotenv_path) if mtime_ns else {}
+        return _Snapshot(raw, mtime_ns)
+
+    def __getattr__(self, name: str):
+        # Only called for names that are not regular attributes
+        values = self.__dict__.get("_snapshot")
+        if values is not None and name in values.values:
+            return values.values[name]
+        raise AttributeError(f"Setting '{name}' is not defined")
 
     def dict(self):
-        return self._config
+        return dict(self._snapshot.raw)
+
+    # --- Derived values ---
+    @property
+    def excel_base_path(self):
+        """EXCEL_BASE_PATH resolved to an absolute path (None if unset)."""
+        return self._snapshot.excel_base_path
+
+    @property
+    def google_entry_ids(self) -> dict:
+        """{'GOOGLE_ENTRY_1': 'entry.123456', ...} for every non-empty GOOGLE_ENTRY_* key."""
+        return self._snapshot.google_entry_ids
+
+    # --- Hot reload ---
+    def reload_if_changed(self) -> bool:
+        """Re-reads .env if its modification time changed. An invalid file keeps the old values."""
+        with self._lock:
+            if self._mtime_ns() == self._snapshot.mtime_ns:
+                return False
+            try:
+                self._snapshot = self._load()
+            except SettingsError as e:
+                logger.error(f"{e} - keeping the previous settings.")
+                return False
+            listeners = list(self._listeners)
+        logger.info(f"Reloaded settings from {self.dotenv_path}.")
+        for listener in listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error(f"Settings reload listener failed: {e}", exc_info=True)
+        return True
+
+    def on_reload(self, listener):
+        """Registers listener(settings), called after each successful reload."""
+        with self._lock:
+            self._listeners.append(listener)
+        return listener
+
+    def watch(self, interval: float = SETTINGS_RELOAD_INTERVAL_SECONDS):
+        """Starts a daemon thread polling the .env modification time (once; no-op if interval <= 0)."""
+        if interval <= 0 or self._watcher is not None:
+            return
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=run, name="settings-watcher", daemon=True)
+        self._watcher.start()
+
 
 # Instantiate settings
 settings = Settings()
 
-# Prepare list of ServiceConfig objects from .env entries (excluding DATABASE_URL)
-SERVICE_CONFIGS = [
-    ServiceConfig(service_name=key, config_json=value)
-    for key, value in settings.dict().items()
-    if key.upper() != "DATABASE_URL"
-]
+
+def service_config_rows() -> list:
+    """ServiceConfig rows for the .env entries (excluding DATABASE_URL)."""
+    return [
+        {"service_name": key, "config_json": value}
+        for key, value in settings.dict().items()
+        if key.upper() != "DATABASE_URL" and value is not None
+    ]
+
 
 def init_service_configs():
     """
-    Insert SERVICE_CONFIGS into database if not already present
+    Upsert the .env entries into service_configs in one statement
     """
+    from models import ServiceConfig
+    rows = service_config_rows()
+    if not rows:
+        return
     session = SessionLocal()
-    for sc in SERVICE_CONFIGS:
-        exists = session.query(ServiceConfig).filter_by(service_name=sc.service_name).first()
-        if not exists:
-            session.add(sc)
-    session.commit()
-    session.close()
+    try:
+        dialect = session.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            statement = insert(ServiceConfig).values(rows)
+            session.execute(statement.on_conflict_do_update(
+                index_elements=[ServiceConfig.service_name],
+                set_={"config_json": statement.excluded.config_json},
+            ))
+        else:
+            # No portable upsert: one SELECT of the existing names, then bulk insert / update
+            existing = {name: id_ for id_, name in session.query(ServiceConfig.id, ServiceConfig.service_name)}
+            session.bulk_insert_mappings(ServiceConfig, [r for r in rows if r["service_name"] not in existing])
+            session.bulk_update_mappings(ServiceConfig, [
+                {"id": existing[r["service_name"]], "config_json": r["config_json"]}
+                for r in rows if r["service_name"] in existing
+            ])
+        session.commit()
+    finally:
+        session.close()
 
 if __name__ == "__main__":
     # Initialize DB tables and seed service_configs
@@ -47,5 +220,5 @@ if __name__ == "__main__":
     init_db()
     init_service_configs()
     # Print service names from .env settings instead of detached ORM instances
-    service_names = [key for key in settings.dict().keys() if key.upper() != "DATABASE_URL"]
-    print("Service configs initialized:", service_names)
\ No newline at end of file
+    service_names = [row["service_name"] for row in service_config_rows()]
+    print("Service configs initialized:", service_names)
@@ -1,15 +1,113 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Database URL from environment or default to local SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///app.db")
 
+# SQLite PRAGMAs applied to every new connection, per engine profile.
+# "production": WAL so readers never block behind the writer, NORMAL sync (safe with WAL),
+# a busy timeout instead of immediate "database is locked", and larger page/mmap caches.
+# "legacy": SQLite defaults, kept for comparison (see benchmarks/bench_sqlite.py).
+ENGINE_PROFILES = {
+    "production": {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        # Negative value = size in KiB
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+        "temp_store": "MEMORY",
+    },
+    "legacy": {},
+}
+ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "production")
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+def create_db_engine(database_url: str = DATABASE_URL, profile: str = ENGINE_PROFILE, echo: bool = None):
+    """
+    Builds the SQLAlchemy engine for the given profile.
+
+    SQL echo is off unless DB_ECHO is set. File-based SQLite databases get a connection pool
+    sized for the Flask request threads plus APScheduler workers (DB_POOL_SIZE / DB_MAX_OVERFLOW).
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DB_ENGINE_PROFILE '{profile}'. Expected one of: {', '.join(ENGINE_PROFILES)}")
+    if echo is None:
+        echo = _env_flag("DB_ECHO")
+
+    engine_kwargs = {"echo": echo, "future": True, "pool_pre_ping": True}
+    is_sqlite = database_url.startswith("sqlite")
+    is_memory = is_sqlite and (":memory:" in database_url or database_url.rstrip("/") == "sqlite:")
+    if is_sqlite:
+        # Connections are handed between Flask and scheduler threads by the pool
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+    if not is_memory and profile != "legacy":
+        engine_kwargs["pool_size"] = int(os.getenv("DB_POOL_SIZE", "10"))
+        engine_kwargs["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        engine_kwargs["pool_timeout"] = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+    new_engine = create_engine(database_url, **engine_kwargs)
+
+    pragmas = ENGINE_PROFILES[profile]
+    if is_sqlite and pragmas:
+        @event.listens_for(new_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    return new_engine
+
 # SQLAlchemy engine and session
-engine = create_engine(DATABASE_URL, echo=True, future=True)
+engine = create_db_engine()
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
+def add_missing_columns(table, bind=None) -> list:
+    """
+    create_all() does not alter existing tables: adds the columns a model has gained since the
+    table was created (plain nullable columns, no constraints) and creates its missing indexes.
+    Returns the names of the added columns.
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    added = []
+    with bind.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(column.name)
+    for index in table.indexes:
+        index.create(bind=bind, checkfirst=True)
+    return added
+
+def normalize_sqlite_timestamps(column, bind=None) -> int:
+    """
+    SQLite keeps DateTime columns as text: server-default timestamps (CURRENT_TIMESTAMP) have no
+    fraction, while SQLAlchemy writes microseconds, so equal instants compare unequal. Rewrites
+    the short form to SQLAlchemy's so the column compares (and sorts) like the datetimes it holds.
+    Returns the number of rows changed.
+    """
+    bind = bind or engine
+    table = column.table
+    if bind.dialect.name != "sqlite" or not inspect(bind).has_table(table.name):
+        return 0
+    with bind.begin() as connection:
+        result = connection.execute(text(
+            f"UPDATE {table.name} SET {column.name} = {column.name} || '.000000' WHERE length({column.name}) = 19"
+        ))
+    return result.rowcount
+
 def init_db():
     # Import all models to ensure they are registered with Base
     import models  # noqa
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from db import Base
 import datetime
@@ -19,6 +19,8 @@ class Schedule(Base):
     cron_expr = Column(String, nullable=True)
     interval_minutes = Column(Integer, nullable=False, default=0)
     excel_path = Column(String, nullable=True) # Path to the local Excel file
+    excel_resolved_path = Column(String, nullable=True) # excel_path resolved against EXCEL_BASE_PATH
+    excel_missing_since = Column(DateTime, nullable=True) # Set while the Excel file cannot be found
     google_form_url = Column(String, nullable=True) # Google Form URL to open
     next_run_time = Column(DateTime, nullable=True)
     last_run_time = Column(DateTime, nullable=True)
@@ -68,6 +70,28 @@ class TeamsPost(Base):
     posted_at = Column(DateTime, server_default=func.now())
     status = Column(String, default="SUCCESS")
 
+class OutboxMessage(Base):
+    """Outgoing message waiting for (or done with) delivery by the outbox dispatcher."""
+    __tablename__ = "outbox_messages"
+    id = Column(Integer, primary_key=True, index=True)
+    schedule_id = Column(Integer, ForeignKey("schedules.id", ondelete="CASCADE"), nullable=False)
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="SET NULL"), nullable=True)
+    channel_type = Column(String, nullable=False, default="teams")
+    channel_name = Column(String, nullable=False)
+    destination = Column(Text, nullable=False)  # webhook URL
+    message = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="PENDING")  # PENDING / SENDING / SENT / FAILED
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        # The dispatcher polls for due PENDING rows
+        Index('ix_outbox_messages_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
 class TPEntry(Base):
     __tablename__ = "tp_entries"
     id = Column(Integer, primary_key=True, index=True)
@@ -95,6 +119,20 @@ class FormSubmission(Base):
     payload_json = Column(Text, nullable=False)
     submitted_at = Column(DateTime, server_default=func.now())
     status = Column(String, default="SUCCESS")
+    # Submission queue (see src/form_queue.py); columns added later, so nullable for old rows
+    idempotency_key = Column(String)
+    queued_at = Column(DateTime)
+    next_attempt_at = Column(DateTime)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    latency_ms = Column(Integer)
+
+    __table_args__ = (
+        Index('ux_form_submissions_idempotency_key', 'idempotency_key', unique=True),
+        # The sender polls for due PENDING rows
+        Index('ix_form_submissions_status_next_attempt', 'status', 'next_attempt_at'),
+        Index('ix_form_submissions_schedule_id', 'schedule_id'),
+    )
 
 class ReportHistory(Base):
     __tablename__ = 'report_history'
@@ -104,5 +142,12 @@ class ReportHistory(Base):
     completed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     schedule = relationship("Schedule")
 
+    __table_args__ = (
+        # Keyset pagination of /api/report_history: filtered by schedule or unfiltered,
+        # both ordered by (completed_at, id). SQLite appends the rowid (= id) to every index.
+        Index('ix_report_history_schedule_completed', 'schedule_id', 'completed_at'),
+        Index('ix_report_history_completed_at', 'completed_at'),
+    )
+
     def __repr__(self):
         return f"<ReportHistory(schedule_id={self.schedule_id}, completed_at='{self.completed_at.isoformat()}')>"
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
 import sys
+import atexit
 import logging
 logger = logging.getLogger(__name__)
 
@@ -9,21 +10,43 @@ load_dotenv()
 # ensure project root in path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from flask import Flask, render_template, jsonify, request, abort
+from flask import Flask, render_template, jsonify, request, abort, Response, stream_with_context, redirect
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.base import JobLookupError
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from db import SessionLocal, engine, Base
-from models import Schedule, ReportHistory
-from .jobs import play_alert_sound, open_local_file, open_google_form
+from db import SessionLocal, engine, Base, add_missing_columns, normalize_sqlite_timestamps
+from models import Schedule, ReportHistory, FormSubmission
 from config import settings
 from . import jobs # Import the jobs module
+from . import events
+from . import sse
+from .sse import SSEBroker, SSEServer, TooManyClients, parse_last_event_id
+from .completion_writer import CompletionWriter, WRITTEN, UNKNOWN_SCHEDULE, SPOOLED
+from .next_run_index import NextRunIndex
+from .executor import get_action_executor
+from .audio import get_audio_service
+from . import http_client
+from . import integrations
+from . import excel_paths
+from .outbox import OutboxDispatcher
+from .form_queue import FormSubmissionSender, schedule_stats as form_submission_stats
+from .voice.warmup import warmup as voice_warmup
+from .voice.journal import recover_journals
+from .cron_dispatch import CronDispatcher, parse_cron_expr, preview_fire_times
+from .job_sync import BatchingSQLAlchemyJobStore, JobFingerprintStore, schedule_fingerprint, schedule_id_from_job_id, is_current_layout, report_job_id
 import pytz # Add pytz import
 import datetime # Ensure datetime is imported
-# from flask_sse import sse # Import the sse blueprint
-import json # Import json for SSE data
+import time
+import json
+import base64
+import csv
+from urllib.parse import urlsplit
+import io
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Logging Setup (Revised) ---
 # Configure root logger - good for general messages outside app context
@@ -34,6 +57,14 @@ root_logger = logging.getLogger()
 
 # --- Database Setup ---
 Base.metadata.create_all(bind=engine)
+# create_all() skips indexes of tables that already exist, so add newer ones explicitly
+for index in ReportHistory.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+# ... and never adds columns: form_submissions gained the submission queue columns
+add_missing_columns(FormSubmission.__table__, engine)
+add_missing_columns(Schedule.__table__, engine)
+# History pages compare completed_at against the cursor: one text format for every row
+normalize_sqlite_timestamps(ReportHistory.completed_at, engine)
 
 # --- App Configuration ---
 # Get the base directory of the current file (src)
@@ -70,245 +101,330 @@ else:
 # Use app.logger for application-specific logs
 logger = app.logger 
 
-# --- Configure and Register SSE --- #
-# If using Redis, configure the URL
-# app.config["REDIS_URL"] = "redis://localhost" # Uncomment and adjust if you have Redis
-# If not using Redis (using filesystem or in-memory, not recommended for production but ok for dev):
-# app.config["SSE_STORAGE"] = "filesystem" # Or "memory" (less persistent)
-# app.config["SSE_LISTENERS_PATH"] = "_sse_listeners" # Directory for filesystem storage
-
-# Ensure the listener directory exists if using filesystem storage
-# if app.config.get("SSE_STORAGE") == "filesystem":
-#     listeners_path = os.path.join(app.root_path, '..', app.config["SSE_LISTENERS_PATH"])
-#     os.makedirs(listeners_path, exist_ok=True)
-#     logger.info(f"Ensured SSE listener directory exists: {listeners_path}")
-
-# app.register_blueprint(sse, url_prefix='/stream') # Register the SSE blueprint
+# --- Server-Sent Events --- #
+# In-memory broker (no Redis); see /stream below
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_STREAM_SECONDS = float(os.getenv("SSE_MAX_STREAM_SECONDS", "300"))
+sse_broker = SSEBroker(
+    history_size=int(os.getenv("SSE_HISTORY_SIZE", "256")),
+    client_queue_size=int(os.getenv("SSE_CLIENT_QUEUE_SIZE", "64")),
+    max_clients=int(os.getenv("SSE_MAX_CLIENTS", "1000")),
+)
+# Port of the single-thread SSE server (empty: serve /stream from the WSGI threads instead)
+SSE_PORT = os.getenv("SSE_PORT", "5002")
+sse_server = None
+if SSE_PORT:
+    sse_server = SSEServer(sse_broker, host=os.getenv("SSE_HOST", "127.0.0.1"), port=int(SSE_PORT),
+                           heartbeat_seconds=SSE_HEARTBEAT_SECONDS)
+    try:
+        sse_server.start()
+        atexit.register(sse_server.stop)
+    except OSError as e:
+        logger.error(f"Could not start the SSE server on port {SSE_PORT}: {e}. /stream falls back to WSGI threads.")
+        sse_server = None
 
 # --- APScheduler Setup ---
+# The job store is persistent: jobs survive restarts and reconcile_jobs() only touches
+# schedules that changed while the app was down.
+jobstore = BatchingSQLAlchemyJobStore(url=os.getenv("SCHEDULER_JOBSTORE_URL", "sqlite:///jobs.sqlite"))
 jobstores = {
-    'default': SQLAlchemyJobStore(url='sqlite:///jobs.sqlite')
+    'default': jobstore,
+    # Runtime-only jobs that are rebuilt at every startup (cron dispatcher tick)
+    'runtime': MemoryJobStore(),
+}
+job_fingerprints = JobFingerprintStore(jobstore.engine)
+
+job_defaults = {
+    # Run a job that missed several fire times (e.g. while the app was down) only once
+    'coalesce': os.getenv("SCHEDULER_COALESCE", "true").lower() in ("1", "true", "yes", "on"),
+    # Still run a job up to this many seconds late; later misfires are skipped
+    'misfire_grace_time': int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "300")),
+    'max_instances': 1,
 }
-# Define the job store file path
-jobstore_path = 'jobs.sqlite' # Assuming it's in the root directory relative to where app runs
-
-# --- Ensure Clean Scheduler Start ---
-# Delete the existing jobstore file before starting the scheduler
-if os.path.exists(jobstore_path):
-    try:
-        os.remove(jobstore_path)
-        logger.info(f"Removed existing jobstore file: {jobstore_path}")
-    except OSError as e:
-        logger.error(f"Error removing jobstore file {jobstore_path}: {e}")
 
 # Timezoneを設定してSchedulerを初期化
-scheduler = BackgroundScheduler(jobstores=jobstores, timezone=pytz.timezone('Asia/Tokyo'))
-
-scheduler.start()
-logger.info("Scheduler started.")
+scheduler = BackgroundScheduler(jobstores=jobstores, job_defaults=job_defaults, timezone=pytz.timezone('Asia/Tokyo'))
+
+# Start paused: persisted jobs must not fire before reconcile_jobs() has removed stale ones
+scheduler.start(paused=True)
+logger.info("Scheduler started (paused until job reconciliation).")
+
+# Next run time per schedule, maintained by scheduler listeners (used by GET /api/schedules)
+next_run_index = NextRunIndex()
+next_run_index.attach(scheduler, jobstore)
+
+# Cron schedules are not individual APScheduler jobs: they live in a timing wheel that a single
+# per-minute tick job dispatches, so schedules sharing a fire time cost one wakeup.
+cron_run_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CRON_DISPATCH_WORKERS", "10")), thread_name_prefix="cron-run")
+cron_dispatcher = CronDispatcher(
+    timezone=scheduler.timezone,
+    submit=cron_run_pool.submit,
+    run=jobs.run_report,
+    misfire_grace_seconds=job_defaults['misfire_grace_time'],
+    on_next_run=next_run_index.set,
+)
+scheduler.add_job(
+    cron_dispatcher.tick,
+    trigger=CronTrigger(second=0, timezone=scheduler.timezone),
+    id="cron_dispatcher_tick",
+    name="Cron schedule dispatcher",
+    jobstore='runtime',
+    replace_existing=True,
+)
 
 # --- Helper Functions for Job Management ---
-def add_or_update_jobs_for_schedule(db_schedule: Schedule):
-    """Adds or updates APScheduler jobs based on the Schedule object.
+def add_or_update_jobs_for_schedule(db_schedule: Schedule, fingerprint_updates: dict = None):
+    """Adds, updates or removes the composite report job of a Schedule.
+
+    One job per schedule runs all configured actions (alert sound, Excel, Google Form)
+    in a fixed order; see jobs.run_report. Batch callers pass fingerprint_updates to collect
+    the job fingerprints and store them in one go with job_fingerprints.apply().
 
     Returns:
         bool: True if all operations were successful, False otherwise.
     """
     logger.info(f"Processing jobs for schedule {db_schedule.id} ('{db_schedule.description}')")
+    if db_schedule.cron_expr:
+        return _register_cron_schedule(db_schedule, fingerprint_updates)
+    cron_dispatcher.remove(db_schedule.id)
+
     # Use IntervalTrigger for interval-based scheduling
     if not db_schedule.interval_minutes or db_schedule.interval_minutes <= 0:
         logger.warning(f"Schedule {db_schedule.id} has invalid interval_minutes: {db_schedule.interval_minutes}. Skipping job scheduling.")
-        # Decide if this case should be treated as success or failure for the caller
-        # Let's assume it's a configuration issue, but not a scheduling *failure* per se.
-        # If the schedule is active, perhaps it should be treated as failure?
-        # For now, let's return True as the function itself didn't fail, but log a warning.
+        # A configuration issue, not a scheduling *failure*; the caller treats it as success.
         return True
 
-    trigger = IntervalTrigger(minutes=db_schedule.interval_minutes)
-    # trigger_args is no longer needed
-
-    # 各ジョブIDを定義
-    form_job_id = f"schedule_{db_schedule.id}_google_form"
-    excel_job_id = f"schedule_{db_schedule.id}_excel"
-    sound_job_id = f"schedule_{db_schedule.id}_alert_sound"
-
-    # Google Form URL と Excel Path を取得
-    form_url_to_schedule = db_schedule.google_form_url
-    excel_path_to_schedule = db_schedule.excel_path
+    job_id = report_job_id(db_schedule.id)
     success = True # Track overall success
 
-    # --- Google Form ジョブの処理 ---
-    existing_form_job = scheduler.get_job(form_job_id)
-    if db_schedule.is_active and form_url_to_schedule:
-        logger.info(f"Scheduling/Updating Google Form job '{form_job_id}' for schedule {db_schedule.id} with URL: '{form_url_to_schedule}'")
+    if db_schedule.is_active:
+        logger.info(f"Scheduling/Updating report job '{job_id}' for schedule {db_schedule.id} (Excel: '{db_schedule.excel_path}', Form: '{db_schedule.google_form_url}')")
         try:
             scheduler.add_job(
-                jobs.open_google_form, # Use imported module
-                trigger=trigger,
-                id=form_job_id,
-                name=f"Open Google Form for {db_schedule.description or db_schedule.id}",
+                jobs.run_report, # Use imported module
+                trigger=IntervalTrigger(minutes=db_schedule.interval_minutes),
+                id=job_id,
+                name=f"Report run for {db_schedule.description or db_schedule.id}",
                 replace_existing=True,
-                # Pass schedule_id FIRST, then the URL
-                args=[db_schedule.id, form_url_to_schedule]
-                # **trigger_args <- REMOVED
+                # Pass schedule_id FIRST, then the path and URL
+                args=[db_schedule.id, db_schedule.excel_path, db_schedule.google_form_url]
             )
-            logger.info(f"Successfully scheduled/updated Google Form job '{form_job_id}'")
+            logger.info(f"Successfully scheduled/updated report job '{job_id}'")
         except Exception as e:
-            logger.error(f"Failed to schedule/update Google Form job '{form_job_id}': {e}", exc_info=True)
+            logger.error(f"Failed to schedule/update report job '{job_id}': {e}", exc_info=True)
             success = False # Mark as failed
-    elif existing_form_job:
-        logger.info(f"Removing existing Google Form job '{form_job_id}' for schedule {db_schedule.id} (inactive or URL removed)")
+    else:
+        logger.info(f"Removing report job '{job_id}' for schedule {db_schedule.id} (inactive)")
         try:
-            scheduler.remove_job(form_job_id)
-            logger.info(f"Successfully removed Google Form job '{form_job_id}'")
+            scheduler.remove_job(job_id)
+            logger.info(f"Successfully removed report job '{job_id}'")
         except JobLookupError:
-            logger.warning(f"Tried to remove Google Form job '{form_job_id}', but it was not found.")
+            logger.info(f"No action needed for report job '{job_id}' (schedule inactive and no existing job).")
         except Exception as e:
-            logger.error(f"Failed to remove Google Form job '{form_job_id}': {e}", exc_info=True)
-            success = False # Mark as failed
-    else:
-         logger.info(f"No action needed for Google Form job '{form_job_id}' (schedule inactive or no URL, and no existing job).")
-
-    # --- Excelファイルジョブの処理 ---
-    existing_excel_job = scheduler.get_job(excel_job_id)
-    if db_schedule.is_active and excel_path_to_schedule:
-         logger.info(f"Scheduling/Updating Excel job '{excel_job_id}' for schedule {db_schedule.id} with path: '{excel_path_to_schedule}'")
-         try:
-             scheduler.add_job(
-                jobs.open_local_file, # Use imported module
-                trigger=trigger,
-                id=excel_job_id,
-                name=f"Open Excel for {db_schedule.description or db_schedule.id}",
-                replace_existing=True,
-                # Pass schedule_id FIRST, then the path
-                args=[db_schedule.id, excel_path_to_schedule] 
-                # **trigger_args <- REMOVED
-             )
-             logger.info(f"Successfully scheduled/updated Excel job '{excel_job_id}'")
-         except Exception as e:
-            logger.error(f"Failed to schedule/update Excel job '{excel_job_id}': {e}", exc_info=True)
+            logger.error(f"Failed to remove report job '{job_id}': {e}", exc_info=True)
             success = False # Mark as failed
-    elif existing_excel_job:
-         logger.info(f"Removing existing Excel job '{excel_job_id}' for schedule {db_schedule.id} (inactive or path removed)")
-         try:
-             scheduler.remove_job(excel_job_id)
-             logger.info(f"Successfully removed Excel job '{excel_job_id}'")
-         except JobLookupError:
-             logger.warning(f"Tried to remove Excel job '{excel_job_id}', but it was not found.")
-         except Exception as e:
-             logger.error(f"Failed to remove Excel job '{excel_job_id}': {e}", exc_info=True)
-             success = False # Mark as failed
-    else:
-         logger.info(f"No action needed for Excel job '{excel_job_id}' (schedule inactive or no path, and no existing job).")
 
-    # --- アラート音ジョブの処理 ---
-    existing_sound_job = scheduler.get_job(sound_job_id)
-    if db_schedule.is_active:
-         logger.info(f"Scheduling/Updating Alert Sound job '{sound_job_id}' for schedule {db_schedule.id}")
-         try:
-             scheduler.add_job(
-                 jobs.play_alert_sound, # Use imported module
-                 trigger=trigger,
-                 id=sound_job_id,
-                 name=f"Alert Sound for {db_schedule.description or db_schedule.id}",
-                 replace_existing=True,
-                 args=[db_schedule.id] # Pass the schedule ID
-                 # **trigger_args <- REMOVED
-             )
-             logger.info(f"Successfully scheduled/updated Alert Sound job '{sound_job_id}'")
-         except Exception as e:
-            logger.error(f"Failed to schedule/update Alert Sound job '{sound_job_id}': {e}", exc_info=True)
-            success = False # Mark as failed
-    elif existing_sound_job:
-         logger.info(f"Removing existing Alert Sound job '{sound_job_id}' for schedule {db_schedule.id} (inactive)")
-         try:
-             scheduler.remove_job(sound_job_id)
-             logger.info(f"Successfully removed Alert Sound job '{sound_job_id}'")
-         except JobLookupError:
-             logger.warning(f"Tried to remove Alert Sound job '{sound_job_id}', but it was not found.")
-         except Exception as e:
-             logger.error(f"Failed to remove Alert Sound job '{sound_job_id}': {e}", exc_info=True)
-             success = False # Mark as failed
-    else:
-        logger.info(f"No action needed for Alert Sound job '{sound_job_id}' (schedule inactive and no existing job).")
+    # Remember what was registered so the next startup can skip this schedule if unchanged
+    if success:
+        fingerprint = schedule_fingerprint(db_schedule) if db_schedule.is_active else None
+        if fingerprint_updates is not None:
+            fingerprint_updates[db_schedule.id] = fingerprint
+            return success
+        try:
+            job_fingerprints.apply({db_schedule.id: fingerprint})
+        except Exception as e:
+            # Only costs a redundant re-registration at the next startup
+            logger.error(f"Failed to store job fingerprint for schedule {db_schedule.id}: {e}", exc_info=True)
 
     return success # Return the overall success status
 
-def remove_jobs_for_schedule(schedule_id: int):
-    """Removes APScheduler jobs associated with a schedule ID."""
-    form_job_id = f"schedule_{schedule_id}_google_form"
-    excel_job_id = f"schedule_{schedule_id}_excel"
-    sound_job_id = f"schedule_{schedule_id}_alert_sound"
+def _register_cron_schedule(db_schedule: Schedule, fingerprint_updates: dict = None) -> bool:
+    """Moves a cron schedule into the timing wheel (or out of it when inactive) and drops any interval job."""
+    # The wheel is in memory; no APScheduler job (and so no fingerprint) exists for cron schedules
+    remove_jobs_for_schedule(db_schedule.id, fingerprint_updates, keep_cron=True)
+    if not db_schedule.is_active:
+        cron_dispatcher.remove(db_schedule.id)
+        return True
     try:
-        scheduler.remove_job(form_job_id)
-        logger.info(f"Removed Google Form job {form_job_id}")
-    except JobLookupError:
-        pass
-    except Exception as e:
-        logger.error(f"Error removing Google Form job {form_job_id}: {e}")
-
+        cron_dispatcher.set(db_schedule.id, db_schedule.cron_expr, [db_schedule.id, db_schedule.excel_path, db_schedule.google_form_url])
+        logger.info(f"Schedule {db_schedule.id} dispatched by cron '{db_schedule.cron_expr}' (next: {cron_dispatcher.next_fire_time(db_schedule.id)})")
+        return True
+    except ValueError as e:
+        logger.error(f"Invalid cron expression for schedule {db_schedule.id}: {e}")
+        return False
+
+def remove_jobs_for_schedule(schedule_id: int, fingerprint_updates: dict = None, keep_cron: bool = False):
+    """Removes the APScheduler job (and cron dispatch entry) associated with a schedule ID."""
+    if not keep_cron:
+        cron_dispatcher.remove(schedule_id)
+    job_id = report_job_id(schedule_id)
     try:
-        scheduler.remove_job(excel_job_id)
-        logger.info(f"Removed Excel job {excel_job_id}")
+        scheduler.remove_job(job_id)
+        logger.info(f"Removed report job {job_id}")
     except JobLookupError:
         pass
     except Exception as e:
-        logger.error(f"Error removing Excel job {excel_job_id}: {e}")
+        logger.error(f"Error removing report job {job_id}: {e}")
 
+    if fingerprint_updates is not None:
+        fingerprint_updates[schedule_id] = None
+        return
     try:
-        scheduler.remove_job(sound_job_id)
-        logger.info(f"Removed Alert Sound job {sound_job_id}")
-    except JobLookupError:
-        pass
+        job_fingerprints.delete([schedule_id])
     except Exception as e:
-        logger.error(f"Error removing Alert Sound job {sound_job_id}: {e}")
+        logger.error(f"Failed to delete job fingerprint for schedule {schedule_id}: {e}")
 
 
-# --- Initial Job Scheduling (on startup) ---
-def schedule_initial_jobs():
-    """Loads active schedules from DB and schedules them using IntervalTrigger."""
-    logger.info("Scheduling initial jobs from database...")
+# --- Job Reconciliation (on startup) ---
+def reconcile_jobs():
+    """Diffs the persistent job store against the schedules table and applies only the changes.
+
+    Schedules whose fingerprint matches the stored one are left untouched, so startup cost
+    scales with the number of changed schedules rather than the total.
+    """
+    started = time.perf_counter()
+    logger.info("Reconciling scheduler jobs with the schedules table...")
     db = SessionLocal()
-    schedules_added = 0
-    schedules_failed = 0
     try:
         # Load active schedules that have a positive interval_minutes value
-        active_schedules = db.query(Schedule).filter(Schedule.is_active == True, Schedule.interval_minutes > 0).all()
-        logger.info(f"Found {len(active_schedules)} active schedules with intervals in the database for initial scheduling.")
-        for db_schedule in active_schedules:
-             if add_or_update_jobs_for_schedule(db_schedule):
-                 schedules_added += 1
-             else:
-                 # Error already logged in add_or_update_jobs_for_schedule
-                 schedules_failed += 1
-    except Exception as e:
-        logger.error(f"Error during initial job scheduling: {e}", exc_info=True)
-        schedules_failed = -1 # Indicate overall failure
+        active_schedules = db.query(Schedule).filter(
+            Schedule.is_active == True, or_(Schedule.interval_minutes > 0, Schedule.cron_expr.isnot(None))
+        ).all()
     finally:
         db.close()
-        logger.info(f"Initial job scheduling complete. Success: {schedules_added}, Failed: {schedules_failed if schedules_failed >= 0 else 'N/A (Error)'}")
+
+    # Cron schedules go to the in-memory timing wheel, which is rebuilt on every start
+    cron_schedules = [s for s in active_schedules if s.cron_expr]
+    valid_cron = []
+    for s in cron_schedules:
+        try:
+            parse_cron_expr(s.cron_expr, scheduler.timezone)
+            valid_cron.append((s.id, s.cron_expr, [s.id, s.excel_path, s.google_form_url]))
+        except ValueError as e:
+            logger.error(f"Schedule {s.id} has an invalid cron expression '{s.cron_expr}': {e}")
+
+    desired = {s.id: s for s in active_schedules if not s.cron_expr}
+    current = job_fingerprints.load()
+    stale_ids = set(current) - set(desired)
+    changed = [s for schedule_id, s in desired.items() if current.get(schedule_id) != schedule_fingerprint(s)]
+
+    fingerprint_updates = {}
+    failed = 0
+    with jobstore.batch():
+        for schedule_id in stale_ids:
+            remove_jobs_for_schedule(schedule_id, fingerprint_updates)
+        for db_schedule in changed:
+            if not add_or_update_jobs_for_schedule(db_schedule, fingerprint_updates):
+                # Error already logged in add_or_update_jobs_for_schedule
+                failed += 1
+    job_fingerprints.apply(fingerprint_updates)
+    # After the stale-job removal above, which also clears wheel entries
+    cron_dispatcher.load(valid_cron)
+
+    if not current or not all(is_current_layout(fp) for fp in current.values()):
+        # First run with a persistent store, or jobs created by an older job layout:
+        # scan the store once and drop every job that is not a current report job.
+        wanted_job_ids = {report_job_id(schedule_id) for schedule_id in desired}
+        for job in scheduler.get_jobs():
+            if job.id not in wanted_job_ids and schedule_id_from_job_id(job.id) is not None:
+                scheduler.remove_job(job.id)
+                logger.info(f"Removed outdated job '{job.id}'")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(
+        f"Job reconciliation complete in {elapsed_ms:.0f} ms: {len(desired)} active schedules, "
+        f"{len(changed) - failed} added/updated, {failed} failed, {len(stale_ids)} removed, "
+        f"{len(desired) - len(changed)} unchanged, {len(valid_cron)} cron schedules in the dispatcher."
+    )
+
+
+# --- Event Bus Subscribers ---
+# Scheduled jobs in this process publish on events.bus; the HTTP endpoints below are only
+# for jobs running in another process.
+def handle_alert_triggered(schedule_id: int):
+    """Receives alert notifications from jobs and forwards them to the frontend."""
+    logger.info(f"Alert triggered for schedule_id {schedule_id}")
+    event_id = sse_broker.publish(sse.ALERT_TRIGGERED, {"schedule_id": schedule_id})
+    logger.info(f"Published SSE event 'alert_triggered' (id {event_id}) for schedule_id {schedule_id}")
+
+def publish_completions(committed):
+    """Called by the completion writer after each group commit."""
+    for schedule_id, history_id in committed:
+        sse_broker.publish(sse.REPORT_COMPLETED, {"schedule_id": schedule_id, "history_id": history_id})
+
+# Group-commits ReportHistory inserts instead of one transaction per completion
+completion_writer = CompletionWriter(
+    SessionLocal,
+    flush_interval_ms=int(os.getenv("COMPLETION_FLUSH_INTERVAL_MS", "200")),
+    max_batch_size=int(os.getenv("COMPLETION_MAX_BATCH_SIZE", "100")),
+    spool_path=os.getenv("COMPLETION_SPOOL_PATH", "completion_spool.jsonl"),
+    on_committed=publish_completions,
+)
+completion_writer.start()
+atexit.register(completion_writer.stop)
+# Let queued actions go; running ones finish on their own threads
+atexit.register(lambda: get_action_executor().shutdown(wait=False))
+atexit.register(http_client.close_all)
+
+# Teams reminders are queued by the jobs and sent from this thread only
+outbox_dispatcher = OutboxDispatcher(SessionLocal)
+events.bus.subscribe(events.OUTBOX_ENQUEUED, outbox_dispatcher.wakeup)
+outbox_dispatcher.start()
+atexit.register(outbox_dispatcher.stop)
+
+# Google Form submissions are queued by the jobs and posted from this thread only
+form_sender = FormSubmissionSender(SessionLocal)
+events.bus.subscribe(events.FORM_SUBMISSION_ENQUEUED, form_sender.wakeup)
+form_sender.start()
+atexit.register(form_sender.stop)
+
+# Excel paths are resolved when schedules are saved; this thread notices files that disappear
+excel_path_cache = excel_paths.get_cache(SessionLocal)
+events.bus.subscribe(events.EXCEL_PATHS_CHANGED,
+                     lambda schedule_ids: sse_broker.publish(sse.SCHEDULE_CHANGED, {"schedule_ids": schedule_ids, "action": "excel_path"}))
+excel_path_cache.start()
+atexit.register(excel_path_cache.stop)
+
+# Pick up .env edits (webhook URL, form IDs, paths, ...) without a restart
+settings.watch()
+
+def record_report_completion(schedule_id: int) -> bool:
+    """Queues a ReportHistory row for the schedule. Subscribed to events.REPORT_COMPLETED.
+
+    Returns immediately; the row is written with the next batch of the completion writer.
+    """
+    logger.info(f"Queueing report completion for schedule_id: {schedule_id}")
+    completion_writer.submit(schedule_id)
+    return True
+
+# Outcome of the most recent report run per schedule ({action: outcome}), shown in /api/schedules
+last_run_outcomes = {}
+
+def handle_report_run_finished(schedule_id: int, outcomes: dict):
+    last_run_outcomes[schedule_id] = {
+        "finished_at": datetime.datetime.utcnow().isoformat() + 'Z',
+        "actions": outcomes,
+    }
+
+events.bus.subscribe(events.REPORT_COMPLETED, record_report_completion)
+events.bus.subscribe(events.ALERT_TRIGGERED, handle_alert_triggered)
+events.bus.subscribe(events.REPORT_RUN_FINISHED, handle_report_run_finished)
 
 
 # --- Internal API Endpoints (Not for direct user access) ---
 @app.route('/internal/notify_alert/<int:schedule_id>', methods=['POST'])
 def notify_alert_triggered(schedule_id):
-    """Internal endpoint called by jobs.py when an alert sound plays.
-       Publishes an SSE event to notify the frontend.
-    """
+    """Internal endpoint for out-of-process workers when an alert sound plays."""
     logger.info(f"Received internal notification: Alert triggered for schedule_id {schedule_id}")
-    # Publish an event named 'alert_triggered' with the schedule_id
-    # sse.publish({"schedule_id": schedule_id}, type='alert_triggered')
-    # logger.info(f"Published SSE event 'alert_triggered' for schedule_id {schedule_id}")
-    logger.warning(f"SSE functionality is temporarily disabled. Skipping SSE publish for schedule {schedule_id}.")
-    return jsonify({"status": "success", "message": "SSE disabled"}), 200
+    if not events.bus.publish(events.ALERT_TRIGGERED, schedule_id=schedule_id):
+        return jsonify({"status": "error", "message": "Failed to handle alert notification"}), 500
+    return jsonify({"status": "success"}), 200
 
 @app.route('/internal/mark_report_action_completed/<int:schedule_id>', methods=['POST'])
 def internal_mark_completed(schedule_id):
-    """Internal endpoint called by scheduled jobs after actions complete."""
+    """Internal endpoint for out-of-process workers after actions complete."""
     logger.info(f"Internal request received to mark report action completed for schedule_id: {schedule_id}")
-    # Call the existing function, but handle its boolean return value
-    success = mark_report_completed(schedule_id) 
-    if success:
+    if events.bus.publish(events.REPORT_COMPLETED, schedule_id=schedule_id):
         logger.info(f"Internal mark completed successful for schedule_id: {schedule_id}")
         return jsonify({"status": "success"}), 200
     else:
@@ -327,46 +443,105 @@ def index():
 def history_page():
     return render_template('history.html')
 
+@app.route('/stream')
+def stream():
+    """Server-Sent Events stream for the dashboard (alert_triggered, report_completed, schedule_changed)."""
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    if sse_server is not None and sse_server.running:
+        # Streams are served by the SSE server thread; this request only hands the client over.
+        # The browser reconnects to /stream, so Last-Event-ID is passed on in the URL.
+        host = urlsplit(request.host_url).hostname
+        if ':' in host:
+            host = f"[{host}]"
+        query = f"?last_event_id={last_event_id}" if last_event_id is not None else ""
+        return redirect(f"http://{host}:{sse_server.port}/stream{query}", code=307)
+    try:
+        body = sse_broker.stream(
+            last_event_id=last_event_id,
+            heartbeat_seconds=SSE_HEARTBEAT_SECONDS,
+            max_duration_seconds=SSE_MAX_STREAM_SECONDS,
+        )
+    except TooManyClients as e:
+        logger.warning(f"Rejecting SSE connection: {e}")
+        response = jsonify({"error": "Too many open event streams"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    response = Response(body, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/schedules', methods=['GET'])
 def get_schedules():
-    """Returns a list of all schedules."""
+    """Returns a list of all schedules.
+
+    Next run times come from the in-memory index (no job store lookups). The response carries
+    an ETag, so a polling dashboard gets 304 Not Modified while nothing has changed.
+    """
     db = SessionLocal()
     try:
         schedules = db.query(Schedule).order_by(Schedule.id).all()
-        return jsonify([
-            {
+        schedule_list = []
+        for s in schedules:
+            next_run_time = next_run_index.get(s.id) if s.is_active else None
+            schedule_list.append({
                 'id': s.id,
                 'description': s.description,
                 'interval_minutes': s.interval_minutes,
+                'cron_expr': s.cron_expr,
                 'is_active': s.is_active,
-                'next_run_time': scheduler.get_job(f"schedule_{s.id}_alert_sound").next_run_time.isoformat() if s.is_active and scheduler.get_job(f"schedule_{s.id}_alert_sound") else None,
+                'next_run_time': next_run_time.isoformat() if next_run_time else None,
                 'last_run_time': s.last_run_time.isoformat() if s.last_run_time else None,
                 'excel_path': s.excel_path,
-                'google_form_url': s.google_form_url
-            }
-            for s in schedules
-        ])
+                'excel_missing_since': s.excel_missing_since.isoformat() if s.excel_missing_since else None,
+                'google_form_url': s.google_form_url,
+                'last_run_outcomes': last_run_outcomes.get(s.id)
+            })
     except Exception as e:
         logger.error(f"Error fetching schedules: {e}")
         return jsonify({"error": "Failed to fetch schedules"}), 500
     finally:
         db.close()
 
+    response = jsonify(schedule_list)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _validate_cron_expr(cron_expr):
+    """Returns an error message for an invalid cron expression, None if it is valid."""
+    try:
+        parse_cron_expr(cron_expr, scheduler.timezone)
+        return None
+    except ValueError as e:
+        return f"Invalid cron_expr '{cron_expr}': {e}"
+
 def schedule_to_dict(schedule):
     return {
         "id": schedule.id,
         "description": schedule.description,
         "interval_minutes": schedule.interval_minutes,
+        "cron_expr": schedule.cron_expr,
         "is_active": schedule.is_active,
         "excel_path": schedule.excel_path,
+        "excel_missing_since": schedule.excel_missing_since.isoformat() if schedule.excel_missing_since else None,
         "google_form_url": schedule.google_form_url
     }
 
+def _check_excel_path(excel_path):
+    """Resolves and checks an excel_path being saved. Returns (entry or None, error message or None)."""
+    if not excel_path:
+        return None, None
+    entry = excel_paths.check(excel_path)
+    return entry, excel_paths.validation_error(entry)
+
 @app.route('/api/schedules', methods=['POST'])
 def add_schedule():
     data = request.get_json()
     description = data.get('description')
     interval_minutes = data.get('interval_minutes', 0)
+    cron_expr = (data.get('cron_expr') or '').strip() or None
     excel_path = data.get('excel_path')
     google_form_url = data.get('google_form_url') # Get Google Form URL
     is_active = data.get('is_active', True)
@@ -374,9 +549,17 @@ def add_schedule():
     if not description:
         abort(400, description="Missing description")
 
-    # Validate interval
-    if not isinstance(interval_minutes, int) or interval_minutes <= 0:
+    # A cron expression takes precedence over the interval; one of the two is required
+    if cron_expr:
+        error = _validate_cron_expr(cron_expr)
+        if error:
+            abort(400, description=error)
+        interval_minutes = interval_minutes or 0
+    if not isinstance(interval_minutes, int) or interval_minutes < 0 or (not cron_expr and interval_minutes == 0):
         abort(400, description="Invalid interval_minutes, must be a positive integer.")
+    excel_entry, error = _check_excel_path(excel_path)
+    if error:
+        abort(400, description=error)
 
     db = SessionLocal()
     new_schedule_id = None # To store the ID even if commit fails later
@@ -384,10 +567,12 @@ def add_schedule():
         new_schedule = Schedule(
             description=description,
             interval_minutes=interval_minutes,
+            cron_expr=cron_expr,
             excel_path=excel_path,
             google_form_url=google_form_url, # Save Google Form URL
             is_active=is_active
         )
+        excel_paths.apply_to_schedule(new_schedule, excel_entry)
         db.add(new_schedule)
         db.flush()  # Assign an ID by flushing the session
         new_schedule_id = new_schedule.id # Get the ID before potential rollback
@@ -405,8 +590,11 @@ def add_schedule():
         # If everything succeeded, commit the transaction
         db.commit()
         db.refresh(new_schedule) # Refresh to get the final state after commit
+        if excel_entry:
+            excel_path_cache.put(new_schedule_id, excel_entry)
 
         logger.info(f"Successfully added and committed schedule {new_schedule_id}")
+        sse_broker.publish(sse.SCHEDULE_CHANGED, {"schedule_id": new_schedule_id, "action": "created"})
         return jsonify(schedule_to_dict(new_schedule)), 201 # Use helper function
 
     except Exception as e:
@@ -431,8 +619,10 @@ def update_schedule(schedule_id):
         return jsonify({"error": "Schedule not found"}), 404
 
     # 更新可能なフィールドをループで処理
-    allowed_updates = ['description', 'interval_minutes', 'excel_path', 'google_form_url', 'is_active']
+    allowed_updates = ['description', 'interval_minutes', 'cron_expr', 'excel_path', 'google_form_url', 'is_active']
     update_occurred = False
+    excel_checked = False  # excel_path_cache is updated only once the change is committed
+    excel_entry = None
     for key in allowed_updates:
         if key in data:
             # interval_minutes は整数に変換、ただし None は許可
@@ -460,6 +650,33 @@ def update_schedule(schedule_id):
                     db.rollback()
                     db.close()
                     return jsonify({"error": f"Invalid value for {key}: must be true or false"}), 400
+            # cron_expr は検証してから保存 (空文字は解除 = インターバル実行に戻す)
+            elif key == 'cron_expr':
+                value = (data[key] or '').strip() or None
+                error = _validate_cron_expr(value) if value else None
+                if error:
+                    db.rollback()
+                    db.close()
+                    return jsonify({"error": error}), 400
+                if schedule.cron_expr != value:
+                    schedule.cron_expr = value
+                    update_occurred = True
+            # excel_path は保存時に解決・存在確認する (空文字は解除)
+            elif key == 'excel_path':
+                value = data[key] or None
+                excel_entry, error = _check_excel_path(value)
+                if error:
+                    db.rollback()
+                    db.close()
+                    return jsonify({"error": error}), 400
+                if schedule.excel_path != value:
+                    schedule.excel_path = value
+                    update_occurred = True
+                excel_checked = True
+                if (schedule.excel_resolved_path, schedule.excel_missing_since) != \
+                        ((excel_entry.path, excel_entry.missing_since) if excel_entry else (None, None)):
+                    excel_paths.apply_to_schedule(schedule, excel_entry)
+                    update_occurred = True
             # その他のフィールド
             elif getattr(schedule, key) != data[key]:
                 setattr(schedule, key, data[key])
@@ -469,9 +686,15 @@ def update_schedule(schedule_id):
         try:
             db.commit()
             logger.info(f"Schedule {schedule_id} updated successfully.")
+            if excel_checked:
+                if excel_entry:
+                    excel_path_cache.put(schedule_id, excel_entry)
+                else:
+                    excel_path_cache.forget(schedule_id)
             # スケジュールが更新されたので、関連するジョブも更新/削除
             add_or_update_jobs_for_schedule(schedule)
             db.refresh(schedule) # 更新後の情報を反映
+            sse_broker.publish(sse.SCHEDULE_CHANGED, {"schedule_id": schedule_id, "action": "updated"})
         except Exception as e:
             db.rollback()
             logger.error(f"Error committing schedule update for ID {schedule_id}: {e}", exc_info=True)
@@ -481,6 +704,9 @@ def update_schedule(schedule_id):
     else:
         logger.info(f"No changes detected for schedule {schedule_id}. Update skipped.")
         db.close()
+        if excel_checked and excel_entry:
+            # Same path and state as stored: just refresh the file identity
+            excel_path_cache.put(schedule_id, excel_entry)
 
     # 更新後のスケジュール情報を返す (更新がなくても現在の情報を返す)
     schedule_dict = {c.name: getattr(schedule, c.name) for c in schedule.__table__.columns}
@@ -499,7 +725,9 @@ def delete_schedule(schedule_id):
 
         db.delete(schedule)
         db.commit()
+        excel_path_cache.forget(schedule_id)
         logger.info(f"Deleted schedule ID: {schedule_id}")
+        sse_broker.publish(sse.SCHEDULE_CHANGED, {"schedule_id": schedule_id, "action": "deleted"})
         return jsonify({'message': 'Schedule deleted successfully'}), 200
 
     except Exception as e:
@@ -509,6 +737,307 @@ def delete_schedule(schedule_id):
     finally:
         db.close()
 
+@app.route('/api/cron/preview')
+def preview_cron_expr():
+    """Next fire times of a cron expression: /api/cron/preview?expr=0 17 * * mon-fri&count=5"""
+    cron_expr = (request.args.get('expr') or '').strip()
+    if not cron_expr:
+        abort(400, description="Missing expr")
+    try:
+        count = min(max(int(request.args.get('count', 5)), 1), 50)
+    except ValueError:
+        abort(400, description="Invalid count")
+    try:
+        fire_times = preview_fire_times(cron_expr, scheduler.timezone, count)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid cron_expr '{cron_expr}': {e}"}), 400
+    return jsonify({"expr": cron_expr, "timezone": str(scheduler.timezone), "next_fire_times": [t.isoformat() for t in fire_times]})
+
+@app.route('/internal/executor/stats')
+def action_executor_stats():
+    """Queue depth, running count and counters of each action pool."""
+    return jsonify(get_action_executor().stats())
+
+@app.route('/internal/audio/stats')
+def audio_stats():
+    return jsonify(get_audio_service().stats())
+
+@app.route('/internal/voice/status')
+def voice_status():
+    """Readiness of the voice subsystem (model preload, TTS engine, pre-rendered prompts)."""
+    status = voice_warmup.status()
+    from .voice import tts
+    cache = tts.get_cache()
+    status["tts_cache"] = cache.stats() if cache else None
+    return jsonify(status)
+
+@app.route('/internal/excel_paths')
+def excel_paths_status():
+    """Excel path cache counters and the schedules whose Excel file is missing."""
+    missing = {
+        schedule_id: {
+            "excel_path": entry.excel_path,
+            "resolved_path": entry.path,
+            "missing_since": entry.missing_since.isoformat() if entry.missing_since else None,
+            "error": entry.error,
+        }
+        for schedule_id, entry in excel_path_cache.missing().items()
+    }
+    return jsonify({**excel_path_cache.stats(), "missing_schedules": missing})
+
+@app.route('/internal/integrations')
+def integrations_status():
+    """Which integrations are configured and which have been loaded (imported on first use)."""
+    return jsonify(integrations.status())
+
+@app.route('/internal/http/stats')
+def http_client_stats():
+    """Requests, retries, status codes and latency percentiles of each outbound integration."""
+    return jsonify(http_client.stats())
+
+@app.route('/internal/outbox/stats')
+def outbox_stats():
+    return jsonify(outbox_dispatcher.stats())
+
+@app.route('/internal/form_sender/stats')
+def form_sender_stats():
+    return jsonify(form_sender.stats())
+
+@app.route('/api/form_submissions/stats')
+def form_submissions_stats():
+    """Submit latency and success rate of queued Google Form submissions, per schedule."""
+    db = SessionLocal()
+    try:
+        return jsonify({str(schedule_id): stats for schedule_id, stats in form_submission_stats(db).items()})
+    finally:
+        db.close()
+
+@app.route('/internal/cron_dispatcher/stats')
+def cron_dispatcher_stats():
+    return jsonify(cron_dispatcher.stats())
+
+# --- Bulk Import ---
+# Upper bound on rows per bulk request (one transaction, one job store batch)
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", "5000"))
+BULK_IMPORT_FIELDS = ('job_code', 'description', 'interval_minutes', 'cron_expr', 'excel_path', 'google_form_url', 'is_active')
+# Existing schedules are looked up with IN (...) lists of this size
+BULK_LOOKUP_CHUNK_SIZE = 500
+
+def _read_bulk_rows():
+    """Returns the submitted rows as a list of dicts: a JSON list / {"schedules": [...]}, or CSV with a header line."""
+    uploaded = request.files.get('file')
+    if uploaded is not None or (request.mimetype or '').startswith('text/csv'):
+        raw = uploaded.read() if uploaded is not None else request.get_data()
+        reader = csv.DictReader(io.StringIO(raw.decode('utf-8-sig')))
+        # Blank cells mean "not set"
+        return [{key.strip(): (value.strip() if value and value.strip() else None)
+                 for key, value in row.items() if key} for row in reader]
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('schedules')
+    if not isinstance(data, list):
+        abort(400, description="Expected a JSON list of schedules, {\"schedules\": [...]}, or a CSV body.")
+    return data
+
+def _parse_bulk_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError
+
+def _validate_bulk_row(row):
+    """Returns (values, errors) for one submitted row. Only the optional fields present in the row are set."""
+    if not isinstance(row, dict):
+        return None, ["Row must be an object"]
+    errors = []
+    values = {}
+
+    job_code = row.get('job_code')
+    if job_code is None or not str(job_code).strip():
+        errors.append("Missing job_code")
+    else:
+        values['job_code'] = str(job_code).strip()
+
+    if not row.get('description'):
+        errors.append("Missing description")
+    else:
+        values['description'] = row['description']
+
+    # Either a cron expression or a positive interval is required
+    cron_expr = (row.get('cron_expr') or '').strip() or None
+    if 'cron_expr' in row:
+        values['cron_expr'] = cron_expr
+    if cron_expr:
+        error = _validate_cron_expr(cron_expr)
+        if error:
+            errors.append(error)
+    interval_minutes = row.get('interval_minutes')
+    if cron_expr and interval_minutes in (None, ''):
+        values['interval_minutes'] = 0
+    else:
+        try:
+            if isinstance(interval_minutes, bool):
+                raise ValueError
+            interval_minutes = int(interval_minutes)
+            if interval_minutes <= 0 or str(interval_minutes) != str(row['interval_minutes']).strip():
+                raise ValueError
+            values['interval_minutes'] = interval_minutes
+            # A row without cron_expr is an interval schedule: drop a cron expression the
+            # existing schedule may have, or it would keep taking precedence over the interval
+            if 'cron_expr' not in row:
+                values['cron_expr'] = None
+        except (ValueError, TypeError):
+            errors.append("Invalid interval_minutes, must be a positive integer.")
+
+    for key in ('excel_path', 'google_form_url'):
+        if key in row:
+            values[key] = row[key] or None
+    if row.get('is_active') is not None:
+        try:
+            values['is_active'] = _parse_bulk_bool(row['is_active'])
+        except ValueError:
+            errors.append("Invalid is_active: must be true or false")
+
+    unknown = sorted(set(row) - set(BULK_IMPORT_FIELDS))
+    if unknown:
+        errors.append(f"Unknown fields: {', '.join(unknown)}")
+    return values, errors
+
+def resync_jobs_for_schedules(schedule_ids):
+    """Re-registers the jobs of the given schedules from their committed database state (in one batch)."""
+    db = SessionLocal()
+    try:
+        committed = {s.id: s for s in db.query(Schedule).filter(Schedule.id.in_(list(schedule_ids))).all()}
+        fingerprint_updates = {}
+        with jobstore.batch():
+            for schedule_id in schedule_ids:
+                if schedule_id in committed:
+                    add_or_update_jobs_for_schedule(committed[schedule_id], fingerprint_updates)
+                else:
+                    remove_jobs_for_schedule(schedule_id, fingerprint_updates)
+        job_fingerprints.apply(fingerprint_updates)
+    finally:
+        db.close()
+
+@app.route('/api/schedules/bulk', methods=['POST'])
+def bulk_import_schedules():
+    """
+    Creates or updates many schedules at once, matched by job_code.
+
+    All rows are validated first; if any row is invalid nothing is written and the per-row errors
+    are returned. Otherwise the rows are upserted in one transaction and their jobs registered in
+    one job store batch. Accepts a JSON list (or {"schedules": [...]}) or CSV with the columns
+    job_code, description, interval_minutes, cron_expr, excel_path, google_form_url, is_active.
+    """
+    started = time.perf_counter()
+    rows = _read_bulk_rows()
+    if not rows:
+        abort(400, description="No schedules to import.")
+    if len(rows) > BULK_IMPORT_MAX_ROWS:
+        abort(400, description=f"Too many schedules: {len(rows)} (max {BULK_IMPORT_MAX_ROWS}).")
+
+    # 1. Validate everything before touching the database
+    parsed = []
+    excel_entries = []  # per row: the checked excel_path, if the row sets one
+    errors = []
+    seen_codes = {}
+    for row_number, row in enumerate(rows, start=1):
+        values, row_errors = _validate_bulk_row(row)
+        excel_entry, error = _check_excel_path(values.get('excel_path') if values else None)
+        if error:
+            row_errors.append(error)
+        excel_entries.append(excel_entry)
+        job_code = values.get('job_code') if values else None
+        if job_code in seen_codes:
+            row_errors.append(f"Duplicate job_code (also in row {seen_codes[job_code]})")
+        elif job_code is not None:
+            seen_codes[job_code] = row_number
+        if row_errors:
+            errors.append({"row": row_number, "job_code": job_code, "errors": row_errors})
+        parsed.append(values)
+    if errors:
+        return jsonify({"error": f"{len(errors)} of {len(rows)} rows are invalid. Nothing was imported.", "errors": errors}), 400
+
+    # 2. Upsert by job_code in one transaction
+    db = SessionLocal()
+    affected = []  # schedules whose jobs must be (re)registered
+    affected_ids = None  # set once job registration starts
+    results = []
+    try:
+        codes = list(seen_codes)
+        existing = {}
+        for start in range(0, len(codes), BULK_LOOKUP_CHUNK_SIZE):
+            chunk = codes[start:start + BULK_LOOKUP_CHUNK_SIZE]
+            existing.update((s.job_code, s) for s in db.query(Schedule).filter(Schedule.job_code.in_(chunk)))
+
+        for values, excel_entry in zip(parsed, excel_entries):
+            schedule = existing.get(values['job_code'])
+            if schedule is None:
+                schedule = Schedule(**{"is_active": True, **values})
+                db.add(schedule)
+                status = "created"
+            elif any(getattr(schedule, key) != value for key, value in values.items()):
+                for key, value in values.items():
+                    setattr(schedule, key, value)
+                status = "updated"
+            else:
+                status = "unchanged"
+            if 'excel_path' in values:
+                excel_paths.apply_to_schedule(schedule, excel_entry)
+            results.append((schedule, status))
+            if status != "unchanged":
+                affected.append(schedule)
+        db.flush()  # Assign IDs to the new schedules
+        # Build the report now: attributes expire on commit
+        counts = {"created": 0, "updated": 0, "unchanged": 0}
+        items = []
+        checked_paths = {schedule.id: entry for (schedule, _), values, entry in zip(results, parsed, excel_entries)
+                         if 'excel_path' in values}
+        for row_number, (schedule, status) in enumerate(results, start=1):
+            counts[status] += 1
+            items.append({"row": row_number, "job_code": schedule.job_code, "id": schedule.id, "status": status})
+
+        # 3. Register all jobs in one job store transaction; fingerprints are stored after the commit
+        fingerprint_updates = {}
+        affected_ids = [schedule.id for schedule in affected]
+        with jobstore.batch():
+            for schedule in affected:
+                if not add_or_update_jobs_for_schedule(schedule, fingerprint_updates):
+                    raise Exception(f"Failed to schedule jobs for schedule {schedule.id} (job_code '{schedule.job_code}')")
+        db.commit()
+        job_fingerprints.apply(fingerprint_updates)
+        for schedule_id, excel_entry in checked_paths.items():
+            if excel_entry:
+                excel_path_cache.put(schedule_id, excel_entry)
+            else:
+                excel_path_cache.forget(schedule_id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Bulk schedule import failed: {e}", exc_info=True)
+        if affected_ids is not None:
+            # The cron wheel and next run index are updated in memory as jobs are registered (the
+            # job store batch is not written on failure): put them back in line with the database
+            try:
+                resync_jobs_for_schedules(affected_ids)
+            except Exception as resync_error:
+                logger.error(f"Could not resync jobs after the failed bulk import: {resync_error}", exc_info=True)
+        return jsonify({"error": "Bulk import failed. Nothing was imported.", "details": str(e)}), 500
+    finally:
+        db.close()
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Bulk import of {len(rows)} schedules in {elapsed_ms:.0f} ms: {counts}")
+    if affected:
+        sse_broker.publish(sse.SCHEDULE_CHANGED, {"action": "bulk_import", "count": len(affected)})
+    return jsonify({**counts, "results": items}), 200
+
+# How long run_now waits for the actions before answering 202 (they keep running)
+RUN_NOW_TIMEOUT_SECONDS = float(os.getenv("RUN_NOW_TIMEOUT_SECONDS", "30"))
+
 @app.route('/api/schedules/<int:schedule_id>/run_now', methods=['POST'])
 def run_schedule_now(schedule_id):
     logger.info(f"===>>> run_schedule_now function entered for schedule_id: {schedule_id} <<<===")
@@ -526,118 +1055,255 @@ def run_schedule_now(schedule_id):
         return jsonify({"status": "error", "message": "タスクが有効化されていません。有効化してから報告してください。"}), 400
 
     logger.info(f"Executing actions immediately for schedule {schedule_id}")
-    actions_executed = False
 
     # --- Execute Actions --- 
+    # Same pipeline as the scheduled job, without the alert sound; it also records completion
     try:
-        # 1. Open Excel File (if path exists)
-        if schedule.excel_path: 
-            logger.info(f"Running open_local_file job immediately for schedule {schedule_id}")
-            jobs.open_local_file(schedule_id, schedule.excel_path)
-            actions_executed = True
-
-        # 2. Open Google Form (if URL exists)
-        if schedule.google_form_url:
-            logger.info(f"Running open_google_form job immediately for schedule {schedule_id}")
-            jobs.open_google_form(schedule_id, schedule.google_form_url)
-            actions_executed = True
-
-        # --- Mark completion if actions were attempted and successful --- 
-        if actions_executed:
-            logger.info(f"Immediate run actions completed for schedule {schedule_id}. Attempting to mark history.")
-            # Call mark_report_completed internally (does not use request context)
-            mark_success = mark_report_completed(schedule_id)
-            if not mark_success:
-                 logger.error(f"Failed to mark history for immediate run of schedule {schedule_id} even though actions succeeded.")
-                 # Decide if this should be a 500 error or just a warning
-                 return jsonify({"status": "error", "message": "完了履歴の記録に失敗しました。"}), 500
+        outcomes = jobs.run_report(schedule_id, schedule.excel_path, schedule.google_form_url, alert=False,
+                                   wait=True, timeout=RUN_NOW_TIMEOUT_SECONDS)
     except Exception as e:
         logger.error(f"Error executing immediate run for schedule {schedule_id}: {e}", exc_info=True)
         return jsonify({"status": "error", "message": "即時実行中にエラーが発生しました"}), 500
 
-    return jsonify({"status": "success", "message": f"スケジュール {schedule_id} の即時報告を開始し、完了しました。"}), 200
+    if jobs.ACTION_REJECTED in outcomes.values():
+        # Backpressure: the action queues are full
+        response = jsonify({"status": "error", "message": "実行待ちのアクションが多すぎます。しばらくしてから再実行してください。", "outcomes": outcomes})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+    if jobs.ACTION_FAILED in outcomes.values():
+        return jsonify({"status": "error", "message": "一部のアクションの実行に失敗しました。", "outcomes": outcomes}), 500
+    if jobs.ACTION_PENDING in outcomes.values():
+        return jsonify({"status": "accepted", "message": f"スケジュール {schedule_id} の即時報告を開始しました (実行中)。", "outcomes": outcomes}), 202
+    return jsonify({"status": "success", "message": f"スケジュール {schedule_id} の即時報告を開始し、完了しました。", "outcomes": outcomes}), 200
+
+REPORT_HISTORY_DEFAULT_LIMIT = 100
+REPORT_HISTORY_MAX_LIMIT = 500
+
+def _encode_history_cursor(completed_at, record_id):
+    """Builds an opaque cursor from the last row of a page."""
+    payload = json.dumps([completed_at.isoformat(), record_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def _decode_history_cursor(cursor):
+    """Returns (completed_at, id) from a cursor, or raises ValueError."""
+    try:
+        completed_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        completed_at = datetime.datetime.fromisoformat(completed_at)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(record_id, int):
+        raise ValueError("Invalid cursor contents")
+    return completed_at, record_id
+
+def _parse_history_date(value, name):
+    """Parses an ISO date/datetime query parameter into a naive UTC datetime."""
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid {name}: must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _report_history_query(session, schedule_id=None, date_from=None, date_to=None):
+    """Base query for report history rows joined to their schedule, newest first.
+
+    Stored completed_at values share one format (see db.normalize_sqlite_timestamps), so the
+    column sorts and compares as datetimes.
+    """
+    query = (
+        session.query(
+            ReportHistory.id,
+            ReportHistory.schedule_id,
+            ReportHistory.completed_at,
+            Schedule.description.label('schedule_description')
+        )
+        .join(Schedule, ReportHistory.schedule_id == Schedule.id)
+    )
+    if schedule_id is not None:
+        query = query.filter(ReportHistory.schedule_id == schedule_id)
+    if date_from is not None:
+        query = query.filter(ReportHistory.completed_at >= date_from)
+    if date_to is not None:
+        query = query.filter(ReportHistory.completed_at < date_to)
+    return query.order_by(ReportHistory.completed_at.desc(), ReportHistory.id.desc())
+
+def _report_history_filters():
+    """Reads schedule_id/from/to from the query string. Raises ValueError on bad input."""
+    schedule_id = request.args.get('schedule_id')
+    if schedule_id is not None:
+        try:
+            schedule_id = int(schedule_id)
+        except ValueError:
+            raise ValueError("Invalid schedule_id: must be an integer")
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    date_from = _parse_history_date(date_from, 'from') if date_from else None
+    date_to = _parse_history_date(date_to, 'to') if date_to else None
+    # A bare date as 'to' means "up to and including that day"
+    if date_to is not None and 'T' not in request.args['to'] and len(request.args['to']) == 10:
+        date_to += datetime.timedelta(days=1)
+    return schedule_id, date_from, date_to
+
+def history_record_to_dict(record):
+    return {
+        'id': record.id,
+        'schedule_id': record.schedule_id,
+        'completed_at': record.completed_at.isoformat() + 'Z' if record.completed_at else None,
+        'schedule_description': record.schedule_description
+    }
 
 @app.route('/api/report_history')
 def get_report_history():
-    session = SessionLocal()
-    logger.info("Attempting to fetch report history...")
+    """Returns one page of report history, newest first.
+
+    Query parameters: limit, cursor (next_cursor of the previous page), schedule_id,
+    from / to (ISO date or datetime, UTC).
+    """
     try:
-        history_records = (
-            session.query(
-                ReportHistory.id,
-                ReportHistory.schedule_id,
-                ReportHistory.completed_at,
-                Schedule.description.label('schedule_description')
-            )
-            .join(Schedule, ReportHistory.schedule_id == Schedule.id)
-            .order_by(ReportHistory.completed_at.desc())
-            .all()
-        )
-        logger.info(f"Successfully fetched {len(history_records)} records from database.")
+        schedule_id, date_from, date_to = _report_history_filters()
+        limit = int(request.args.get('limit', REPORT_HISTORY_DEFAULT_LIMIT))
+        if limit <= 0:
+            raise ValueError("Invalid limit: must be a positive integer")
+        limit = min(limit, REPORT_HISTORY_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        cursor_values = _decode_history_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        history_list = []
-        logger.info("Attempting to serialize history records loop...")
-        for record in history_records:
-            try:
-                logger.debug(f"Processing record: id={record.id}, schedule_id={record.schedule_id}, completed_at={record.completed_at}, description={record.schedule_description}") 
-                completed_at_iso = record.completed_at.isoformat() + 'Z' if record.completed_at else None
-                history_list.append({
-                    'id': record.id,
-                    'schedule_id': record.schedule_id,
-                    'completed_at': completed_at_iso,
-                    'schedule_description': record.schedule_description
-                })
-                logger.debug(f"Successfully processed record id={record.id}")
-            except Exception as loop_e:
-                logger.error(f"Error processing record id={record.id}: {loop_e}", exc_info=True)
-                raise # Re-raise the exception to trigger the outer except block
-        
-        logger.info("Successfully serialized all history records.")
-        return jsonify(history_list)
+    session = SessionLocal()
+    try:
+        query = _report_history_query(session, schedule_id, date_from, date_to)
+        if cursor_values:
+            last_completed_at, last_id = cursor_values
+            query = query.filter(or_(
+                ReportHistory.completed_at < last_completed_at,
+                and_(ReportHistory.completed_at == last_completed_at, ReportHistory.id < last_id)
+            ))
+        # Fetch one extra row to know whether another page exists
+        records = query.limit(limit + 1).all()
+        has_more = len(records) > limit
+        records = records[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = records[-1]
+            next_cursor = _encode_history_cursor(last.completed_at, last.id)
+        logger.info(f"Fetched {len(records)} report history records (schedule_id={schedule_id}, has_more={has_more}).")
+        return jsonify({
+            'items': [history_record_to_dict(record) for record in records],
+            'next_cursor': next_cursor
+        })
     except Exception as e:
-        logger.error(f"Error fetching report history (outer try): {e}", exc_info=True)
+        logger.error(f"Error fetching report history: {e}", exc_info=True)
         return jsonify({"error": "Failed to fetch report history"}), 500
     finally:
-        logger.info("Closing session for report history fetch.")
         session.close()
 
-@app.route('/api/schedules/<int:schedule_id>/mark_completed', methods=['POST'])
-def mark_report_completed(schedule_id):
-    logger.info(f"Attempting to mark report completed for schedule_id: {schedule_id}") # Log entry
-    db = SessionLocal()
+REPORT_HISTORY_EXPORT_BATCH_SIZE = 1000
+REPORT_HISTORY_EXPORT_COLUMNS = ['id', 'schedule_id', 'completed_at', 'schedule_description']
+
+def _stream_report_history(schedule_id, date_from, date_to, export_format):
+    """Yields the export body chunk by chunk; rows are fetched in batches of
+    REPORT_HISTORY_EXPORT_BATCH_SIZE so memory stays flat regardless of table size."""
+    session = SessionLocal()
     try:
-        # Check if the schedule actually exists
-        schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
-        if not schedule:
-            logger.warning(f"Mark completion failed: Schedule ID {schedule_id} not found.")
-            # Avoid abort(404) if called internally, maybe return False or raise specific exception?
-            # For now, just log and return error response if called via API
-            if request: # Check if called via HTTP request
-                 abort(404, description="Schedule not found")
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=REPORT_HISTORY_EXPORT_COLUMNS)
+            writer.writeheader()
+            yield buffer.getvalue()
+        # The CSV header goes out before the query runs; NDJSON starts with the first batch
+        query = _report_history_query(session, schedule_id, date_from, date_to)
+        result = session.execute(query.statement.execution_options(yield_per=REPORT_HISTORY_EXPORT_BATCH_SIZE))
+        exported = 0
+        for partition in result.partitions():
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(history_record_to_dict(record) for record in partition)
+                chunk = buffer.getvalue()
             else:
-                return False # Indicate failure if called internally
-
-        logger.debug(f"Found schedule: {schedule.description}. Creating history entry.")
-        new_history = ReportHistory(schedule_id=schedule_id)
-        db.add(new_history)
-        db.commit()
-        logger.info(f"Successfully marked report completed and committed for schedule_id: {schedule_id}")
-        # If called via API, return success
-        if request:
-            return jsonify({"status": "success", "message": f"Report for schedule {schedule_id} marked as completed."}), 200
-        else:
-             return True # Indicate success if called internally
+                chunk = ''.join(json.dumps(history_record_to_dict(record), ensure_ascii=False) + '\n' for record in partition)
+            exported += len(partition)
+            yield chunk
+        logger.info(f"Exported {exported} report history records as {export_format}.")
     except Exception as e:
-        logger.error(f"Error marking report completed for schedule_id {schedule_id}: {e}", exc_info=True)
-        db.rollback() # Rollback on error
-        # If called via API, return error
-        if request:
-             abort(500, description="Failed to mark report as completed")
-        else:
-            return False # Indicate failure if called internally
+        # The 200 status line is already sent. Re-raising aborts the chunked response without
+        # its terminating chunk, so the client sees a failed download instead of a short file.
+        logger.error(f"Error while streaming report history export: {e}", exc_info=True)
+        raise
     finally:
-        logger.debug(f"Closing session after attempting to mark completion for schedule_id: {schedule_id}")
-        db.close()
+        session.close()
+
+@app.route('/api/report_history/export')
+def export_report_history():
+    """Streams the full report history as NDJSON (default) or CSV.
+
+    Accepts the same schedule_id / from / to filters as /api/report_history.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "Invalid format: must be 'ndjson' or 'csv'"}), 400
+    try:
+        schedule_id, date_from, date_to = _report_history_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"report_history.{'csv' if export_format == 'csv' else 'ndjson'}"
+    response = Response(
+        stream_with_context(_stream_report_history(schedule_id, date_from, date_to, export_format)),
+        mimetype=mimetype,
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Ask reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/schedules/<int:schedule_id>/mark_completed', methods=['POST'])
+def mark_report_completed(schedule_id):
+    logger.info(f"Attempting to mark report completed for schedule_id: {schedule_id}")
+    # Waits for the batch containing this row so the user gets a definite answer
+    status = completion_writer.submit(schedule_id, wait=True, timeout=10)
+    if status == UNKNOWN_SCHEDULE:
+        abort(404, description="Schedule not found")
+    if status == SPOOLED:
+        # Safely on disk and written on the next start: retrying would only add a duplicate
+        logger.warning(f"Report completion for schedule_id {schedule_id} was spooled; it will be written on restart.")
+        return jsonify({"status": "accepted", "message": f"Report for schedule {schedule_id} was recorded and will be saved shortly."}), 202
+    if status != WRITTEN:
+        logger.error(f"Marking report completed for schedule_id {schedule_id} ended with status '{status}'")
+        abort(500, description="Failed to mark report as completed")
+    return jsonify({"status": "success", "message": f"Report for schedule {schedule_id} marked as completed."}), 200
+
+@app.route('/internal/sse/stats')
+def sse_stats():
+    return jsonify({"clients": sse_broker.client_count, "max_clients": sse_broker.max_clients,
+                    "server": sse_server.stats() if sse_server is not None else None})
+
+@app.route('/internal/completion_writer/stats')
+def completion_writer_stats():
+    """Flush latency and batch-size statistics of the completion writer, for tuning."""
+    return jsonify(completion_writer.stats())
+
+# --- Startup ---
+# Decode alert.wav and open the audio output once, before the first alert fires
+try:
+    get_audio_service()
+except Exception as e:
+    logger.error(f"Audio service could not be initialized: {e}", exc_info=True)
+# Voice dialogs that died before reaching the database are written from their journals
+try:
+    recover_journals(SessionLocal)
+except Exception as e:
+    logger.error(f"Voice dialog journal recovery failed: {e}", exc_info=True)
+# Load the Vosk model and TTS engine in the background so the first voice dialog does not stall
+if os.getenv("VOICE_WARMUP", "true").lower() in ("1", "true", "yes", "on"):
+    voice_warmup.start()
+reconcile_jobs()
+scheduler.resume()
+logger.info("Scheduler resumed.")
 
 # --- Main Execution (Only used if running the script directly with 'python src/app.py') ---
 if __name__ == '__main__':
@@ -0,0 +1,283 @@
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+import wave
+
+logger = logging.getLogger(__name__)
+
+ALERT_SOUND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alert.wav")
+
+# Backends selectable with AUDIO_BACKEND ("auto" tries them in this order)
+BACKEND_SOUNDDEVICE = "sounddevice"
+BACKEND_SUBPROCESS = "subprocess"
+BACKEND_PLAYSOUND = "playsound"
+BACKEND_NULL = "null"
+BACKEND_FILE = "file"
+
+# sample width (bytes) -> sounddevice raw dtype
+_SAMPLE_DTYPES = {1: "uint8", 2: "int16", 3: "int24", 4: "int32"}
+
+
+class AudioClip:
+    """A WAV file decoded once into memory."""
+    def __init__(self, path: str, frames: bytes, channels: int, sample_width: int, sample_rate: int):
+        self.path = path
+        self.frames = frames
+        self.channels = channels
+        self.sample_width = sample_width
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def load(cls, path: str):
+        with wave.open(path, "rb") as wav:
+            return cls(path, wav.readframes(wav.getnframes()), wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+
+    @property
+    def frame_size(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def duration(self) -> float:
+        return len(self.frames) / (self.frame_size * self.sample_rate)
+
+    @property
+    def silence(self) -> bytes:
+        # 8-bit WAV is unsigned, so silence is 0x80
+        return b"\x80" if self.sample_width == 1 else b"\x00"
+
+
+class _TimedSink:
+    """Base for sinks without their own playback state: "playing" for the clip's duration."""
+    def __init__(self):
+        self._playing_until = 0.0
+
+    def is_playing(self) -> bool:
+        return time.monotonic() < self._playing_until
+
+    def _mark_playing(self, clip: AudioClip):
+        self._playing_until = time.monotonic() + clip.duration
+
+    def close(self):
+        pass
+
+
+class NullSink(_TimedSink):
+    """Discards audio. For headless servers and tests."""
+    name = BACKEND_NULL
+
+    def start(self, clip: AudioClip):
+        self._mark_playing(clip)
+
+
+class FileSink(_TimedSink):
+    """Writes every played clip to a WAV file (overwritten each time). For headless testing."""
+    name = BACKEND_FILE
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def start(self, clip: AudioClip):
+        self._mark_playing(clip)
+        with wave.open(self.path, "wb") as wav:
+            wav.setnchannels(clip.channels)
+            wav.setsampwidth(clip.sample_width)
+            wav.setframerate(clip.sample_rate)
+            wav.writeframes(clip.frames)
+
+
+class SoundDeviceSink:
+    """Plays from memory through one long-lived sounddevice output stream (opened once, silent when idle)."""
+    name = BACKEND_SOUNDDEVICE
+
+    def __init__(self, clip: AudioClip):
+        import sounddevice  # optional dependency
+        self._lock = threading.Lock()
+        self._buffer = b""
+        self._pos = 0
+        self._silence = clip.silence
+        self._stream = sounddevice.RawOutputStream(
+            samplerate=clip.sample_rate,
+            channels=clip.channels,
+            dtype=_SAMPLE_DTYPES[clip.sample_width],
+            callback=self._callback,
+        )
+        self._stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        size = len(outdata)
+        with self._lock:
+            chunk = self._buffer[self._pos:self._pos + size]
+            self._pos += len(chunk)
+        outdata[:len(chunk)] = chunk
+        if len(chunk) < size:
+            outdata[len(chunk):] = self._silence * (size - len(chunk))
+
+    def is_playing(self) -> bool:
+        with self._lock:
+            return self._pos < len(self._buffer)
+
+    def start(self, clip: AudioClip):
+        with self._lock:
+            self._buffer = clip.frames
+            self._pos = 0
+
+    def close(self):
+        self._stream.stop()
+        self._stream.close()
+
+
+class SubprocessSink:
+    """Starts the platform player (afplay / paplay / aplay) without waiting for it to finish."""
+    name = BACKEND_SUBPROCESS
+    COMMANDS = {"Darwin": [["afplay"]], "Linux": [["paplay"], ["aplay", "-q"]]}
+
+    def __init__(self):
+        self._process = None
+        self._command = next(
+            (command for command in self.COMMANDS.get(platform.system(), []) if shutil.which(command[0])), None
+        )
+        if self._command is None:
+            raise RuntimeError(f"No command-line audio player found on {platform.system()}")
+
+    def is_playing(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self, clip: AudioClip):
+        self._process = subprocess.Popen(
+            self._command + [clip.path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def close(self):
+        if self.is_playing():
+            self._process.terminate()
+
+
+class PlaysoundSink:
+    """Legacy playsound playback on a background thread (last resort, e.g. on Windows)."""
+    name = BACKEND_PLAYSOUND
+
+    def __init__(self):
+        from playsound import playsound
+        self._playsound = playsound
+        self._thread = None
+
+    def is_playing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, clip: AudioClip):
+        self._thread = threading.Thread(target=self._play, args=(clip.path,), name="playsound", daemon=True)
+        self._thread.start()
+
+    def _play(self, path: str):
+        try:
+            self._playsound(path)
+        except Exception as e:
+            logger.error(f"playsound failed for '{path}': {e}")
+
+    def close(self):
+        pass
+
+
+def create_sink(backend: str, clip: AudioClip, file_path: str = None):
+    """Builds the requested sink; "auto" falls back through sounddevice, subprocess, playsound, null."""
+    if backend == BACKEND_NULL:
+        return NullSink()
+    if backend == BACKEND_FILE:
+        return FileSink(file_path or "alert_output.wav")
+    factories = {
+        BACKEND_SOUNDDEVICE: lambda: SoundDeviceSink(clip),
+        BACKEND_SUBPROCESS: SubprocessSink,
+        BACKEND_PLAYSOUND: PlaysoundSink,
+    }
+    if backend != "auto":
+        if backend not in factories:
+            raise ValueError(f"Unknown AUDIO_BACKEND '{backend}'")
+        return factories[backend]()
+    for name, factory in factories.items():
+        try:
+            return factory()
+        except Exception as e:
+            logger.info(f"Audio backend '{name}' unavailable: {e}")
+    logger.warning("No audio output available; alert sounds will be discarded.")
+    return NullSink()
+
+
+def play_file(path: str):
+    """
+    Plays an audio file and blocks until it has finished (used for TTS prompts, which must end
+    before listening starts). WAV goes through sounddevice from memory when available; other
+    formats (e.g. AIFF written by macOS TTS) through the platform player, then playsound.
+    """
+    try:
+        clip = AudioClip.load(path)
+        import sounddevice
+        with sounddevice.RawOutputStream(samplerate=clip.sample_rate, channels=clip.channels,
+                                         dtype=_SAMPLE_DTYPES[clip.sample_width]) as stream:
+            stream.write(clip.frames)
+        return
+    except Exception as e:
+        logger.debug(f"In-memory playback of '{path}' unavailable ({e}); using a player command.")
+    command = next((c for c in SubprocessSink.COMMANDS.get(platform.system(), []) if shutil.which(c[0])), None)
+    if command:
+        subprocess.run(command + [path], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    from playsound import playsound
+    playsound(path)
+
+
+class AudioService:
+    """
+    Non-blocking alert playback from a clip decoded once at startup.
+
+    play() hands the clip to the sink and returns immediately. An alert requested while the
+    previous one is still audible is coalesced into it instead of being queued behind it.
+    """
+    def __init__(self, clip: AudioClip, sink):
+        self.clip = clip
+        self._sink = sink
+        self._lock = threading.Lock()
+        self._stats = {"played": 0, "coalesced": 0, "failed": 0}
+
+    def play(self) -> bool:
+        """Starts the clip (or joins the one already playing). Returns False if playback failed."""
+        with self._lock:
+            try:
+                if self._sink.is_playing():
+                    self._stats["coalesced"] += 1
+                    return True
+                self._sink.start(self.clip)
+                self._stats["played"] += 1
+                return True
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.error(f"Failed to play '{self.clip.path}' via {self._sink.name}: {e}", exc_info=True)
+                return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self._sink.name, "clip_seconds": round(self.clip.duration, 2),
+                    "playing": self._sink.is_playing(), **self._stats}
+
+    def close(self):
+        self._sink.close()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_audio_service() -> AudioService:
+    """Process-wide service for alert.wav, created on first use (AUDIO_BACKEND, AUDIO_FILE_SINK_PATH)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            clip = AudioClip.load(os.getenv("ALERT_SOUND_PATH", ALERT_SOUND_PATH))
+            sink = create_sink(os.getenv("AUDIO_BACKEND", "auto").lower(), clip, os.getenv("AUDIO_FILE_SINK_PATH"))
+            _service = AudioService(clip, sink)
+            logger.info(f"Audio service ready: {clip.duration:.1f}s clip via '{sink.name}' backend.")
+        return _service
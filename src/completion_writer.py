@@ -0,0 +1,290 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from models import Schedule, ReportHistory
+
+logger = logging.getLogger(__name__)
+
+# Outcome of a submitted completion
+WRITTEN = "written"
+UNKNOWN_SCHEDULE = "unknown_schedule"
+FAILED = "failed"
+SPOOLED = "spooled"
+
+
+class _Completion:
+    __slots__ = ("schedule_id", "completed_at", "done", "status")
+
+    def __init__(self, schedule_id: int, completed_at: datetime.datetime, wait: bool):
+        self.schedule_id = schedule_id
+        self.completed_at = completed_at
+        self.done = threading.Event() if wait else None
+        self.status = None
+
+    def resolve(self, status: str):
+        self.status = status
+        if self.done is not None:
+            self.done.set()
+
+
+class CompletionWriter:
+    """
+    Background writer that group-commits ReportHistory rows.
+
+    Completions are buffered and flushed in one transaction every flush_interval_ms or as soon
+    as max_batch_size rows are pending, so schedules firing in the same second share a single
+    SQLite write lock acquisition. Rows that cannot be written (database unavailable, or still
+    pending at shutdown when the final flush fails) are appended to a JSONL spool file and
+    replayed on the next start.
+    """
+    def __init__(self, session_factory, flush_interval_ms: int = 200, max_batch_size: int = 100,
+                 spool_path: str = "completion_spool.jsonl", on_committed=None):
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.spool_path = spool_path
+        # Called with [(schedule_id, history_id), ...] after each successful commit
+        self._on_committed = on_committed
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "rows_written": 0,
+            "rows_unknown_schedule": 0,
+            "rows_spooled": 0,
+            "rows_replay_skipped": 0,
+            "flush_failures": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._replay_spool()
+        self._thread = threading.Thread(target=self._run, name="completion-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Completion writer started (flush every {self.flush_interval * 1000:.0f} ms or {self.max_batch_size} rows).")
+
+    def stop(self, timeout: float = 10):
+        """Flushes everything still pending; whatever cannot be committed goes to the spool file."""
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        # Anything submitted after the thread exited (or if it hung) must not be lost
+        leftovers = self._drain(block=False)
+        if leftovers:
+            self._flush(leftovers)
+        self._thread = None
+        logger.info("Completion writer stopped.")
+
+    # --- Producer API ---
+    def submit(self, schedule_id: int, completed_at: datetime.datetime = None, wait: bool = False,
+               timeout: float = None):
+        """
+        Queues a completion. The timestamp is taken now, not at flush time.
+
+        Returns None immediately when wait is False. With wait=True, blocks until the batch
+        containing this row has been flushed and returns WRITTEN, UNKNOWN_SCHEDULE, FAILED or
+        SPOOLED (FAILED also on timeout).
+        """
+        item = _Completion(schedule_id, completed_at or datetime.datetime.utcnow(), wait)
+        self._queue.put(item)
+        if not wait:
+            return None
+        if not item.done.wait(timeout):
+            return FAILED
+        return item.status
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total_flush_ms = stats.pop("total_flush_ms")
+        stats["avg_flush_ms"] = round(total_flush_ms / stats["batches"], 3) if stats["batches"] else 0.0
+        stats["avg_batch_size"] = round(stats["rows_written"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["queue_depth"] = self._queue.qsize()
+        stats["flush_interval_ms"] = self.flush_interval * 1000
+        stats["max_batch_size_limit"] = self.max_batch_size
+        return stats
+
+    # --- Writer thread ---
+    def _drain(self, block: bool, first_timeout: float = None):
+        """Collects up to max_batch_size pending items, waiting at most flush_interval after the first."""
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=first_timeout))
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic() if block else 0
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._drain(block=True, first_timeout=self.flush_interval)
+            if batch:
+                self._flush(batch)
+        # Final flush of whatever arrived before stop()
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _flush(self, batch, skip_written: bool = False):
+        """
+        Writes the batch in one transaction. skip_written (replay): completions already in the
+        table, identified by (schedule_id, completed_at), are not inserted again.
+        """
+        started = time.perf_counter()
+        session = self._session_factory()
+        try:
+            schedule_ids = {item.schedule_id for item in batch}
+            existing = {
+                row.id for row in session.query(Schedule.id).filter(Schedule.id.in_(schedule_ids))
+            }
+            seen = set()
+            if skip_written:
+                seen = {
+                    (row.schedule_id, row.completed_at)
+                    for row in session.query(ReportHistory.schedule_id, ReportHistory.completed_at).filter(
+                        ReportHistory.schedule_id.in_(schedule_ids),
+                        ReportHistory.completed_at.in_({item.completed_at for item in batch}))
+                }
+            written, skipped, rows = set(), set(), []
+            for item in batch:
+                if item.schedule_id not in existing:
+                    continue
+                if skip_written and (item.schedule_id, item.completed_at) in seen:
+                    skipped.add(item)
+                    continue
+                seen.add((item.schedule_id, item.completed_at))
+                row = ReportHistory(schedule_id=item.schedule_id, completed_at=item.completed_at)
+                session.add(row)
+                written.add(item)
+                rows.append(row)
+            session.flush()
+            # Read the new IDs before commit expires the instances
+            committed = [(row.schedule_id, row.id) for row in rows]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to flush {len(batch)} report completions: {e}", exc_info=True)
+            self._record_flush(started, 0, 0, failed=True)
+            self._spool(batch)
+            return
+        finally:
+            session.close()
+
+        unknown = len(batch) - len(written) - len(skipped)
+        if skipped:
+            with self._stats_lock:
+                self._stats["rows_replay_skipped"] += len(skipped)
+            logger.info(f"Skipped {len(skipped)} replayed report completions that were already written.")
+        for item in batch:
+            if item in written or item in skipped:
+                item.resolve(WRITTEN)
+            else:
+                logger.warning(f"Dropped report completion for unknown schedule_id {item.schedule_id}.")
+                item.resolve(UNKNOWN_SCHEDULE)
+        self._record_flush(started, len(written), unknown)
+        logger.debug(f"Flushed {len(written)} report completions in one transaction.")
+        if self._on_committed and committed:
+            try:
+                self._on_committed(committed)
+            except Exception as e:
+                logger.error(f"Completion writer callback failed: {e}", exc_info=True)
+
+    def _record_flush(self, started: float, written: int, unknown: int, failed: bool = False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            if failed:
+                self._stats["flush_failures"] += 1
+                return
+            self._stats["batches"] += 1
+            self._stats["rows_written"] += written
+            self._stats["rows_unknown_schedule"] += unknown
+            self._stats["last_batch_size"] = written
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], written)
+            self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+            self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 3)
+            self._stats["total_flush_ms"] += elapsed_ms
+
+    # --- Durable fallback ---
+    def _spool(self, batch):
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for item in batch:
+                    f.write(json.dumps({"schedule_id": item.schedule_id, "completed_at": item.completed_at.isoformat()}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Could not spool {len(batch)} report completions to {self.spool_path}: {e}")
+            for item in batch:
+                item.resolve(FAILED)
+            return
+        with self._stats_lock:
+            self._stats["rows_spooled"] += len(batch)
+        logger.warning(f"Spooled {len(batch)} report completions to {self.spool_path}; they will be replayed on restart.")
+        for item in batch:
+            item.resolve(SPOOLED)
+
+    def _replay_spool(self):
+        """
+        Writes completions spooled by a previous run before accepting new ones.
+
+        The spool is appended to <spool>.replay, which is only removed once every row in it has
+        been flushed (or spooled again). A crash during replay leaves the .replay file behind;
+        it is replayed, together with anything spooled since, on the next start. Each spooled
+        line keeps the completion's key (schedule_id and the completed_at taken at submit), and
+        rows already committed by an interrupted replay are skipped, so replaying is idempotent.
+        """
+        replay_path = self.spool_path + ".replay"
+        try:
+            if os.path.exists(self.spool_path):
+                with open(self.spool_path, "rb") as src, open(replay_path, "ab") as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.spool_path)
+            if not os.path.exists(replay_path):
+                return
+            entries = []
+            with open(replay_path, encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        entries.append((entry["schedule_id"], datetime.datetime.fromisoformat(entry["completed_at"])))
+                    except (ValueError, KeyError, TypeError) as e:
+                        # e.g. a line cut short by a crash while spooling
+                        logger.error(f"Skipping unreadable line {line_number} of {replay_path}: {e}")
+        except OSError as e:
+            logger.error(f"Could not read completion spool {self.spool_path}: {e}")
+            return
+        logger.info(f"Replaying {len(entries)} spooled report completions.")
+        items = [_Completion(schedule_id, completed_at, wait=False) for schedule_id, completed_at in entries]
+        for start in range(0, len(items), self.max_batch_size):
+            # A failed flush spools the rows again into a fresh spool file
+            self._flush(items[start:start + self.max_batch_size], skip_written=True)
+        os.remove(replay_path)
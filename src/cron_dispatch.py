@@ -0,0 +1,266 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from apscheduler.triggers.combining import OrTrigger
+from apscheduler.triggers.cron import CronTrigger
+
+logger = logging.getLogger(__name__)
+
+
+# Crontab numbers days of the week from 0 = Sunday (7 is Sunday too); APScheduler from
+# 0 = Monday. Numeric fields are rewritten with these names before parsing.
+CRONTAB_WEEKDAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+
+def _crontab_weekday_number(token: str) -> int:
+    """0-7 for a crontab day of week given as a number or a name."""
+    token = token.strip().lower()
+    if token.isdigit() and 0 <= int(token) <= 7:
+        return int(token)
+    if token in CRONTAB_WEEKDAYS:
+        return CRONTAB_WEEKDAYS.index(token)
+    raise ValueError(f"Invalid day of week '{token}': must be 0-7 (0 and 7 = Sunday) or sun-sat")
+
+
+def crontab_day_of_week(field: str) -> str:
+    """
+    Rewrites a crontab day-of-week field as a list of day names, e.g. '1-5' -> 'mon,...,fri'
+    and '0' / '7' -> 'sun', so APScheduler's Monday-based numbering never applies.
+    """
+    if field == "*":
+        return field
+    days = []
+    for item in field.split(","):
+        base, slash, step = item.partition("/")
+        try:
+            step = int(step) if slash else 1
+        except ValueError:
+            raise ValueError(f"Invalid step in day of week '{item}'")
+        if step <= 0:
+            raise ValueError(f"Invalid step in day of week '{item}'")
+        if base == "*":
+            first, last = 0, 6
+        elif "-" in base:
+            first, last = (_crontab_weekday_number(part) for part in base.split("-", 1))
+            if first > last:
+                raise ValueError(f"Invalid day of week range '{base}': the first day must not be after the last")
+        else:
+            first = _crontab_weekday_number(base)
+            # 'N/step' runs from N to the end of the week
+            last = 7 if slash else first
+        for number in range(first, last + 1, step):
+            name = CRONTAB_WEEKDAYS[number % 7]
+            if name not in days:
+                days.append(name)
+    return ",".join(days)
+
+
+def parse_cron_expr(expr: str, timezone):
+    """
+    Builds a trigger from a standard 5-field crontab expression (0 or 7 = Sunday). Raises ValueError if invalid.
+
+    As in cron, when both day of month and day of week are restricted (neither starts with '*')
+    a day matching either one fires, e.g. '0 9 1 * 1' runs on the 1st and on every Monday.
+    CronTrigger requires both to match, so such expressions become one trigger per field.
+    """
+    fields = expr.split() if expr else []
+    if len(fields) != 5:
+        raise ValueError("Cron expression must have 5 fields: minute hour day month day_of_week")
+    minute, hour, day, month, day_of_week = fields
+    weekdays = crontab_day_of_week(day_of_week)
+    if day.startswith("*") or day_of_week.startswith("*"):
+        return CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=weekdays, timezone=timezone)
+    return OrTrigger([
+        CronTrigger(minute=minute, hour=hour, day=day, month=month, timezone=timezone),
+        CronTrigger(minute=minute, hour=hour, month=month, day_of_week=weekdays, timezone=timezone),
+    ])
+
+
+def preview_fire_times(expr: str, timezone, count: int = 5, now: datetime = None) -> list:
+    """The next `count` fire times of a cron expression."""
+    trigger = parse_cron_expr(expr, timezone)
+    fire_time = now or datetime.now(timezone)
+    fire_times = []
+    previous = None
+    while len(fire_times) < count:
+        fire_time = trigger.get_next_fire_time(previous, fire_time)
+        if fire_time is None:
+            break
+        fire_times.append(fire_time)
+        previous = fire_time
+    return fire_times
+
+
+class CronDispatcher:
+    """
+    Timing wheel for cron schedules.
+
+    Instead of one APScheduler job per schedule, cron schedules are kept in slots keyed by their
+    next fire time, and a single per-minute tick job pops every due slot. Schedules that share a
+    fire time therefore cost one wakeup, and schedules that share an expression share one trigger
+    and one next-fire-time computation per slot.
+
+    Args:
+        timezone: Timezone the expressions are evaluated in (the scheduler's).
+        submit: submit(fn, *args) used to run a due schedule, e.g. ThreadPoolExecutor.submit.
+        run: run(*args, run_key=fire_time) called for a due schedule with the args given to set()
+            and the slot's fire time (identifies the run, e.g. for form_queue idempotency keys).
+        misfire_grace_seconds: Slots found later than this are skipped instead of run.
+        on_next_run: Optional on_next_run(schedule_id, fire_time or None) after every (re)scheduling.
+    """
+    def __init__(self, timezone, submit, run, misfire_grace_seconds: int = 300, on_next_run=None):
+        self._timezone = timezone
+        self._submit = submit
+        self._run = run
+        self._misfire_grace = timedelta(seconds=misfire_grace_seconds)
+        self._on_next_run = on_next_run
+        self._lock = threading.Lock()
+        self._triggers = {}   # cron_expr -> trigger (shared)
+        self._entries = {}    # schedule_id -> (cron_expr, args, fire_time)
+        self._slots = {}      # fire_time -> set of schedule_ids
+        self._heap = []       # fire times that have a slot
+        self._running = set()
+        self._stats = {"ticks": 0, "slots_fired": 0, "runs_submitted": 0, "skipped_running": 0, "missed": 0}
+
+    # --- Registration ---
+    def set(self, schedule_id: int, cron_expr: str, args=(), now: datetime = None):
+        """Adds or replaces a schedule. Raises ValueError for an invalid expression."""
+        self.load([(schedule_id, cron_expr, args)], now=now)
+
+    def load(self, entries, now: datetime = None):
+        """Adds or replaces many (schedule_id, cron_expr, args) entries at once."""
+        now = now or datetime.now(self._timezone)
+        scheduled = []
+        with self._lock:
+            next_by_expr = {}
+            for schedule_id, cron_expr, args in entries:
+                if cron_expr not in next_by_expr:
+                    trigger = self._trigger_locked(cron_expr)
+                    next_by_expr[cron_expr] = trigger.get_next_fire_time(None, now)
+                fire_time = next_by_expr[cron_expr]
+                self._remove_locked(schedule_id)
+                self._insert_locked(schedule_id, cron_expr, tuple(args), fire_time)
+                scheduled.append((schedule_id, fire_time))
+        self._notify(scheduled)
+
+    def remove(self, schedule_id: int):
+        with self._lock:
+            removed = self._remove_locked(schedule_id)
+        if removed:
+            self._notify([(schedule_id, None)])
+
+    def schedule_ids(self) -> set:
+        with self._lock:
+            return set(self._entries)
+
+    def next_fire_time(self, schedule_id: int):
+        with self._lock:
+            entry = self._entries.get(schedule_id)
+            return entry[2] if entry else None
+
+    # --- Dispatch ---
+    def tick(self, now: datetime = None):
+        """Runs every due slot and moves its schedules to their next slot. Called once a minute."""
+        now = now or datetime.now(self._timezone)
+        due = []
+        with self._lock:
+            self._stats["ticks"] += 1
+            while self._heap and self._heap[0] <= now:
+                fire_time = heapq.heappop(self._heap)
+                schedule_ids = self._slots.pop(fire_time, None)
+                if schedule_ids:
+                    due.append((fire_time, schedule_ids))
+
+            to_run = []
+            scheduled = []
+            for fire_time, schedule_ids in due:
+                self._stats["slots_fired"] += 1
+                missed = now - fire_time > self._misfire_grace
+                # Strictly after both the slot and now, so a late tick coalesces missed fires
+                start = max(fire_time, now) + timedelta(microseconds=1)
+                next_by_expr = {}
+                for schedule_id in schedule_ids:
+                    cron_expr, args, _ = self._entries[schedule_id]
+                    if missed:
+                        self._stats["missed"] += 1
+                    else:
+                        to_run.append((schedule_id, args, fire_time))
+                    if cron_expr not in next_by_expr:
+                        next_by_expr[cron_expr] = self._triggers[cron_expr].get_next_fire_time(None, start)
+                    next_fire_time = next_by_expr[cron_expr]
+                    self._insert_locked(schedule_id, cron_expr, args, next_fire_time)
+                    scheduled.append((schedule_id, next_fire_time))
+                if missed:
+                    logger.warning(f"Cron slot {fire_time} missed by more than {self._misfire_grace}; skipped {len(schedule_ids)} schedules.")
+
+        for schedule_id, args, fire_time in to_run:
+            self._submit_run(schedule_id, args, fire_time)
+        self._notify(scheduled)
+        if due:
+            logger.info(f"Cron tick: {len(due)} slots due, {len(to_run)} runs submitted.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "schedules": len(self._entries), "slots": len(self._slots),
+                    "running": len(self._running), "distinct_expressions": len(self._triggers)}
+
+    # --- Internals ---
+    def _trigger_locked(self, cron_expr: str):
+        trigger = self._triggers.get(cron_expr)
+        if trigger is None:
+            trigger = parse_cron_expr(cron_expr, self._timezone)
+            self._triggers[cron_expr] = trigger
+        return trigger
+
+    def _insert_locked(self, schedule_id, cron_expr, args, fire_time):
+        self._entries[schedule_id] = (cron_expr, args, fire_time)
+        if fire_time is None:
+            return
+        slot = self._slots.get(fire_time)
+        if slot is None:
+            slot = self._slots[fire_time] = set()
+            heapq.heappush(self._heap, fire_time)
+        slot.add(schedule_id)
+
+    def _remove_locked(self, schedule_id) -> bool:
+        entry = self._entries.pop(schedule_id, None)
+        if entry is None:
+            return False
+        slot = self._slots.get(entry[2])
+        if slot is not None:
+            slot.discard(schedule_id)
+            # The empty slot's heap entry is dropped lazily by tick()
+        return True
+
+    def _submit_run(self, schedule_id, args, fire_time):
+        with self._lock:
+            if schedule_id in self._running:
+                # Same rule as APScheduler's max_instances=1
+                self._stats["skipped_running"] += 1
+                logger.warning(f"Cron run for schedule {schedule_id} skipped: previous run still in progress.")
+                return
+            self._running.add(schedule_id)
+            self._stats["runs_submitted"] += 1
+        try:
+            self._submit(self._run_and_release, schedule_id, args, fire_time)
+        except Exception as e:
+            logger.error(f"Failed to submit cron run for schedule {schedule_id}: {e}", exc_info=True)
+            with self._lock:
+                self._running.discard(schedule_id)
+
+    def _run_and_release(self, schedule_id, args, fire_time):
+        try:
+            self._run(*args, run_key=fire_time)
+        except Exception as e:
+            logger.error(f"Cron run for schedule {schedule_id} failed: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._running.discard(schedule_id)
+
+    def _notify(self, scheduled):
+        if self._on_next_run is None:
+            return
+        for schedule_id, fire_time in scheduled:
+            self._on_next_run(schedule_id, fire_time)
@@ -0,0 +1,70 @@
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# --- Event types ---
+# A scheduled report action finished; payload: schedule_id
+REPORT_COMPLETED = "report_completed"
+# The alert sound for a schedule was played; payload: schedule_id
+ALERT_TRIGGERED = "alert_triggered"
+# A composite report run finished; payload: schedule_id, outcomes ({action: outcome})
+REPORT_RUN_FINISHED = "report_run_finished"
+# Messages were added to the outbox; no payload
+OUTBOX_ENQUEUED = "outbox_enqueued"
+# Google Form submissions were queued; no payload
+FORM_SUBMISSION_ENQUEUED = "form_submission_enqueued"
+# Schedules' Excel files went missing or came back; payload: schedule_ids
+EXCEL_PATHS_CHANGED = "excel_paths_changed"
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus used by the APScheduler jobs to reach the Flask app
+    without a loopback HTTP request. Handlers run synchronously in the publishing thread.
+    """
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: str, handler):
+        """Registers handler(**payload) for event_type. Returns the handler for decorator use."""
+        with self._lock:
+            if handler not in self._subscribers[event_type]:
+                self._subscribers[event_type].append(handler)
+        return handler
+
+    def unsubscribe(self, event_type: str, handler):
+        with self._lock:
+            if handler in self._subscribers[event_type]:
+                self._subscribers[event_type].remove(handler)
+
+    def has_subscribers(self, event_type: str) -> bool:
+        with self._lock:
+            return bool(self._subscribers[event_type])
+
+    def publish(self, event_type: str, **payload) -> bool:
+        """
+        Delivers the event to every subscriber.
+        Returns True if there was at least one subscriber and none of them raised or returned False.
+        """
+        with self._lock:
+            handlers = list(self._subscribers[event_type])
+        if not handlers:
+            logger.debug(f"No subscribers for event '{event_type}' (payload: {payload})")
+            return False
+
+        success = True
+        for handler in handlers:
+            try:
+                if handler(**payload) is False:
+                    success = False
+            except Exception as e:
+                logger.error(f"Subscriber {getattr(handler, '__name__', handler)} failed for event '{event_type}': {e}", exc_info=True)
+                success = False
+        return success
+
+
+# Shared bus for the whole process
+bus = EventBus()
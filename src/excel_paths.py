@@ -0,0 +1,303 @@
+import datetime
+import logging
+import os
+import threading
+from collections import defaultdict, namedtuple
+
+from config import settings
+from models import Schedule
+from . import events
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the directories holding the schedules' Excel files
+EXCEL_PATH_POLL_INTERVAL_SECONDS = float(os.getenv("EXCEL_PATH_POLL_INTERVAL_SECONDS", "30"))
+# Reject schedules whose Excel file does not exist when they are saved (false: save and flag them)
+EXCEL_PATH_REQUIRE_EXISTS = os.getenv("EXCEL_PATH_REQUIRE_EXISTS", "true").lower() in ("1", "true", "yes", "on")
+
+# A schedule's Excel path as resolved at save time or by the last check.
+# path: absolute path (None if it cannot be resolved, see error); inode / mtime_ns: identity
+# of the file when last seen; missing_since: set while the file does not exist.
+ResolvedPath = namedtuple("ResolvedPath", ["excel_path", "path", "inode", "mtime_ns", "missing_since", "error"])
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def resolve(excel_path: str) -> str:
+    """Absolute path of a schedule's excel_path (relative paths are under EXCEL_BASE_PATH). No file access."""
+    excel_path = os.path.expanduser(excel_path.strip())
+    if os.path.isabs(excel_path):
+        return os.path.normpath(excel_path)
+    base_path = settings.excel_base_path
+    if not base_path:
+        raise ValueError(f"'{excel_path}' is a relative path but EXCEL_BASE_PATH is not set in .env")
+    return os.path.normpath(os.path.join(base_path, excel_path))
+
+
+def check(excel_path: str, previous: ResolvedPath = None) -> ResolvedPath:
+    """Resolves and stats excel_path once. missing_since carries over from previous if still missing."""
+    try:
+        path = resolve(excel_path)
+    except ValueError as e:
+        return ResolvedPath(excel_path, None, None, None, _missing_since(previous), str(e))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ResolvedPath(excel_path, path, None, None, _missing_since(previous), None)
+    if not os.path.isfile(path):
+        return ResolvedPath(excel_path, path, None, None, _missing_since(previous), f"'{path}' is not a file")
+    return ResolvedPath(excel_path, path, st.st_ino, st.st_mtime_ns, None, None)
+
+
+def _missing_since(previous: ResolvedPath):
+    return previous.missing_since if previous is not None and previous.missing_since else _utcnow()
+
+
+def validation_error(entry: ResolvedPath, require_exists: bool = EXCEL_PATH_REQUIRE_EXISTS):
+    """Error message for saving a schedule with this path, or None."""
+    if entry.error:
+        return f"Invalid excel_path: {entry.error}"
+    if entry.missing_since and require_exists:
+        return f"Invalid excel_path: '{entry.path}' does not exist"
+    return None
+
+
+def apply_to_schedule(schedule, entry: ResolvedPath):
+    """Stores the resolved path and missing flag on the Schedule row."""
+    schedule.excel_resolved_path = entry.path if entry is not None else None
+    schedule.excel_missing_since = entry.missing_since if entry is not None else None
+
+
+class ExcelPathCache:
+    """
+    Resolved Excel path per schedule, so a firing job opens the file without joining paths or
+    calling stat (slow on network drives).
+
+    Paths are checked when a schedule is saved (put) and then by a background thread that stats
+    each directory holding a tracked file every poll_interval; only a directory whose mtime
+    changed (a file added, removed, renamed or replaced by a save) is listed again. Files that
+    disappear are flagged: Schedule.excel_missing_since is set, events.EXCEL_PATHS_CHANGED is
+    published, and the job skips the file until it is back. Changing EXCEL_BASE_PATH in .env
+    re-resolves every path.
+    """
+    def __init__(self, session_factory, poll_interval: float = EXCEL_PATH_POLL_INTERVAL_SECONDS):
+        self._session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dir_mtimes = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._loaded = False
+        self._stats = {"hits": 0, "misses": 0, "checks": 0, "dir_scans": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        settings.on_reload(self._settings_reloaded)
+        self._thread = threading.Thread(target=self._run, name="excel-path-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Excel path watcher started (every {self.poll_interval:.0f} s).")
+
+    def stop(self, timeout: float = 10):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Excel path watcher stopped.")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if not self._loaded:
+                    self.load()
+                self.check_once()
+            except Exception as e:
+                logger.error(f"Excel path check failed: {e}", exc_info=True)
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _settings_reloaded(self, _settings):
+        # EXCEL_BASE_PATH may have changed: re-resolve the paths now, re-check the files next
+        with self._lock:
+            for schedule_id, entry in list(self._entries.items()):
+                try:
+                    path = resolve(entry.excel_path)
+                except ValueError as e:
+                    self._entries[schedule_id] = entry._replace(path=None, error=str(e))
+                    continue
+                if path != entry.path:
+                    self._entries[schedule_id] = entry._replace(path=path, inode=None, mtime_ns=None, error=None)
+            self._dir_mtimes.clear()
+        self._wakeup.set()
+
+    # --- Lookups ---
+    def load(self):
+        """Checks the Excel path of every schedule in the database (once, from the watcher thread)."""
+        session = self._session_factory()
+        try:
+            rows = (session.query(Schedule.id, Schedule.excel_path, Schedule.excel_resolved_path,
+                                  Schedule.excel_missing_since)
+                    .filter(Schedule.excel_path.isnot(None), Schedule.excel_path != "").all())
+        finally:
+            session.close()
+        checked = {}
+        stale = {}
+        for schedule_id, excel_path, resolved_path, missing_since in rows:
+            previous = ResolvedPath(excel_path, resolved_path, None, None, missing_since, None)
+            entry = checked[schedule_id] = check(excel_path, previous)
+            if entry.missing_since or entry.error:
+                logger.warning(f"Excel file of schedule {schedule_id} is missing: {entry.error or entry.path}")
+            if (entry.path, entry.missing_since) != (resolved_path, missing_since):
+                stale[schedule_id] = entry
+        with self._lock:
+            for schedule_id, entry in checked.items():
+                # A schedule saved while loading is already up to date
+                self._entries.setdefault(schedule_id, entry)
+            self._loaded = True
+        self._persist(stale)
+        logger.info(f"Excel path cache loaded with {len(checked)} schedules ({len(self.missing())} missing).")
+
+    def lookup(self, schedule_id: int, excel_path: str) -> ResolvedPath:
+        """The cached entry (no file access); checked and cached now if the path is not known yet."""
+        with self._lock:
+            entry = self._entries.get(schedule_id)
+            if entry is not None and entry.excel_path == excel_path:
+                self._stats["hits"] += 1
+                return entry
+            self._stats["misses"] += 1
+        return self.put(schedule_id, check(excel_path))
+
+    def put(self, schedule_id: int, entry: ResolvedPath) -> ResolvedPath:
+        """Caches an entry checked at save time."""
+        with self._lock:
+            self._entries[schedule_id] = entry
+        return entry
+
+    def forget(self, schedule_id: int):
+        with self._lock:
+            self._entries.pop(schedule_id, None)
+
+    def missing(self) -> dict:
+        """{schedule_id: entry} of the schedules whose Excel file is missing or invalid."""
+        with self._lock:
+            return {schedule_id: entry for schedule_id, entry in self._entries.items()
+                    if entry.missing_since or entry.error}
+
+    # --- Watching ---
+    def check_once(self) -> list:
+        """Re-checks the files in directories that changed since the last check. Returns the changed schedule IDs."""
+        with self._lock:
+            entries = dict(self._entries)
+            dir_mtimes = dict(self._dir_mtimes)
+            self._stats["checks"] += 1
+        by_dir = defaultdict(list)
+        recheck = {}
+        for schedule_id, entry in entries.items():
+            if entry.path is None:
+                # Unresolvable: try again (EXCEL_BASE_PATH may be set by now)
+                recheck[schedule_id] = check(entry.excel_path, entry if entry.missing_since else None)
+            else:
+                by_dir[os.path.dirname(entry.path)].append(schedule_id)
+
+        new_dir_mtimes = {}
+        scans = 0
+        for directory, schedule_ids in by_dir.items():
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            new_dir_mtimes[directory] = mtime_ns
+            if mtime_ns is not None and dir_mtimes.get(directory) == mtime_ns:
+                continue
+            scans += 1
+            listing = self._scan(directory) if mtime_ns is not None else {}
+            for schedule_id in schedule_ids:
+                entry = entries[schedule_id]
+                found = listing.get(os.path.basename(entry.path))
+                if found is None:
+                    recheck[schedule_id] = entry if entry.missing_since else entry._replace(
+                        inode=None, mtime_ns=None, missing_since=_utcnow())
+                elif entry.missing_since or (found[0], found[1]) != (entry.inode, entry.mtime_ns):
+                    recheck[schedule_id] = entry._replace(inode=found[0], mtime_ns=found[1], missing_since=None, error=None)
+
+        changed = {}
+        with self._lock:
+            self._dir_mtimes = new_dir_mtimes
+            self._stats["dir_scans"] += scans
+            for schedule_id, entry in recheck.items():
+                current = self._entries.get(schedule_id)
+                # Skip schedules edited or deleted while checking
+                if current is None or current.excel_path != entry.excel_path:
+                    continue
+                self._entries[schedule_id] = entry
+                if (bool(current.missing_since or current.error), current.path) != \
+                        (bool(entry.missing_since or entry.error), entry.path):
+                    changed[schedule_id] = entry
+        if changed:
+            for schedule_id, entry in changed.items():
+                if entry.missing_since or entry.error:
+                    logger.warning(f"Excel file of schedule {schedule_id} is missing: {entry.error or entry.path}")
+                else:
+                    logger.info(f"Excel file of schedule {schedule_id} is available: {entry.path}")
+            self._persist(changed)
+            events.bus.publish(events.EXCEL_PATHS_CHANGED, schedule_ids=list(changed))
+        return list(changed)
+
+    @staticmethod
+    def _scan(directory: str) -> dict:
+        """{file name: (inode, mtime_ns)} of the regular files in directory."""
+        listing = {}
+        try:
+            with os.scandir(directory) as it:
+                for dir_entry in it:
+                    try:
+                        if dir_entry.is_file():
+                            st = dir_entry.stat()
+                            listing[dir_entry.name] = (st.st_ino, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Could not list Excel directory '{directory}': {e}")
+        return listing
+
+    def _persist(self, entries: dict):
+        if not entries:
+            return
+        session = self._session_factory()
+        try:
+            for schedule in session.query(Schedule).filter(Schedule.id.in_(list(entries))):
+                apply_to_schedule(schedule, entries[schedule.id])
+            session.commit()
+        finally:
+            session.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached"] = len(self._entries)
+            stats["directories"] = len(self._dir_mtimes)
+        stats["missing"] = len(self.missing())
+        return stats
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache(session_factory=None) -> ExcelPathCache:
+    """Process-wide cache, created on first use (the app passes its session factory)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            if session_factory is None:
+                from db import SessionLocal as session_factory
+            _default_cache = ExcelPathCache(session_factory)
+        return _default_cache
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Action types executed by report runs (see jobs.run_report)
+ALERT_SOUND = "alert_sound"
+EXCEL = "excel"
+GOOGLE_FORM = "google_form"
+VOICE_REPORT = "voice_report"
+
+# Default (max concurrent, max queued) per action type.
+# Audio is played one clip at a time; browser and file launches are capped so a burst of
+# schedules does not spawn dozens of processes at once.
+DEFAULT_LIMITS = {
+    ALERT_SOUND: (1, 20),
+    EXCEL: (2, 100),
+    GOOGLE_FORM: (2, 100),
+    # One microphone: voice dialogs run one at a time
+    VOICE_REPORT: (1, 20),
+}
+
+
+class ActionQueueFull(Exception):
+    """Raised by ActionExecutor.submit when an action type's queue is at its limit (backpressure)."""
+
+
+class _ActionPool:
+    def __init__(self, action: str, max_workers: int, max_queued: int):
+        self.action = action
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"action-{action}")
+        self.queued = 0
+        self.running = 0
+        self.counts = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class ActionExecutor:
+    """
+    Separate bounded thread pools per action type, so a slow or stuck action (e.g. a long alert
+    clip or a hanging browser launch) never holds up the others or APScheduler's own threads.
+
+    Each pool has a concurrency cap and a queue limit; submitting beyond the queue limit raises
+    ActionQueueFull instead of letting work pile up behind a stalled action.
+    """
+    def __init__(self, limits: dict = None):
+        self._lock = threading.Lock()
+        self._pools = {
+            action: _ActionPool(action, max_workers, max_queued)
+            for action, (max_workers, max_queued) in (limits or DEFAULT_LIMITS).items()
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Limits from ACTION_<TYPE>_WORKERS / ACTION_<TYPE>_MAX_QUEUED, e.g. ACTION_ALERT_SOUND_WORKERS=1."""
+        limits = {}
+        for action, (max_workers, max_queued) in DEFAULT_LIMITS.items():
+            prefix = f"ACTION_{action.upper()}"
+            limits[action] = (
+                int(os.getenv(f"{prefix}_WORKERS", str(max_workers))),
+                int(os.getenv(f"{prefix}_MAX_QUEUED", str(max_queued))),
+            )
+        return cls(limits)
+
+    def submit(self, action: str, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) on the pool of `action` and returns its Future."""
+        pool = self._pools[action]
+        with self._lock:
+            if pool.queued >= pool.max_queued:
+                pool.counts["rejected"] += 1
+                raise ActionQueueFull(f"'{action}' queue is full ({pool.queued} waiting, {pool.running} running)")
+            pool.queued += 1
+            pool.counts["submitted"] += 1
+        return pool.executor.submit(self._run, pool, time.monotonic(), fn, args, kwargs)
+
+    def _run(self, pool: _ActionPool, queued_at: float, fn, args, kwargs):
+        wait = time.monotonic() - queued_at
+        with self._lock:
+            pool.queued -= 1
+            pool.running += 1
+            pool.total_wait += wait
+            pool.max_wait = max(pool.max_wait, wait)
+        if wait > 5:
+            logger.warning(f"'{pool.action}' action waited {wait:.1f}s for a free worker.")
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = result is False
+            return result
+        finally:
+            with self._lock:
+                pool.running -= 1
+                pool.counts["failed" if failed else "completed"] += 1
+
+    def stats(self) -> dict:
+        """Queue depth, running count and counters per action type."""
+        with self._lock:
+            stats = {}
+            for action, pool in self._pools.items():
+                started = pool.counts["completed"] + pool.counts["failed"] + pool.running
+                stats[action] = {
+                    "max_workers": pool.max_workers,
+                    "max_queued": pool.max_queued,
+                    "queued": pool.queued,
+                    "running": pool.running,
+                    **pool.counts,
+                    "avg_queue_wait_ms": round(pool.total_wait / started * 1000, 1) if started else 0.0,
+                    "max_queue_wait_ms": round(pool.max_wait * 1000, 1),
+                }
+            return stats
+
+    def shutdown(self, wait: bool = True):
+        for pool in self._pools.values():
+            pool.executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_action_executor() -> ActionExecutor:
+    """Process-wide executor, created from the environment on first use."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = ActionExecutor.from_env()
+        return _default_executor
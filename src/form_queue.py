@@ -0,0 +1,244 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from models import FormSubmission
+from . import integrations
+
+logger = logging.getLogger(__name__)
+
+# FormSubmission.status of queued rows ("SUCCESS" / "FAILED" once done)
+PENDING = "PENDING"
+SENDING = "SENDING"
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+
+FORM_MAX_ATTEMPTS = int(os.getenv("FORM_MAX_ATTEMPTS", "5"))
+FORM_RETRY_BASE_SECONDS = float(os.getenv("FORM_RETRY_BASE_SECONDS", "30"))
+FORM_POLL_INTERVAL_SECONDS = float(os.getenv("FORM_POLL_INTERVAL_SECONDS", "5"))
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def make_idempotency_key(schedule_id: int, form_id: str, data: dict, run_key) -> str:
+    """
+    Same schedule, form, answers and run -> same key, so a retried run is submitted once.
+    run_key identifies the run (its scheduled fire time or ReportHistory id); a schedule firing
+    several times a day gets one key per run.
+    """
+    if isinstance(run_key, (datetime.datetime, datetime.date)):
+        run_key = run_key.isoformat()
+    canonical = json.dumps([schedule_id, form_id, data, str(run_key)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def enqueue_form_submission(session, schedule_id: int, responses: dict, run_key, idempotency_key: str = None,
+                            form_id: str = None):
+    """
+    Queues a Google Form submission in the caller's session (committed with it).
+    responses uses GOOGLE_ENTRY_* keys; they are mapped to entry IDs now.
+
+    A submission whose idempotency key (by default from run_key, see make_idempotency_key) is
+    already queued or sent is not queued again.
+    Returns (FormSubmission, created). Raises integrations.IntegrationDisabled if
+    GOOGLE_FORM_ID is not set.
+    """
+    google_forms = integrations.load(integrations.GOOGLE_FORMS)
+    form_id = form_id or settings.GOOGLE_FORM_ID
+    data = google_forms.form_data(responses)
+    key = idempotency_key or make_idempotency_key(schedule_id, form_id, data, run_key)
+    existing = session.query(FormSubmission).filter(FormSubmission.idempotency_key == key).first()
+    if existing is not None:
+        logger.info(f"Form submission for schedule {schedule_id} already queued as #{existing.id} ({existing.status}).")
+        return existing, False
+    now = _utcnow()
+    submission = FormSubmission(
+        schedule_id=schedule_id, form_id=form_id, payload_json=json.dumps(data, ensure_ascii=False),
+        status=PENDING, idempotency_key=key, queued_at=now, next_attempt_at=now, attempts=0,
+    )
+    try:
+        with session.begin_nested():
+            session.add(submission)
+    except IntegrityError:
+        # Queued concurrently by another thread
+        return session.query(FormSubmission).filter(FormSubmission.idempotency_key == key).one(), False
+    return submission, True
+
+
+class FormSubmissionSender:
+    """
+    Background thread submitting queued FormSubmission rows to Google Forms.
+
+    Each row is POSTed once per attempt through the pooled Google Forms client (its own
+    retries are disabled, so the attempt count here is the number of POSTs). Connection
+    errors, 429 and 5xx are retried with exponential backoff up to max_attempts; other 4xx
+    fail at once. Attempts, last error and submit latency are stored on the row, and
+    schedule_stats() reports latency and success rate per schedule.
+    """
+    def __init__(self, session_factory, post=None, max_attempts: int = FORM_MAX_ATTEMPTS,
+                 retry_base: float = FORM_RETRY_BASE_SECONDS, poll_interval: float = FORM_POLL_INTERVAL_SECONDS,
+                 batch_size: int = 50):
+        self._session_factory = session_factory
+        self._post = post
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "retried": 0, "failed": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._requeue_interrupted()
+        self._thread = threading.Thread(target=self._run, name="form-sender", daemon=True)
+        self._thread.start()
+        logger.info("Form submission sender started.")
+
+    def stop(self, timeout: float = 10):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Form submission sender stopped.")
+
+    def wakeup(self, **_):
+        """Send now instead of at the next poll. Subscribed to events.FORM_SUBMISSION_ENQUEUED."""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                sent = self.send_once()
+            except Exception as e:
+                logger.error(f"Form submission sender failed: {e}", exc_info=True)
+                sent = 0
+            if sent:
+                continue
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _requeue_interrupted(self):
+        session = self._session_factory()
+        try:
+            count = (session.query(FormSubmission).filter(FormSubmission.status == SENDING)
+                     .update({"status": PENDING}, synchronize_session=False))
+            session.commit()
+            if count:
+                # The POST may have gone through before the crash; Google Forms has no dedupe of its own
+                logger.warning(f"Re-queued {count} form submissions interrupted while sending.")
+        finally:
+            session.close()
+
+    # --- Sending ---
+    def send_once(self) -> int:
+        """Sends the due submissions. Returns how many were attempted."""
+        session = self._session_factory()
+        try:
+            due = (session.query(FormSubmission)
+                   .filter(FormSubmission.status == PENDING, FormSubmission.next_attempt_at <= _utcnow())
+                   .order_by(FormSubmission.id).limit(self.batch_size).all())
+            for row in due:
+                row.status = SENDING
+                row.attempts = (row.attempts or 0) + 1
+            session.commit()
+            work = [(row.id, row.form_id, json.loads(row.payload_json)) for row in due]
+        finally:
+            session.close()
+
+        for submission_id, form_id, data in work:
+            started = time.perf_counter()
+            error = None
+            try:
+                (self._post or _default_post)(data, form_id)
+            except Exception as e:
+                error = e
+                logger.warning(f"Form submission #{submission_id} failed: {e}")
+            self._record_outcome(submission_id, error, int((time.perf_counter() - started) * 1000))
+        return len(work)
+
+    def _record_outcome(self, submission_id: int, error, latency_ms: int):
+        now = _utcnow()
+        session = self._session_factory()
+        try:
+            row = session.get(FormSubmission, submission_id)
+            row.latency_ms = latency_ms
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+            permanent = status_code is not None and 400 <= status_code < 500 and status_code != 429
+            if error is None:
+                row.status, row.submitted_at, row.last_error = SUCCESS, now, None
+                counter = "submitted"
+            elif permanent or row.attempts >= self.max_attempts:
+                row.status, row.last_error = FAILED, str(error)
+                counter = "failed"
+            else:
+                row.status, row.last_error = PENDING, str(error)
+                row.next_attempt_at = now + datetime.timedelta(seconds=self.retry_base * 2 ** (row.attempts - 1))
+                counter = "retried"
+            session.commit()
+        finally:
+            session.close()
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        session = self._session_factory()
+        try:
+            stats["pending"] = session.query(FormSubmission).filter(FormSubmission.status == PENDING).count()
+        finally:
+            session.close()
+        return stats
+
+
+def schedule_stats(session) -> dict:
+    """Per schedule: queued submissions by outcome, success rate, attempts and submit latency."""
+    is_success = case((FormSubmission.status == SUCCESS, 1), else_=0)
+    is_failed = case((FormSubmission.status == FAILED, 1), else_=0)
+    rows = (session.query(
+                FormSubmission.schedule_id,
+                func.count(FormSubmission.id),
+                func.sum(is_success),
+                func.sum(is_failed),
+                func.avg(FormSubmission.attempts),
+                func.avg(case((FormSubmission.status == SUCCESS, FormSubmission.latency_ms))),
+                func.max(case((FormSubmission.status == SUCCESS, FormSubmission.latency_ms))),
+            )
+            .filter(FormSubmission.idempotency_key.isnot(None))
+            .group_by(FormSubmission.schedule_id).all())
+    stats = {}
+    for schedule_id, total, succeeded, failed, avg_attempts, avg_latency, max_latency in rows:
+        succeeded, failed = succeeded or 0, failed or 0
+        stats[schedule_id] = {
+            "total": total,
+            "succeeded": succeeded,
+            "failed": failed,
+            "pending": total - succeeded - failed,
+            "success_rate": round(succeeded / (succeeded + failed), 3) if succeeded + failed else None,
+            "avg_attempts": round(avg_attempts, 2) if avg_attempts is not None else None,
+            "avg_latency_ms": round(avg_latency, 1) if avg_latency is not None else None,
+            "max_latency_ms": max_latency,
+        }
+    return stats
+
+
+def _default_post(data: dict, form_id: str):
+    return integrations.load(integrations.GOOGLE_FORMS).post_form_data(data, form_id, max_retries=0)
@@ -1,24 +1,36 @@
 import requests
 from config import settings
+from .http_client import get_client, GOOGLE_FORMS
 
-# Google Form ID from environment
-FORM_ID = settings.GOOGLE_FORM_ID
-# Entry field env var keys and corresponding entry IDs
-ENTRY_ENV_KEYS = [key for key in settings.dict().keys() if key.startswith("GOOGLE_ENTRY")]
+# The form ID (GOOGLE_FORM_ID) and the 'GOOGLE_ENTRY_1' -> 'entry.123456' map are read from
+# settings at call time; both are validated and precomputed once per .env load.
 
 
-def submit_google_form(responses: dict[str, str]) -> requests.Response:
+def form_url(form_id: str = None) -> str:
+    return f"https://docs.google.com/forms/d/e/{form_id or settings.GOOGLE_FORM_ID}/formResponse"
+
+
+def form_data(responses: dict[str, str]) -> dict[str, str]:
+    """
+    Map GOOGLE_ENTRY_* keys to the form's entry IDs; keys without an entry ID are dropped.
+    """
+    entry_ids = settings.google_entry_ids
+    return {entry_ids[key]: value for key, value in responses.items() if key in entry_ids}
+
+
+def post_form_data(data: dict[str, str], form_id: str = None, max_retries: int = None) -> requests.Response:
     """
-    Submit responses to Google Form. 
-    'responses' keys should match ENTRY_ENV_KEYS (e.g. 'GOOGLE_ENTRY_1').
+    POST already mapped form data (entry IDs as keys) through the pooled Google Forms client.
     """
-    form_url = f"https://docs.google.com/forms/d/e/{FORM_ID}/formResponse"
-    # Map entry IDs to provided answers
-    data = {
-        getattr(settings, key): responses[key]
-        for key in ENTRY_ENV_KEYS
-        if key in responses
-    }
-    response = requests.post(form_url, data=data)
+    response = get_client(GOOGLE_FORMS).post(form_url(form_id), data=data, max_retries=max_retries)
     response.raise_for_status()
     return response
+
+
+def submit_google_form(responses: dict[str, str]) -> requests.Response:
+    """
+    Submit responses to Google Form right away.
+    'responses' keys should match the GOOGLE_ENTRY_* settings (e.g. 'GOOGLE_ENTRY_1').
+    Scheduled reports queue their answers with form_queue.enqueue_form_submission instead.
+    """
+    return post_form_data(form_data(responses))
@@ -1,50 +1,389 @@
 import os
 import json
-import requests
-from msal import ConfidentialClientApplication
+import logging
+import threading
+import time
+from urllib.parse import quote
 from config import settings
+from .http_client import get_client, GRAPH
 
-# Acquire token for Microsoft Graph
-CLIENT_ID = settings.MS_CLIENT_ID
-TENANT_ID = settings.MS_TENANT_ID
-CLIENT_SECRET = settings.MS_CLIENT_SECRET
+logger = logging.getLogger(__name__)
 
-AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
+# Acquire token for Microsoft Graph (MS_CLIENT_ID / MS_TENANT_ID / MS_CLIENT_SECRET from settings)
+AUTHORITY_BASE_URL = "https://login.microsoftonline.com"
 SCOPE = ["https://graph.microsoft.com/.default"]
+# Overridable to point the writer at a mock server
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+# Tokens survive restarts instead of being requested again by every new process
+MS_TOKEN_CACHE_PATH = os.getenv("MS_TOKEN_CACHE_PATH", ".msal_token_cache.json")
 
-app = ConfidentialClientApplication(
-    client_id=CLIENT_ID,
-    client_credential=CLIENT_SECRET,
-    authority=AUTHORITY,
-)
+# Graph accepts at most 20 requests per $batch
+GRAPH_BATCH_LIMIT = 20
+# Unchanged cells between two changed ones on a row are rewritten rather than split into
+# another range when the gap is at most this many cells
+DIFF_MERGE_GAP = 2
+# Estimated cost of one more range request, in cells: nearby rectangles are merged when the
+# unchanged cells this adds stay below it
+DIFF_RANGE_OVERHEAD_CELLS = 40
+RETRY_STATUSES = {424, 429, 500, 502, 503, 504}
+
+# Status of TPEntry rows written by GraphExcelWriter
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+UNCHANGED = "UNCHANGED"
+
+# msal is imported with the first token request (it is slow to import)
+_token_cache = None
+_msal_app = None
+_msal_credentials = None
+_token_lock = threading.Lock()
+
+
+def _load_token_cache():
+    global _token_cache
+    from msal import SerializableTokenCache
+    _token_cache = SerializableTokenCache()
+    if os.path.exists(MS_TOKEN_CACHE_PATH):
+        try:
+            with open(MS_TOKEN_CACHE_PATH, encoding="utf-8") as f:
+                _token_cache.deserialize(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable token cache {MS_TOKEN_CACHE_PATH}: {e}")
+
+
+def _save_token_cache():
+    if _token_cache is None or not _token_cache.has_state_changed:
+        return
+    tmp_path = f"{MS_TOKEN_CACHE_PATH}.tmp"
+    # The cache holds access tokens: readable by the owner only
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(_token_cache.serialize())
+    os.replace(tmp_path, MS_TOKEN_CACHE_PATH)
+    _token_cache.has_state_changed = False
+
+
+def _get_msal_app():
+    global _msal_app, _msal_credentials
+    # Rebuilt when a settings reload changed the app registration
+    credentials = (settings.MS_CLIENT_ID, settings.MS_TENANT_ID, settings.MS_CLIENT_SECRET)
+    if _msal_app is None or credentials != _msal_credentials:
+        from msal import ConfidentialClientApplication
+        _load_token_cache()
+        client_id, tenant_id, client_secret = credentials
+        _msal_app = ConfidentialClientApplication(
+            client_id=client_id,
+            client_credential=client_secret,
+            authority=f"{AUTHORITY_BASE_URL}/{tenant_id}",
+            token_cache=_token_cache,
+        )
+        _msal_credentials = credentials
+    return _msal_app
 
-# Token cache can be implemented here or left default
 
 def get_access_token():
     """
     Acquire access token for Graph API.
+    Served from the token cache (persisted to MS_TOKEN_CACHE_PATH) until it expires.
     """
-    result = app.acquire_token_silent(SCOPE, account=None)
-    if not result:
-        result = app.acquire_token_for_client(scopes=SCOPE)
+    with _token_lock:
+        app = _get_msal_app()
+        result = app.acquire_token_silent(SCOPE, account=None)
+        if not result:
+            result = app.acquire_token_for_client(scopes=SCOPE)
+        _save_token_cache()
     if "access_token" in result:
         return result["access_token"]
     else:
         raise Exception(f"Could not acquire token: {result.get('error_description')}")
 
 
-def update_excel_sheet(file_url: str, sheet_name: str, values: list[list[str]]):
+# --- Diffing ---
+
+def _column_letters(col: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    letters = ""
+    col += 1
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def range_address(top: int, left: int, bottom: int, right: int) -> str:
+    """A1-style address of a 0-based, inclusive rectangle, e.g. (1, 1, 2, 3) -> B2:D3."""
+    start = f"{_column_letters(left)}{top + 1}"
+    end = f"{_column_letters(right)}{bottom + 1}"
+    return start if start == end else f"{start}:{end}"
+
+
+def _cell(values: list, row: int, col: int):
+    if row < len(values) and col < len(values[row]):
+        value = values[row][col]
+        return "" if value is None else value
+    return ""
+
+
+def diff_ranges(old: list, new: list, gap: int = DIFF_MERGE_GAP, overhead: int = DIFF_RANGE_OVERHEAD_CELLS) -> list:
+    """
+    Rectangles that turn the sheet written as `old` into `new`, as [(top, left, values)].
+    Changed cells are grouped into runs per row, and runs spanning the same columns on
+    consecutive rows are merged, then neighbouring rectangles are combined when that is cheaper
+    than another request. Cells only present in `old` are cleared ("").
+    """
+    open_ranges = {}  # (left, right) -> [top, bottom]
+    ranges = []
+    for row in range(max(len(old), len(new))):
+        width = max(len(old[row]) if row < len(old) else 0, len(new[row]) if row < len(new) else 0)
+        runs = []
+        for col in range(width):
+            if _cell(old, row, col) != _cell(new, row, col):
+                if runs and col - runs[-1][1] <= gap + 1:
+                    runs[-1][1] = col
+                else:
+                    runs.append([col, col])
+        still_open = {}
+        for left, right in runs:
+            span = open_ranges.pop((left, right), None)
+            if span is not None:
+                span[1] = row
+            else:
+                span = [row, row]
+            still_open[(left, right)] = span
+        for (left, right), (top, bottom) in open_ranges.items():
+            ranges.append((top, left, bottom, right))
+        open_ranges = still_open
+    for (left, right), (top, bottom) in open_ranges.items():
+        ranges.append((top, left, bottom, right))
+    return [
+        (top, left, [[_cell(new, row, col) for col in range(left, right + 1)] for row in range(top, bottom + 1)])
+        for top, left, bottom, right in _coalesce(sorted(ranges), overhead)
+    ]
+
+
+def _coalesce(ranges: list, overhead: int) -> list:
+    """Merges rectangles (sorted by top) into their bounding box while that costs fewer extra cells than a request."""
+    def area(box):
+        return (box[2] - box[0] + 1) * (box[3] - box[1] + 1)
+
+    merged = []
+    for box in ranges:
+        if merged:
+            last = merged[-1]
+            union = (min(last[0], box[0]), min(last[1], box[1]), max(last[2], box[2]), max(last[3], box[3]))
+            # Overlapping boxes are fine: every cell is written with its new value
+            if area(union) - area(last) - area(box) <= overhead:
+                merged[-1] = union
+                continue
+        merged.append(box)
+    return merged
+
+
+# --- Writer ---
+
+def _retry_after(response: dict, default: float) -> float:
+    headers = {key.lower(): value for key, value in (response.get("headers") or {}).items()}
+    try:
+        return float(headers["retry-after"])
+    except (KeyError, ValueError):
+        return default
+
+
+class GraphExcelWriter:
+    """
+    Writes worksheet values through Graph, sending only what changed.
+
+    The last values written to each (file, sheet) are kept as a snapshot (TPEntry.values_json,
+    cached in memory). A write diffs the new values against it and PATCHes only the changed
+    rectangles; the updates queued for all sheets and files are sent together in $batch
+    requests (20 per request, requests on the same workbook chained with dependsOn), and
+    throttled or failed parts are retried. The snapshot only advances when every range of a
+    sheet was written, so a partial failure is repaired by the next write.
+    """
+    def __init__(self, session_factory=None, token_provider=None, base_url: str = GRAPH_BASE_URL,
+                 max_rounds: int = 4, sleep=time.sleep):
+        self._session_factory = session_factory
+        self._token_provider = token_provider or get_access_token
+        self.base_url = base_url.rstrip("/")
+        self.max_rounds = max_rounds
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (file_url, sheet_name) -> (values, schedule_id, full)
+        self._snapshots = {}
+        self._stats = {"sheets": 0, "unchanged": 0, "ranges": 0, "cells": 0, "batches": 0, "retried": 0, "failed": 0}
+
+    def queue(self, file_url: str, sheet_name: str, values: list, schedule_id: int = None, full: bool = False):
+        """Queues the sheet's new values (replacing any still queued). full=True rewrites every cell."""
+        with self._lock:
+            self._pending[(file_url, sheet_name)] = (values, schedule_id, full)
+
+    def write(self, file_url: str, sheet_name: str, values: list, schedule_id: int = None, full: bool = False) -> dict:
+        """Writes one sheet now (without what is queued for others). Returns its flush result."""
+        sheet = (file_url, sheet_name)
+        with self._flush_lock:
+            return self._flush({sheet: (values, schedule_id, full)})[sheet]
+
+    def flush(self) -> dict:
+        """Sends everything queued. Returns {(file_url, sheet_name): {"status", "ranges", "cells"}}."""
+        # One flush at a time: each one reads and advances the snapshots
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return {}
+            return self._flush(pending)
+
+    def _flush(self, pending: dict) -> dict:
+        results = {}
+        requests_by_sheet = {}
+        for sheet, (values, schedule_id, full) in pending.items():
+            if full:
+                width = max((len(row) for row in values), default=0)
+                ranges = [(0, 0, [[_cell(values, r, c) for c in range(width)] for r in range(len(values))])] if width else []
+            else:
+                ranges = diff_ranges(self._snapshot(*sheet), values)
+            results[sheet] = {"status": UNCHANGED if not ranges else None, "ranges": len(ranges),
+                              "cells": sum(len(r) * len(r[0]) for _, _, r in ranges)}
+            requests_by_sheet[sheet] = [self._patch_request(sheet, top, left, block) for top, left, block in ranges]
+
+        failed_sheets = self._send(requests_by_sheet)
+        for sheet, (values, schedule_id, _) in pending.items():
+            result = results[sheet]
+            if result["status"] is None:
+                result["status"] = FAILED if sheet in failed_sheets else SUCCESS
+            if result["status"] == SUCCESS:
+                self._snapshots[sheet] = values
+            self._record(sheet, values, schedule_id, result["status"])
+            self._count(result)
+        return results
+
+    def _snapshot(self, file_url: str, sheet_name: str) -> list:
+        sheet = (file_url, sheet_name)
+        if sheet not in self._snapshots and self._session_factory is not None:
+            from models import TPEntry
+            session = self._session_factory()
+            try:
+                entry = (session.query(TPEntry)
+                         .filter(TPEntry.file_url == file_url, TPEntry.sheet_name == sheet_name,
+                                 TPEntry.status == SUCCESS)
+                         .order_by(TPEntry.id.desc()).first())
+                self._snapshots[sheet] = json.loads(entry.values_json) if entry else []
+            finally:
+                session.close()
+        return self._snapshots.get(sheet, [])
+
+    def _record(self, sheet, values, schedule_id, status):
+        if self._session_factory is None or schedule_id is None or status == UNCHANGED:
+            return
+        from models import TPEntry
+        session = self._session_factory()
+        try:
+            session.add(TPEntry(schedule_id=schedule_id, file_url=sheet[0], sheet_name=sheet[1],
+                                values_json=json.dumps(values, ensure_ascii=False), status=status))
+            session.commit()
+        finally:
+            session.close()
+
+    def _patch_request(self, sheet, top, left, block):
+        file_url, sheet_name = sheet
+        address = range_address(top, left, top + len(block) - 1, left + len(block[0]) - 1)
+        return {
+            "method": "PATCH",
+            "url": (f"/me/drive/root:/{quote(file_url)}:/workbook/worksheets/{quote(sheet_name)}"
+                    f"/range(address='{address}')"),
+            "headers": {"Content-Type": "application/json"},
+            "body": {"values": block},
+        }
+
+    def _send(self, requests_by_sheet: dict) -> set:
+        """Sends every request through $batch, retrying throttled ones. Returns the sheets that failed."""
+        todo = [(sheet, request) for sheet, sheet_requests in requests_by_sheet.items() for request in sheet_requests]
+        failed = set()
+        for round_ in range(1, self.max_rounds + 1):
+            if not todo:
+                break
+            retry, wait = [], 0.0
+            for start in range(0, len(todo), GRAPH_BATCH_LIMIT):
+                chunk = todo[start:start + GRAPH_BATCH_LIMIT]
+                try:
+                    responses = self._post_batch([request for _, request in chunk])
+                except Exception as e:
+                    logger.error(f"Graph $batch of {len(chunk)} requests failed: {e}")
+                    retry.extend(chunk)
+                    continue
+                for index, item in enumerate(chunk):
+                    response = responses.get(str(index), {})
+                    status = response.get("status", 0)
+                    if 200 <= status < 300:
+                        continue
+                    if status in RETRY_STATUSES:
+                        retry.append(item)
+                        wait = max(wait, _retry_after(response, default=2 ** (round_ - 1)))
+                    else:
+                        logger.error(f"Graph update of {item[0]} failed with {status}: {response.get('body')}")
+                        failed.add(item[0])
+            todo = retry
+            if todo and round_ < self.max_rounds:
+                self._stats["retried"] += len(todo)
+                self._sleep(wait)
+        failed.update(sheet for sheet, _ in todo)
+        return failed
+
+    def _post_batch(self, batch_requests: list) -> dict:
+        """POSTs one $batch and returns its responses by id."""
+        previous_for_file = {}
+        body = []
+        for index, request in enumerate(batch_requests):
+            request = dict(request, id=str(index))
+            # Workbook writes to the same file are applied in order, not concurrently
+            file_key = request["url"].split(":/workbook")[0]
+            if file_key in previous_for_file:
+                request["dependsOn"] = [previous_for_file[file_key]]
+            previous_for_file[file_key] = request["id"]
+            body.append(request)
+        headers = {"Authorization": f"Bearer {self._token_provider()}", "Content-Type": "application/json"}
+        response = get_client(GRAPH).post(f"{self.base_url}/$batch", headers=headers, json={"requests": body})
+        response.raise_for_status()
+        self._stats["batches"] += 1
+        return {item["id"]: item for item in response.json().get("responses", [])}
+
+    def _count(self, result: dict):
+        self._stats["sheets"] += 1
+        if result["status"] == UNCHANGED:
+            self._stats["unchanged"] += 1
+        elif result["status"] == FAILED:
+            self._stats["failed"] += 1
+        else:
+            self._stats["ranges"] += result["ranges"]
+            self._stats["cells"] += result["cells"]
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> GraphExcelWriter:
+    """The process-wide writer, keeping its snapshots in TPEntry."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from db import SessionLocal
+            _writer = GraphExcelWriter(SessionLocal)
+        return _writer
+
+
+def update_excel_sheet(file_url: str, sheet_name: str, values: list[list[str]], schedule_id: int = None,
+                       full: bool = False):
     """
     Update rows in an Excel sheet stored in SharePoint/Teams.
     values: 2D list representing CSV rows. First row is header.
+    Only cells that differ from the last write are sent (full=True rewrites the whole matrix).
     """
-    access_token = get_access_token()
-    endpoint = f"https://graph.microsoft.com/v1.0/me/drive/root:/{file_url}:/workbook/worksheets/{sheet_name}/range(address='A1')"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
-    body = {"values": values}
-    response = requests.patch(endpoint, headers=headers, json=body)
-    response.raise_for_status()
-    return response.json()
+    result = get_writer().write(file_url, sheet_name, values, schedule_id=schedule_id, full=full)
+    if result["status"] == FAILED:
+        raise Exception(f"Could not update '{sheet_name}' in {file_url}")
+    return result
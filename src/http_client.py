@@ -0,0 +1,217 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Integrations sharing this layer (one pooled session and one set of metrics each)
+TEAMS = "teams"
+GOOGLE_FORMS = "google_forms"
+GRAPH = "graph"
+INTERNAL = "internal"
+
+# Defaults, overridable per integration with HTTP_<NAME>_<SETTING>, e.g. HTTP_GRAPH_READ_TIMEOUT=60
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+# Keep-alive connections per host; callers beyond this wait for a free connection
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "4"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# POST / PATCH may already have been processed when a 5xx or read timeout comes back (a Teams
+# message posted twice); they are only retried when the server cannot have acted on them
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+UNSENT_RETRY_STATUSES = frozenset({429})
+# Latencies kept per integration for the percentiles in stats()
+_LATENCY_WINDOW = 500
+
+
+def _retry_after_seconds(response) -> float:
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _not_sent(error) -> bool:
+    """True if the request failed before reaching the server (connect timeout or refused / DNS)."""
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class IntegrationClient:
+    """
+    Keep-alive HTTP session for one outbound integration.
+
+    Connections are pooled per host (pool_maxsize, blocking when exhausted instead of opening
+    more), every request gets a (connect, read) timeout, and 429/5xx responses and connection
+    errors are retried with exponential backoff and jitter, waiting at least as long as the
+    server's Retry-After asks. POST and PATCH are only retried on 429 and on errors raised
+    before the request was sent. Request counts and latencies are kept for stats().
+    """
+    def __init__(self, name: str, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_base: float = HTTP_BACKOFF_BASE, backoff_max: float = HTTP_BACKOFF_MAX,
+                 pool_maxsize: int = HTTP_POOL_MAXSIZE, sleep=time.sleep):
+        # requests (and certifi) load when the first client is created, not at app start
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "attempts": 0, "retries": 0, "errors": 0}
+        self._statuses = {}
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+        self._retry_wait = 0.0
+
+    @classmethod
+    def from_env(cls, name: str, **overrides):
+        """Client whose settings come from HTTP_<NAME>_* (falling back to the HTTP_* defaults)."""
+        prefix = f"HTTP_{name.upper()}"
+
+        def setting(key, default, cast):
+            value = os.getenv(f"{prefix}_{key}")
+            return cast(value) if value else default
+
+        options = {
+            "connect_timeout": setting("CONNECT_TIMEOUT", HTTP_CONNECT_TIMEOUT, float),
+            "read_timeout": setting("READ_TIMEOUT", HTTP_READ_TIMEOUT, float),
+            "max_retries": setting("MAX_RETRIES", HTTP_MAX_RETRIES, int),
+            "pool_maxsize": setting("POOL_MAXSIZE", HTTP_POOL_MAXSIZE, int),
+        }
+        options.update(overrides)
+        return cls(name, **options)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("PATCH", url, **kwargs)
+
+    def request(self, method: str, url: str, max_retries: int = None, **kwargs) -> "requests.Response":
+        """
+        Sends the request, retrying 429/5xx and connection errors (POST / PATCH: 429 and connect
+        errors only). Returns the last response (callers still call raise_for_status) or raises
+        the last requests exception.
+        """
+        import requests
+        kwargs.setdefault("timeout", self.timeout)
+        retries = self.max_retries if max_retries is None else max_retries
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else UNSENT_RETRY_STATUSES
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if attempt > retries or not (idempotent or _not_sent(e)):
+                        self._record(attempt, None, started)
+                        raise
+                    delay = self._backoff(attempt)
+                    logger.warning(f"[{self.name}] {method} {url} failed ({e}); retry {attempt}/{retries} in {delay:.1f}s")
+                else:
+                    if response.status_code not in retry_statuses or attempt > retries:
+                        self._record(attempt, response.status_code, started)
+                        return response
+                    delay = max(self._backoff(attempt), _retry_after_seconds(response) or 0.0)
+                    logger.warning(f"[{self.name}] {method} {url} returned {response.status_code}; retry {attempt}/{retries} in {delay:.1f}s")
+                    response.close()
+                with self._lock:
+                    self._retry_wait += delay
+                self._sleep(delay)
+        except Exception:
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads out retries of concurrent callers hitting the same limit
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+    def _record(self, attempts: int, status, started: float):
+        with self._lock:
+            self._counts["requests"] += 1
+            self._counts["attempts"] += attempts
+            self._counts["retries"] += attempts - 1
+            if status is not None:
+                self._statuses[status] = self._statuses.get(status, 0) + 1
+            self._latencies.append(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+
+            return {
+                **self._counts,
+                "statuses": {str(status): count for status, count in sorted(self._statuses.items())},
+                "retry_wait_seconds": round(self._retry_wait, 2),
+                "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95),
+                               "max": round(latencies[-1] * 1000, 1) if latencies else None},
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> IntegrationClient:
+    """The process-wide client of an integration, created from the environment on first use."""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = IntegrationClient.from_env(name)
+        return client
+
+
+def stats() -> dict:
+    """Metrics of every client created so far, by integration name."""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.stats() for client in clients}
+
+
+def close_all():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,82 @@
+import importlib
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# An outbound integration: the module implementing it (imported on first use) and the
+# setting that enables it (None: always available, e.g. local voice features)
+Integration = namedtuple("Integration", ["name", "module", "setting", "description"])
+
+TEAMS = "teams"
+GOOGLE_FORMS = "google_forms"
+GRAPH_EXCEL = "graph_excel"
+VOICE_DIALOG = "voice_dialog"
+VOICE_MATCHER = "voice_matcher"
+
+REGISTRY = {
+    integration.name: integration
+    for integration in (
+        Integration(TEAMS, ".ms_teams", "TEAMS_WEBHOOK_URL", "Teams incoming webhook"),
+        Integration(GOOGLE_FORMS, ".google_forms", "GOOGLE_FORM_ID", "Google Form submissions"),
+        Integration(GRAPH_EXCEL, ".graph_excel", "MS_CLIENT_ID", "Excel updates through Microsoft Graph (msal)"),
+        Integration(VOICE_DIALOG, ".voice.dialog", None, "Voice dialog (vosk / pyttsx3)"),
+        Integration(VOICE_MATCHER, ".voice.matcher", None, "Voice answer to form option mapping"),
+    )
+}
+
+# One lock per integration: a slow first import (msal, vosk, ...) only blocks callers of that
+# integration; _lock only guards _load_seconds
+_import_locks = {name: threading.Lock() for name in REGISTRY}
+_lock = threading.Lock()
+_load_seconds = {}
+
+
+class IntegrationDisabled(Exception):
+    """load() of an integration whose setting is not configured."""
+
+
+def is_enabled(name: str) -> bool:
+    """True if the integration's setting is present (integrations without a setting always are)."""
+    integration = REGISTRY[name]
+    return integration.setting is None or bool(getattr(settings, integration.setting, None))
+
+
+def load(name: str):
+    """
+    The integration's module, imported on first use. None of these modules (nor msal,
+    requests, ...) is imported at app start; the first job that needs one pays for it.
+    Raises IntegrationDisabled if the integration is not configured (see is_enabled).
+    """
+    integration = REGISTRY[name]
+    if not is_enabled(name):
+        raise IntegrationDisabled(f"Integration '{name}' is disabled: {integration.setting} is not set")
+    with _import_locks[name]:
+        started = time.perf_counter()
+        module = importlib.import_module(integration.module, __package__)
+        elapsed = time.perf_counter() - started
+    with _lock:
+        first = name not in _load_seconds
+        if first:
+            _load_seconds[name] = elapsed
+    if first:
+        logger.info(f"Loaded integration '{name}' ({integration.module}) in {elapsed * 1000:.0f} ms")
+    return module
+
+
+def status() -> dict:
+    with _lock:
+        loaded = dict(_load_seconds)
+    return {
+        name: {
+            "description": integration.description,
+            "enabled": is_enabled(name),
+            "loaded": name in loaded,
+            "load_ms": round(loaded[name] * 1000, 1) if name in loaded else None,
+        }
+        for name, integration in REGISTRY.items()
+    }
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import pickle
+import threading
+from contextlib import contextmanager
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+from sqlalchemy import Column, Integer, MetaData, String, Table, delete, insert, select
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the job layout created for a schedule changes (job IDs, functions, args),
+# so the next startup re-registers every schedule once.
+JOB_LAYOUT_VERSION = 2
+FINGERPRINT_PREFIX = f"v{JOB_LAYOUT_VERSION}:"
+
+
+def schedule_fingerprint(schedule) -> str:
+    """Hash of every Schedule field that affects the APScheduler jobs registered for it,
+    prefixed with the job layout version ("v2:<sha1>")."""
+    state = [
+        JOB_LAYOUT_VERSION,
+        bool(schedule.is_active),
+        schedule.interval_minutes,
+        schedule.excel_path,
+        schedule.google_form_url,
+        schedule.description,
+    ]
+    return FINGERPRINT_PREFIX + hashlib.sha1(json.dumps(state, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def is_current_layout(fingerprint: str) -> bool:
+    """False for fingerprints written by an older job layout."""
+    return fingerprint.startswith(FINGERPRINT_PREFIX)
+
+
+def report_job_id(schedule_id: int) -> str:
+    """ID of the composite report-run job of a schedule."""
+    return f"schedule_{schedule_id}_report"
+
+
+def schedule_id_from_job_id(job_id: str):
+    """'schedule_12_report' -> 12; None for jobs not created for a schedule."""
+    parts = job_id.split("_")
+    if len(parts) >= 2 and parts[0] == "schedule" and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+class JobFingerprintStore:
+    """
+    Fingerprints of the jobs currently registered per schedule.
+
+    Lives in the job store database itself, so deleting jobs.sqlite also forgets the
+    fingerprints and the next reconciliation rebuilds everything.
+    """
+    def __init__(self, engine, tablename: str = "schedule_job_fingerprints"):
+        self._engine = engine
+        metadata = MetaData()
+        self._table = Table(
+            tablename, metadata,
+            Column("schedule_id", Integer, primary_key=True),
+            Column("fingerprint", String(64), nullable=False),
+        )
+        metadata.create_all(engine)
+
+    def load(self) -> dict:
+        with self._engine.connect() as conn:
+            return {row.schedule_id: row.fingerprint for row in conn.execute(select(self._table))}
+
+    def save(self, fingerprints: dict):
+        """Upserts {schedule_id: fingerprint} in one transaction."""
+        if not fingerprints:
+            return
+        with self._engine.begin() as conn:
+            conn.execute(delete(self._table).where(self._table.c.schedule_id.in_(list(fingerprints))))
+            conn.execute(insert(self._table), [
+                {"schedule_id": schedule_id, "fingerprint": fingerprint}
+                for schedule_id, fingerprint in fingerprints.items()
+            ])
+
+    def delete(self, schedule_ids):
+        schedule_ids = list(schedule_ids)
+        if not schedule_ids:
+            return
+        with self._engine.begin() as conn:
+            conn.execute(delete(self._table).where(self._table.c.schedule_id.in_(schedule_ids)))
+
+    def apply(self, updates: dict):
+        """Applies {schedule_id: fingerprint or None (= delete)} collected during a batch."""
+        self.save({schedule_id: fp for schedule_id, fp in updates.items() if fp is not None})
+        self.delete(schedule_id for schedule_id, fp in updates.items() if fp is None)
+
+
+class BatchingSQLAlchemyJobStore(SQLAlchemyJobStore):
+    """
+    SQLAlchemyJobStore that can collect job writes and commit them in one transaction.
+
+    Inside ``with store.batch():`` add_job/update_job/remove_job calls made by the current thread
+    are buffered and written together on exit, instead of one transaction per job. Buffered adds
+    behave as upserts, so only use batches with ``replace_existing=True``; removing an unknown job
+    does not raise. Other threads (e.g. the scheduler's own loop) are not affected.
+    """
+    # Keep IN (...) lists well below SQLite's bound-parameter limit
+    CHUNK_SIZE = 500
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+
+    def _pending(self):
+        return getattr(self._local, "pending", None)
+
+    @contextmanager
+    def batch(self):
+        if self._pending() is not None:
+            # Nested batch: the outer one commits
+            yield
+            return
+        self._local.pending = {}
+        try:
+            yield
+            pending = self._local.pending
+        finally:
+            self._local.pending = None
+        self._write_pending(pending)
+        scheduler = getattr(self, "_scheduler", None)
+        if scheduler is not None:
+            # Let the scheduler pick up the new next run times
+            scheduler.wakeup()
+
+    def _write_pending(self, pending: dict):
+        if not pending:
+            return
+        job_ids = list(pending)
+        rows = [
+            {
+                "id": job.id,
+                "next_run_time": datetime_to_utc_timestamp(job.next_run_time),
+                "job_state": pickle.dumps(job.__getstate__(), self.pickle_protocol),
+            }
+            for job in pending.values() if job is not None
+        ]
+        with self.engine.begin() as connection:
+            for start in range(0, len(job_ids), self.CHUNK_SIZE):
+                connection.execute(self.jobs_t.delete().where(self.jobs_t.c.id.in_(job_ids[start:start + self.CHUNK_SIZE])))
+            if rows:
+                connection.execute(self.jobs_t.insert(), rows)
+        logger.info(f"Committed {len(rows)} job upserts and {len(job_ids) - len(rows)} removals in one transaction.")
+
+    def lookup_job(self, job_id):
+        pending = self._pending()
+        if pending is not None and job_id in pending:
+            return pending[job_id]
+        return super().lookup_job(job_id)
+
+    def add_job(self, job):
+        pending = self._pending()
+        if pending is None:
+            return super().add_job(job)
+        pending[job.id] = job
+
+    def update_job(self, job):
+        pending = self._pending()
+        if pending is None:
+            return super().update_job(job)
+        pending[job.id] = job
+
+    def remove_job(self, job_id):
+        pending = self._pending()
+        if pending is None:
+            return super().remove_job(job_id)
+        pending[job_id] = None
@@ -1,118 +1,133 @@
+import datetime
 import json
 import webbrowser
 import os
-from playsound import playsound
 from config import settings
 from db import SessionLocal
-from models import Notification, TPEntry, FormSubmission
-# from .ms_teams import send_teams_message
-from openpyxl import load_workbook
+from models import TPEntry, FormSubmission
 import logging
 from logging import getLogger
 import subprocess
 import sys
 import platform
-import dotenv
-import requests
+import threading
+from . import events
+from . import executor
+from . import audio
+from . import outbox
+from . import excel_paths
+from . import form_queue
+from . import integrations
+from .http_client import get_client, INTERNAL
 
 logging.basicConfig(level=logging.INFO)
 logger = getLogger(__name__)
 
 # --- Configuration --- 
-# Make the base URL for internal API calls configurable or default
+# Base URL of the Flask app, used by out-of-process workers that cannot publish on the event bus
 FLASK_APP_BASE_URL = os.getenv("INTERNAL_API_BASE_URL", "http://127.0.0.1:5001")
+# Run the voice dialog as the last step of each report run and queue its answers for the Google Form
+VOICE_REPORT_ENABLED = os.getenv("VOICE_REPORT_ENABLED", "false").lower() in ("1", "true", "yes", "on")
 
-def notify_report_completed(schedule_id: int):
-    """Internal helper to notify the main Flask app that a report action completed."""
-    notify_url = f"{FLASK_APP_BASE_URL}/internal/mark_report_action_completed/{schedule_id}"
+def _post_to_flask_app(path: str, schedule_id: int, timeout: int) -> bool:
+    """Calls an internal endpoint of the Flask app. Only used when this process has no subscriber."""
+    import requests  # only needed on this out-of-process path
+    notify_url = f"{FLASK_APP_BASE_URL}{path}/{schedule_id}"
     try:
-        logger.info(f"Notifying Flask app of completion for schedule {schedule_id} at {notify_url}")
-        response = requests.post(notify_url, timeout=10) # Increased timeout slightly
+        logger.info(f"Notifying Flask app for schedule {schedule_id} at {notify_url}")
+        # Short fixed timeout and a single retry: the notification is best effort
+        response = get_client(INTERNAL).post(notify_url, timeout=timeout, max_retries=1)
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-        logger.info(f"Successfully notified Flask app of completion for schedule {schedule_id}. Status: {response.status_code}")
+        logger.info(f"Successfully notified Flask app for schedule {schedule_id}. Status: {response.status_code}")
         return True
     except requests.exceptions.Timeout:
         logger.error(f"Timeout occurred while notifying Flask app for schedule {schedule_id} at {notify_url}")
         return False
     except requests.exceptions.RequestException as notify_err:
-        logger.error(f"Failed to notify Flask app about completion for schedule {schedule_id}: {notify_err}")
+        logger.error(f"Failed to notify Flask app at {notify_url} for schedule {schedule_id}: {notify_err}")
         return False
     except Exception as e:
-        logger.error(f"Unexpected error during completion notification for schedule {schedule_id}: {e}", exc_info=True)
+        logger.error(f"Unexpected error during notification for schedule {schedule_id}: {e}", exc_info=True)
         return False
 
+
+def notify_report_completed(schedule_id: int):
+    """Notifies the main Flask app that a report action completed.
+
+    Published on the in-process event bus; the HTTP endpoint is only used when the job
+    runs in a separate worker process where nothing is subscribed.
+    """
+    if events.bus.has_subscribers(events.REPORT_COMPLETED):
+        return events.bus.publish(events.REPORT_COMPLETED, schedule_id=schedule_id)
+    return _post_to_flask_app("/internal/mark_report_action_completed", schedule_id, timeout=10)
+
+
+def notify_alert_triggered(schedule_id: int):
+    """Notifies the main Flask app that the alert sound for a schedule was played."""
+    if events.bus.has_subscribers(events.ALERT_TRIGGERED):
+        return events.bus.publish(events.ALERT_TRIGGERED, schedule_id=schedule_id)
+    return _post_to_flask_app("/internal/notify_alert", schedule_id, timeout=5)
+
+
 def notify_before(schedule_id: int, message: str):
     """
-    Send a reminder notification via Teams and record it.
+    Queue a reminder for Teams and record it.
+    The message is only written to the outbox here; outbox.OutboxDispatcher sends it.
     """
     logger.info(f"Executing notify_before job for schedule_id: {schedule_id} with message: '{message}'")
-    # send_teams_message(message)
     session = SessionLocal()
-    session.add(Notification(schedule_id=schedule_id, channel_type="teams", message=message))
-    session.commit()
-    session.close()
+    try:
+        queued = outbox.enqueue_teams_message(session, schedule_id, message)
+        session.commit()
+    finally:
+        session.close()
+    if queued is not None and events.bus.has_subscribers(events.OUTBOX_ENQUEUED):
+        events.bus.publish(events.OUTBOX_ENQUEUED)
 
 
 def open_resources():
     """
     Open the Excel file and Google Form in the web browser for manual input.
     """
-    file_path = getattr(settings, "EXCEL_FILE_PATH", None)
+    file_path = settings.EXCEL_FILE_PATH
     if file_path:
         webbrowser.open(f"file://{os.path.abspath(file_path)}")
-    form_id = getattr(settings, "GOOGLE_FORM_ID", None)
+    form_id = settings.GOOGLE_FORM_ID
     if form_id:
         webbrowser.open(f"https://docs.google.com/forms/d/e/{form_id}/viewform")
 
 
-def play_alert_sound(schedule_id: int):
-    """Plays the alert sound relative to this script's location and notifies the main app."""
-    sound_filename = "alert.wav"
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    sound_file_path = os.path.join(script_dir, sound_filename)
+def play_alert_sound(schedule_id: int) -> bool:
+    """Starts the preloaded alert sound (non-blocking, see audio.AudioService) and notifies the main app.
 
-    logger.info(f"Attempting to play alert sound for schedule {schedule_id} from: {sound_file_path}")
+    Returns:
+        bool: True if the sound was started or merged into the alert already playing.
+    """
+    played = False
     try:
-        if not os.path.exists(sound_file_path):
-            logger.error(f"Alert sound file not found at {sound_file_path}")
-            # Still attempt to notify the app even if sound fails
-        else:
-            if platform.system() == "Darwin":  # macOS
-                logger.info(f"Using 'afplay' on macOS for path: {sound_file_path}")
-                result = subprocess.run(['afplay', sound_file_path], check=False, capture_output=True, text=True)
-                if result.returncode == 0:
-                    logger.info(f"'afplay' completed successfully for schedule {schedule_id}.")
-                else:
-                    logger.error(f"'afplay' failed for schedule {schedule_id} with code {result.returncode}. Error: {result.stderr}")
-            else:  # Fallback for other systems
-                logger.info(f"Using 'playsound' for schedule {schedule_id} with path: {sound_file_path}")
-                playsound(sound_file_path)
-                logger.info(f"'playsound' call completed for schedule {schedule_id}.")
-
+        played = audio.get_audio_service().play()
+        logger.info(f"Alert sound {'started' if played else 'failed'} for schedule {schedule_id}.")
     except Exception as e:
-        logger.error(f"Failed to play alert sound '{sound_file_path}' for schedule {schedule_id}: {e}", exc_info=True)
+        logger.error(f"Failed to play alert sound for schedule {schedule_id}: {e}", exc_info=True)
         # Continue to notification even if sound playback fails
 
     # Notify the Flask app that the alert was triggered
-    try:
-        # Assuming Flask app runs on localhost:5001 (adjust if different)
-        # TODO: Make the base URL configurable
-        notify_url = f"http://127.0.0.1:5001/internal/notify_alert/{schedule_id}"
-        response = requests.post(notify_url, timeout=5) # Send POST request
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        logger.info(f"Successfully notified Flask app about alert for schedule {schedule_id}.")
-    except requests.exceptions.RequestException as notify_err:
-        logger.error(f"Failed to notify Flask app about alert for schedule {schedule_id}: {notify_err}")
+    notify_alert_triggered(schedule_id)
+    return played
 
 
-def open_google_form(schedule_id: int, url: str):
-    """Opens the provided URL in the default web browser using OS-specific commands."""
+def open_google_form(schedule_id: int, url: str) -> bool:
+    """Opens the provided URL in the default web browser using OS-specific commands.
+
+    Returns:
+        bool: True if the browser was launched.
+    """
     logger.info(f"--- Entering open_google_form for schedule_id: {schedule_id} --- ")
     logger.info(f"Received URL argument: {url}")
 
     if not url:
         logger.warning("No URL provided to open_google_form, skipping.")
-        return
+        return False
 
     logger.info(f"Attempting to open URL: {url}")
     system = platform.system()
@@ -121,23 +136,23 @@ def open_google_form(schedule_id: int, url: str):
             logger.info("Detected macOS. Using 'open' command.")
             result = subprocess.run(['open', url], check=True, capture_output=True, text=True)
             logger.info(f"'open {url}' command executed.")
+            return True
         elif system == "Windows":
             logger.info("Detected Windows. Using 'start' command.")
             # 'start' needs shell=True on Windows
             result = subprocess.run(['start', url], shell=True, check=True, capture_output=True, text=True)
             logger.info(f"'start {url}' command executed.")
+            return True
         else: # Other OS (Linux, etc.)
             logger.info(f"Detected {system}. Falling back to webbrowser.open.")
             opened = webbrowser.open(url)
             if opened:
                 logger.info(f"webbrowser.open reported success for URL: {url}")
-                # Notify completion after successful opening
-                notify_report_completed(schedule_id)
+                return True
             else:
                 # This fallback might not work reliably from background threads
                 logger.warning(f"webbrowser.open reported failure for URL: {url}. This might be expected in background jobs on {system}.")
-                # Optionally notify completion even if webbrowser.open fails, depending on desired behavior
-                # notify_report_completed(schedule_id) 
+                return False
 
     except FileNotFoundError:
         command = "open" if system == "Darwin" else "start" if system == "Windows" else "webbrowser"
@@ -147,54 +162,195 @@ def open_google_form(schedule_id: int, url: str):
         logger.error(f"'{command} {url}' command failed with error code {e.returncode}: {e.stderr}")
     except Exception as e:
         logger.error(f"An unexpected error occurred while trying to open the URL: {e}", exc_info=True)
+    return False
+
+
+# Per-action outcomes of run_report
+ACTION_SUCCESS = "success"
+ACTION_FAILED = "failed"
+ACTION_SKIPPED = "skipped"
+# The action's queue was full (see executor.ActionQueueFull)
+ACTION_REJECTED = "rejected"
+# Submitted, not finished yet (only in the return value of run_report(wait=False))
+ACTION_PENDING = "pending"
 
 
-def report_job(schedule_id: int, prompts: list[str]):
+class _ReportRun:
     """
-    Orchestrate full reporting workflow: voice dialog, Excel update, Google Form submission.
+    Runs one report run's actions one after another, each on its own pool: the next action is
+    submitted from the previous one's completion callback, so the order alert sound -> Excel
+    file -> Google Form is kept without tying up a thread to wait in between.
     """
-    # responses = run_voice_dialog(schedule_id, prompts)
-    logger.warning("run_voice_dialog is currently disabled.") # Placeholder log
-    # submit_google_form(responses)
-    logger.warning("submit_google_form is currently disabled.") # Placeholder log
-    logger.info(f"Report job for schedule_id {schedule_id} completed (Placeholder).")
+    def __init__(self, schedule_id: int, outcomes: dict, steps: list, action_executor):
+        self.schedule_id = schedule_id
+        self.outcomes = outcomes
+        self._steps = list(steps)
+        self._executor = action_executor
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        self._submit_next()
+
+    def _submit_next(self):
+        while self._steps:
+            action, func, args = self._steps.pop(0)
+            try:
+                future = self._executor.submit(action, func, *args)
+            except executor.ActionQueueFull as e:
+                logger.error(f"Action '{action}' rejected for schedule {self.schedule_id}: {e}")
+                with self._lock:
+                    self.outcomes[action] = ACTION_REJECTED
+                continue
+            future.add_done_callback(lambda f, action=action: self._on_done(action, f))
+            return
+        self._finish()
+
+    def _on_done(self, action: str, future):
+        try:
+            outcome = ACTION_SUCCESS if future.result() else ACTION_FAILED
+        except Exception as e:
+            logger.error(f"Action '{action}' raised for schedule {self.schedule_id}: {e}", exc_info=True)
+            outcome = ACTION_FAILED
+        with self._lock:
+            self.outcomes[action] = outcome
+        # A failed action does not stop the run; the next one still goes
+        self._submit_next()
+
+    def _finish(self):
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        logger.info(f"Report run for schedule {self.schedule_id} finished: {outcomes}")
+        try:
+            if ACTION_SUCCESS in (outcomes[executor.EXCEL], outcomes[executor.GOOGLE_FORM]):
+                notify_report_completed(self.schedule_id)
+            events.bus.publish(events.REPORT_RUN_FINISHED, schedule_id=self.schedule_id, outcomes=outcomes)
+        finally:
+            self._done.set()
+
+    def current(self) -> dict:
+        with self._lock:
+            return dict(self.outcomes)
+
+    def wait(self, timeout: float = None) -> dict:
+        self._done.wait(timeout)
+        return self.current()
+
+
+def _interval_run_key() -> str:
+    """Run key of a run without a known fire time: the minute it started (interval schedules fire at most once a minute)."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(second=0, microsecond=0).isoformat()
+
+
+def run_report(schedule_id: int, excel_path: str = None, google_form_url: str = None, alert: bool = True,
+               wait: bool = False, timeout: float = None, run_key=None) -> dict[str, str]:
+    """
+    Composite "report run" job: runs a schedule's configured actions on their own worker pools
+    (see executor.ActionExecutor), one after another in the order alert sound -> Excel file ->
+    Google Form -> voice report (VOICE_REPORT_ENABLED). Each action is submitted when the
+    previous one has finished, failed or not.
+
+    run_key identifies the run for the voice report's form submission: the slot's fire time
+    for cron schedules (passed by CronDispatcher), otherwise the minute the run started.
 
+    The calling thread (an APScheduler worker) is released right away, and a stalled pool only
+    delays the runs waiting on it. When every action has finished, completion is notified once
+    if the Excel file or the form was opened, and REPORT_RUN_FINISHED is published.
 
-def voice_dialog_job(schedule_id: int, prompts: list[str]) -> dict[str, str]:
+    Returns the outcome of each action (success / failed / skipped / rejected). Without wait,
+    actions that have not finished yet are reported as pending.
+    """
+    logger.info(f"Starting report run for schedule {schedule_id}")
+    pipeline = [
+        (executor.ALERT_SOUND, alert, play_alert_sound, (schedule_id,)),
+        (executor.EXCEL, bool(excel_path), open_local_file, (schedule_id, excel_path)),
+        (executor.GOOGLE_FORM, bool(google_form_url), open_google_form, (schedule_id, google_form_url)),
+        (executor.VOICE_REPORT, VOICE_REPORT_ENABLED, report_job, (schedule_id, None, run_key or _interval_run_key())),
+    ]
+    outcomes = {}
+    steps = []
+    for action, configured, func, args in pipeline:
+        if configured:
+            outcomes[action] = ACTION_PENDING
+            steps.append((action, func, args))
+        else:
+            outcomes[action] = ACTION_SKIPPED
+
+    run = _ReportRun(schedule_id, outcomes, steps, executor.get_action_executor())
+    run.start()
+    if wait:
+        return run.wait(timeout)
+    return run.current()
+
+
+def report_job(schedule_id: int, prompts: list[str] = None, run_key=None) -> bool:
+    """
+    Voice report: asks the questions of VOICE_QUESTIONS_PATH (or prompts), maps the answers to
+    the form's options and queues the Google Form submission. Posted by
+    form_queue.FormSubmissionSender, not here; the submission is queued once per run_key.
+
+    Returns True if a submission was queued (or already was for this run).
+    """
+    if run_key is None:
+        raise ValueError(f"report_job for schedule {schedule_id} needs the run's key (its fire time)")
+    if not integrations.is_enabled(integrations.GOOGLE_FORMS):
+        logger.warning(f"GOOGLE_FORM_ID is not set; voice report for schedule {schedule_id} skipped.")
+        return False
+    answer_mapper = integrations.load(integrations.VOICE_MATCHER).load_answer_mapper()
+    if answer_mapper is None:
+        logger.warning(f"No voice questions configured; voice report for schedule {schedule_id} skipped.")
+        return False
+    responses = voice_dialog_job(schedule_id, prompts or answer_mapper.prompts, answer_mapper)
+    form_responses = answer_mapper.to_form_responses(responses)
+    if not form_responses:
+        logger.warning(f"Voice report for schedule {schedule_id} produced no form answers; nothing queued.")
+        return False
+
+    session = SessionLocal()
+    try:
+        submission, created = form_queue.enqueue_form_submission(session, schedule_id, form_responses, run_key)
+        session.commit()
+        submission_id = submission.id
+    finally:
+        session.close()
+    if created:
+        events.bus.publish(events.FORM_SUBMISSION_ENQUEUED)
+    logger.info(f"Voice report for schedule {schedule_id} queued as form submission #{submission_id} (run {run_key}).")
+    return True
+
+
+def voice_dialog_job(schedule_id: int, prompts: list[str], answer_mapper=None) -> dict[str, str]:
     """
     Run the voice dialog and return recognized responses.
     """
-    # return run_voice_dialog(schedule_id, prompts)
-    logger.warning("run_voice_dialog is currently disabled.") # Placeholder log
-    return {}
+    voice = integrations.load(integrations.VOICE_DIALOG)
+    return voice.run_voice_dialog(schedule_id, prompts, answer_mapper=answer_mapper)
+
 
+def open_local_file(schedule_id: int, filename_from_db: str) -> bool:
+    """指定されたファイルパスが絶対パスの場合はそのまま、相対パスの場合は環境変数のベースパスを元に開く
 
-def open_local_file(schedule_id: int, filename_from_db: str):
-    """指定されたファイルパスが絶対パスの場合はそのまま、相対パスの場合は環境変数のベースパスを元に開く"""
+    Returns:
+        bool: True if the file was opened.
+    """
     logger.info(f"--- Entering open_local_file for schedule_id: {schedule_id} ---")
 
     if not filename_from_db:
         logger.warning(f"No Excel filename provided for schedule {schedule_id}. Skipping file open.")
-        return
-
-    # Check if the path from DB is already absolute
-    if os.path.isabs(filename_from_db):
-        absolute_file_path = filename_from_db
-        logger.info(f"Using absolute path from database: {absolute_file_path}")
-    else:
-        # Path is relative, use EXCEL_BASE_PATH from .env
-        base_path = os.getenv('EXCEL_BASE_PATH')
-        if not base_path:
-            logger.error("Error: EXCEL_BASE_PATH environment variable is not set in .env file for relative path.")
-            return
-        absolute_file_path = os.path.join(base_path, filename_from_db)
-        logger.info(f"Using relative path from database, joined with base path: {absolute_file_path}")
+        return False
 
-    logger.info(f"Attempting to open file: {absolute_file_path}")
+    # Resolved and checked when the schedule was saved and kept current by the Excel path
+    # watcher: no path joining or stat calls here
+    entry = excel_paths.get_cache().lookup(schedule_id, filename_from_db)
+    if entry.error:
+        logger.error(f"Error: Excel path '{filename_from_db}' of schedule {schedule_id} is invalid: {entry.error}")
+        return False
+    if entry.missing_since:
+        logger.error(f"Error: Excel file '{entry.path}' of schedule {schedule_id} is missing (since {entry.missing_since:%Y-%m-%d %H:%M} UTC).")
+        return False
+    absolute_file_path = entry.path
 
-    if not os.path.exists(absolute_file_path):
-        logger.error(f"Error: File path '{absolute_file_path}' is invalid or does not exist.")
-        return
+    logger.info(f"Attempting to open file: {absolute_file_path}")
 
     try:
         system = platform.system()
@@ -220,8 +376,7 @@ def open_local_file(schedule_id: int, filename_from_db: str):
             logger.error(error_message)
         else:
             logger.info(f"Opened file: {absolute_file_path} for schedule {schedule_id}")
-            # Notify completion after successful opening
-            notify_report_completed(schedule_id)
+            return True
 
     except FileNotFoundError:
         # This typically means 'open', 'start', or 'xdg-open' command itself wasn't found
@@ -229,34 +384,12 @@ def open_local_file(schedule_id: int, filename_from_db: str):
     except Exception as e:
         # Catch other potential exceptions
         logger.error(f"An unexpected error occurred while trying to run command to open file '{absolute_file_path}': {e}", exc_info=True)
+    return False
 
 
 def play_startup_sound():
-    """Plays the startup sound relative to this script's location."""
-    sound_filename = "alert.wav"
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    sound_file_path = os.path.join(script_dir, sound_filename)
-
-    logger.info(f"Attempting to play startup sound from: {sound_file_path}")
+    """Plays the alert sound once at startup (non-blocking)."""
     try:
-        if not os.path.exists(sound_file_path):
-            logger.error(f"Startup sound file not found at {sound_file_path}")
-            return
-
-        if platform.system() == "Darwin":  # macOS
-            logger.info(f"Using 'afplay' on macOS for path: {sound_file_path}")
-            result = subprocess.run(['afplay', sound_file_path], check=False, capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info("'afplay' completed successfully.")
-            else:
-                logger.error(f"'afplay' failed with code {result.returncode}. Error: {result.stderr}")
-        else:  # Fallback for other systems (Windows, Linux)
-            logger.info(f"Using 'playsound' for path: {sound_file_path}") # Log before call
-            playsound(sound_file_path)
-            logger.info(f"'playsound' call completed for: {sound_file_path}") # Log after call
-
-        # logger.info("Startup sound played successfully.") # Removed as completion is logged above
-
+        audio.get_audio_service().play()
     except Exception as e:
-        # Catch potential errors
-        logger.error(f"Failed to play startup sound '{sound_file_path}': {e}", exc_info=True)
+        logger.error(f"Failed to play startup sound: {e}", exc_info=True)
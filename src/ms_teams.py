@@ -1,14 +1,30 @@
-import requests
 from config import settings
+from .http_client import get_client, TEAMS
 
-# Microsoft Teams incoming webhook URL
-WEBHOOK_URL = settings.TEAMS_WEBHOOK_URL
 
-def send_teams_message(message: str, webhook_url: str = WEBHOOK_URL):
+def send_teams_message(message: str, webhook_url: str = None, max_retries: int = None):
     """
     Send a plaintext message to Microsoft Teams via incoming webhook.
+    webhook_url defaults to TEAMS_WEBHOOK_URL (read at call time, so a .env reload applies).
+    max_retries overrides the client's retries (the outbox retries on its own: 0).
     """
     payload = {"text": message}
-    response = requests.post(webhook_url, json=payload)
+    response = get_client(TEAMS).post(webhook_url or settings.TEAMS_WEBHOOK_URL, json=payload, max_retries=max_retries)
+    response.raise_for_status()
+    return response
+
+
+def send_teams_card(title: str, lines: list[str], webhook_url: str = None, max_retries: int = None):
+    """
+    Send several messages as one MessageCard (one section per message).
+    """
+    payload = {
+        "@type": "MessageCard",
+        "@context": "https://schema.org/extensions",
+        "summary": title,
+        "title": title,
+        "sections": [{"text": line} for line in lines],
+    }
+    response = get_client(TEAMS).post(webhook_url or settings.TEAMS_WEBHOOK_URL, json=payload, max_retries=max_retries)
     response.raise_for_status()
     return response
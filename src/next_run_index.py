@@ -0,0 +1,99 @@
+import logging
+import threading
+from datetime import datetime
+
+from apscheduler.events import (
+    EVENT_ALL_JOBS_REMOVED, EVENT_JOB_ADDED, EVENT_JOB_MODIFIED, EVENT_JOB_REMOVED,
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED,
+)
+from apscheduler.util import utc_timestamp_to_datetime
+from sqlalchemy import select
+
+from .job_sync import schedule_id_from_job_id
+
+logger = logging.getLogger(__name__)
+
+
+class NextRunIndex:
+    """
+    In-memory schedule_id -> next run time index, kept current by APScheduler listeners,
+    so listing schedules never has to look jobs up in the (database-backed) job store.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_run = {}
+        # job_id -> trigger, to compute the next fire time after an execution without a lookup
+        self._triggers = {}
+        self._scheduler = None
+
+    def attach(self, scheduler, jobstore):
+        """Loads current next run times straight from the job store table and subscribes to job events."""
+        self._scheduler = scheduler
+        with jobstore.engine.connect() as conn:
+            rows = conn.execute(select(jobstore.jobs_t.c.id, jobstore.jobs_t.c.next_run_time)).all()
+        with self._lock:
+            self._next_run.clear()
+            for job_id, timestamp in rows:
+                self._set_locked(job_id, utc_timestamp_to_datetime(timestamp))
+        scheduler.add_listener(self._on_job_changed, EVENT_JOB_ADDED | EVENT_JOB_MODIFIED)
+        scheduler.add_listener(self._on_job_removed, EVENT_JOB_REMOVED | EVENT_ALL_JOBS_REMOVED)
+        scheduler.add_listener(self._on_job_run, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+        logger.info(f"Next-run index loaded with {len(self._next_run)} entries.")
+
+    def get(self, schedule_id: int):
+        with self._lock:
+            return self._next_run.get(schedule_id)
+
+    def set(self, schedule_id: int, next_run_time):
+        """Sets an entry directly (for schedules not dispatched through an APScheduler job)."""
+        with self._lock:
+            if next_run_time is None:
+                self._next_run.pop(schedule_id, None)
+            else:
+                self._next_run[schedule_id] = next_run_time
+
+    def _set_locked(self, job_id: str, next_run_time):
+        schedule_id = schedule_id_from_job_id(job_id)
+        if schedule_id is None:
+            return
+        if next_run_time is None:
+            self._next_run.pop(schedule_id, None)
+        else:
+            self._next_run[schedule_id] = next_run_time
+
+    # --- Listeners (run in the thread that changed or ran the job) ---
+    def _on_job_changed(self, event):
+        job = self._scheduler.get_job(event.job_id, event.jobstore)
+        with self._lock:
+            if job is None:
+                self._triggers.pop(event.job_id, None)
+                self._set_locked(event.job_id, None)
+            else:
+                self._triggers[event.job_id] = job.trigger
+                self._set_locked(event.job_id, job.next_run_time)
+
+    def _on_job_removed(self, event):
+        with self._lock:
+            if event.code == EVENT_ALL_JOBS_REMOVED:
+                self._triggers.clear()
+                self._next_run.clear()
+            else:
+                self._triggers.pop(event.job_id, None)
+                self._set_locked(event.job_id, None)
+
+    def _on_job_run(self, event):
+        with self._lock:
+            trigger = self._triggers.get(event.job_id)
+        if trigger is None:
+            # Job registered before this process started: fetch its trigger once
+            job = self._scheduler.get_job(event.job_id, event.jobstore)
+            if job is None:
+                return
+            trigger = job.trigger
+            with self._lock:
+                self._triggers[event.job_id] = trigger
+        last_run = event.run_times[-1] if event.code == EVENT_JOB_SUBMITTED else event.scheduled_run_time
+        # Same computation APScheduler uses after processing a due job
+        now = datetime.now(last_run.tzinfo)
+        with self._lock:
+            self._set_locked(event.job_id, trigger.get_next_fire_time(last_run, now))
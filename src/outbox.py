@@ -0,0 +1,281 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from config import settings
+from models import Notification, OutboxMessage, TeamsPost
+from . import integrations
+
+logger = logging.getLogger(__name__)
+
+# OutboxMessage.status
+PENDING = "PENDING"
+SENDING = "SENDING"
+SENT = "SENT"
+FAILED = "FAILED"
+# Notification.status when no webhook is configured (nothing is queued)
+SKIPPED = "SKIPPED"
+
+# Reminders to the same webhook created within this window are sent as one card
+OUTBOX_MERGE_WINDOW_SECONDS = float(os.getenv("OUTBOX_MERGE_WINDOW_SECONDS", "2"))
+OUTBOX_MAX_MERGE = int(os.getenv("OUTBOX_MAX_MERGE", "10"))
+# Token bucket per webhook URL (Teams throttles incoming webhooks at a few requests per second)
+OUTBOX_RATE_PER_WEBHOOK = float(os.getenv("OUTBOX_RATE_PER_WEBHOOK", "1"))
+OUTBOX_BURST_PER_WEBHOOK = int(os.getenv("OUTBOX_BURST_PER_WEBHOOK", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "5"))
+TEAMS_CHANNEL_NAME = os.getenv("TEAMS_CHANNEL_NAME", "webhook")
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def enqueue_teams_message(session, schedule_id: int, message: str, webhook_url: str = None,
+                          channel_name: str = TEAMS_CHANNEL_NAME):
+    """
+    Adds a Notification and its outbox row to the caller's session; both are committed with the
+    caller's transaction and sent later by OutboxDispatcher. Never touches the network.
+    Returns the OutboxMessage, or None if no webhook is configured.
+    """
+    if webhook_url is None:
+        webhook_url = getattr(settings, "TEAMS_WEBHOOK_URL", None)
+    notification = Notification(schedule_id=schedule_id, channel_type="teams", message=message,
+                                status=PENDING if webhook_url else SKIPPED)
+    session.add(notification)
+    if not webhook_url:
+        logger.warning(f"TEAMS_WEBHOOK_URL is not set; reminder for schedule {schedule_id} is recorded but not sent.")
+        return None
+    session.flush()
+    now = _utcnow()
+    outbox_message = OutboxMessage(
+        schedule_id=schedule_id, notification_id=notification.id, channel_type="teams",
+        channel_name=channel_name, destination=webhook_url, message=message,
+        status=PENDING, attempts=0, created_at=now, next_attempt_at=now,
+    )
+    session.add(outbox_message)
+    return outbox_message
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token. Returns 0, or the seconds until one is available (nothing taken)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class OutboxDispatcher:
+    """
+    Background thread delivering OutboxMessage rows to Teams.
+
+    Scheduler jobs only insert rows (enqueue_teams_message) and publish events.OUTBOX_ENQUEUED;
+    all webhook calls happen here. Messages for the same webhook that become due together are
+    merged into one card, each webhook is rate limited by a token bucket, and failed sends are
+    retried with exponential backoff up to max_attempts. The outcome is written to
+    Notification.status and a TeamsPost row per message.
+
+    Delivery is at least once: rows left SENDING by a crash are sent again after a restart.
+    Run one dispatcher per database.
+    """
+    def __init__(self, session_factory, send_message=None, send_card=None,
+                 merge_window: float = OUTBOX_MERGE_WINDOW_SECONDS, max_merge: int = OUTBOX_MAX_MERGE,
+                 rate_per_webhook: float = OUTBOX_RATE_PER_WEBHOOK, burst: int = OUTBOX_BURST_PER_WEBHOOK,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, retry_base: float = OUTBOX_RETRY_BASE_SECONDS,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL_SECONDS, batch_size: int = 200):
+        self._session_factory = session_factory
+        self._send_message = send_message
+        self._send_card = send_card
+        self.merge_window = merge_window
+        self.max_merge = max_merge
+        self.rate_per_webhook = rate_per_webhook
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._buckets = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"sent": 0, "cards": 0, "merged": 0, "retried": 0, "failed": 0, "rate_limited": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._requeue_interrupted()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info("Outbox dispatcher started.")
+
+    def stop(self, timeout: float = 10):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Outbox dispatcher stopped.")
+
+    def wakeup(self, **_):
+        """Dispatch now instead of at the next poll. Subscribed to events.OUTBOX_ENQUEUED."""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                delay = self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}", exc_info=True)
+                delay = self.poll_interval
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _requeue_interrupted(self):
+        session = self._session_factory()
+        try:
+            count = (session.query(OutboxMessage).filter(OutboxMessage.status == SENDING)
+                     .update({"status": PENDING}, synchronize_session=False))
+            session.commit()
+            if count:
+                logger.warning(f"Re-queued {count} outbox messages interrupted while sending.")
+        finally:
+            session.close()
+
+    # --- Dispatch ---
+    def dispatch_once(self) -> float:
+        """Sends every group that is ready. Returns the seconds until the next group may be."""
+        now = _utcnow()
+        session = self._session_factory()
+        try:
+            due = (session.query(OutboxMessage)
+                   .filter(OutboxMessage.status == PENDING, OutboxMessage.next_attempt_at <= now)
+                   .order_by(OutboxMessage.id).limit(self.batch_size).all())
+            groups = defaultdict(list)
+            for row in due:
+                groups[row.destination].append(row)
+
+            ready = []
+            delay = self.poll_interval
+            for destination, rows in groups.items():
+                # Wait until the oldest reminder has been queued for merge_window, so reminders
+                # fired by the same scheduler tick end up in one card
+                settle = self.merge_window - (now - min(r.created_at for r in rows)).total_seconds()
+                if settle > 0:
+                    delay = min(delay, settle)
+                    continue
+                for start in range(0, len(rows), self.max_merge):
+                    bucket = self._buckets.setdefault(destination, _TokenBucket(self.rate_per_webhook, self.burst))
+                    wait = bucket.take()
+                    if wait:
+                        self._count("rate_limited")
+                        delay = min(delay, wait)
+                        break
+                    ready.append(rows[start:start + self.max_merge])
+
+            # Claim before calling out, so a crash mid-send is visible (SENDING) at the next start
+            for rows in ready:
+                for row in rows:
+                    row.status = SENDING
+                    row.attempts += 1
+            session.commit()
+            batches = [[(row.id, row.destination, row.message) for row in rows] for rows in ready]
+        finally:
+            session.close()
+
+        for batch in batches:
+            error = self._deliver(batch)
+            self._record_outcome([row_id for row_id, _, _ in batch], error)
+        return max(0.05, delay) if not batches else 0.0
+
+    def _deliver(self, batch):
+        """Sends one message or one merged card. Returns the exception, or None on success."""
+        destination = batch[0][1]
+        messages = [message for _, _, message in batch]
+        try:
+            if len(messages) == 1:
+                (self._send_message or _default_send_message)(messages[0], destination)
+            else:
+                (self._send_card or _default_send_card)(f"リマインダー ({len(messages)}件)", messages, destination)
+                self._count("cards")
+                self._count("merged", len(messages))
+            return None
+        except Exception as e:
+            logger.warning(f"Teams delivery of {len(messages)} outbox message(s) failed: {e}")
+            return e
+
+    def _record_outcome(self, row_ids: list, error):
+        now = _utcnow()
+        session = self._session_factory()
+        try:
+            rows = session.query(OutboxMessage).filter(OutboxMessage.id.in_(row_ids)).all()
+            # 4xx other than 429 (bad URL, removed webhook) will not get better with retries
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+            permanent = status_code is not None and 400 <= status_code < 500 and status_code != 429
+            outcomes = {}
+            for row in rows:
+                if error is None:
+                    row.status, row.sent_at, row.last_error = SENT, now, None
+                elif permanent or row.attempts >= self.max_attempts:
+                    row.status, row.last_error = FAILED, str(error)
+                else:
+                    row.status, row.last_error = PENDING, str(error)
+                    row.next_attempt_at = now + datetime.timedelta(seconds=self.retry_base * 2 ** (row.attempts - 1))
+                    continue
+                outcomes[row.id] = row
+                if row.notification_id:
+                    notification = session.get(Notification, row.notification_id)
+                    if notification is not None:
+                        notification.status = "SUCCESS" if error is None else FAILED
+                        if error is None:
+                            notification.sent_at = now
+                session.add(TeamsPost(schedule_id=row.schedule_id, channel_name=row.channel_name,
+                                      content=row.message, posted_at=now,
+                                      status="SUCCESS" if error is None else FAILED))
+            session.commit()
+        finally:
+            session.close()
+        if error is None:
+            self._count("sent", len(rows))
+        else:
+            self._count("failed", len(outcomes))
+            self._count("retried", len(rows) - len(outcomes))
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        session = self._session_factory()
+        try:
+            stats["pending"] = session.query(OutboxMessage).filter(OutboxMessage.status == PENDING).count()
+        finally:
+            session.close()
+        return stats
+
+
+def _default_send_message(message: str, webhook_url: str):
+    return integrations.load(integrations.TEAMS).send_teams_message(message, webhook_url, max_retries=0)
+
+
+def _default_send_card(title: str, lines: list, webhook_url: str):
+    return integrations.load(integrations.TEAMS).send_teams_card(title, lines, webhook_url, max_retries=0)
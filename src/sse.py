@@ -0,0 +1,446 @@
+import json
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# --- Event types pushed to the dashboard ---
+ALERT_TRIGGERED = "alert_triggered"
+REPORT_COMPLETED = "report_completed"
+SCHEDULE_CHANGED = "schedule_changed"
+# Sent instead of a replay when Last-Event-ID is older than the ring buffer
+RESYNC = "resync"
+
+
+class TooManyClients(Exception):
+    """Raised when the broker already serves max_clients streams."""
+
+
+class _Client:
+    """One connected EventSource: a bounded queue of pending (id, type, data) events."""
+    def __init__(self, queue_size: int):
+        self.queue = queue.Queue(maxsize=queue_size)
+        # Set when the client fell too far behind; its stream ends and the browser
+        # reconnects with Last-Event-ID, catching up from the ring buffer.
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class _EventStream:
+    """Iterable response body whose close() unregisters the client even if it was never iterated."""
+    def __init__(self, generator, on_close):
+        self._generator = generator
+        self._on_close = on_close
+
+    def __iter__(self):
+        return self._generator
+
+    def close(self):
+        self._generator.close()
+        self._on_close()
+
+
+class SSEBroker:
+    """
+    In-memory fan-out broker for Server-Sent Events (no Redis needed).
+
+    publish() never blocks: each client has a bounded queue (or output buffer, see SSEServer)
+    and a client that cannot keep up is disconnected rather than slowing down the publisher.
+    Recent events are kept in a ring buffer so reconnecting clients can replay what they
+    missed via Last-Event-ID.
+    """
+    def __init__(self, history_size: int = 256, client_queue_size: int = 64, max_clients: int = 200):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history = deque(maxlen=history_size)
+        self._clients = set()
+        self._client_queue_size = client_queue_size
+        self.max_clients = max_clients
+
+    @property
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+    def publish(self, event_type: str, data: dict) -> int:
+        """Stores the event in the ring buffer, fans it out to all clients and returns its ID."""
+        with self._lock:
+            self._last_id += 1
+            event = (self._last_id, event_type, json.dumps(data, ensure_ascii=False))
+            self._history.append(event)
+            clients = list(self._clients)
+        for client in clients:
+            client.deliver(event)
+        return event[0]
+
+    def _connect(self, last_event_id, client=None):
+        """Registers a client (by default a queue client) and returns (client, events to replay)."""
+        client = client or _Client(self._client_queue_size)
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                raise TooManyClients(f"SSE client limit of {self.max_clients} reached")
+            self._clients.add(client)
+            if last_event_id is None:
+                replay = []
+            elif last_event_id > self._last_id or (self._history and last_event_id < self._history[0][0] - 1):
+                # Missed events have already left the ring buffer (or the server restarted)
+                replay = [(self._last_id, RESYNC, json.dumps({"last_event_id": self._last_id}))]
+            else:
+                replay = [event for event in self._history if event[0] > last_event_id]
+        return client, replay
+
+    def _disconnect(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    @staticmethod
+    def format_event(event) -> str:
+        event_id, event_type, data = event
+        return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+    def stream(self, last_event_id=None, heartbeat_seconds: float = 15, max_duration_seconds: float = 300,
+               retry_ms: int = 3000):
+        """
+        Returns the text/event-stream body for one client as an iterable.
+
+        This body holds a WSGI worker thread while it is open; it is the fallback when
+        SSEServer is not running. The stream ends after max_duration_seconds and the browser
+        reconnects automatically with Last-Event-ID and loses nothing.
+        Raises TooManyClients before yielding anything if the broker is full.
+        """
+        client, replay = self._connect(last_event_id)
+
+        def generate():
+            try:
+                yield f"retry: {retry_ms}\n\n"
+                for event in replay:
+                    yield self.format_event(event)
+                deadline = time.monotonic() + max_duration_seconds
+                while not client.overflowed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        event = client.queue.get(timeout=min(heartbeat_seconds, remaining))
+                    except queue.Empty:
+                        # Comment line: keeps proxies from closing an idle connection
+                        yield ": heartbeat\n\n"
+                        continue
+                    yield self.format_event(event)
+                if client.overflowed:
+                    logger.warning("SSE client fell behind and was disconnected; it will replay on reconnect.")
+            finally:
+                self._disconnect(client)
+
+        return _EventStream(generate(), lambda: self._disconnect(client))
+
+
+class _Connection:
+    """One socket served by SSEServer: request bytes read so far and output not yet sent."""
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.request = bytearray()
+        self.out = bytearray()
+        self.accepted_at = time.monotonic()
+        self.streaming = False
+        self.close_when_sent = False
+        self.overflowed = False
+        self.events = selectors.EVENT_READ
+
+    def deliver(self, event):
+        """Called by SSEBroker.publish from any thread."""
+        self.server.send(self, SSEBroker.format_event(event))
+
+
+class SSEServer:
+    """
+    Serves GET /stream for every dashboard tab from one thread.
+
+    Client sockets are non-blocking and multiplexed with selectors: publish() appends the
+    event to each client's output buffer and wakes the loop, which writes as much as each
+    socket accepts. An open stream costs a socket and a buffer, not a thread, and streams
+    are not recycled. A client whose buffer grows past max_buffer_bytes is disconnected and
+    catches up from the ring buffer when the browser reconnects with Last-Event-ID.
+    SSEBroker.max_clients still applies (503) as a safety valve for file descriptors.
+    """
+    REQUEST_TIMEOUT_SECONDS = 10
+    MAX_REQUEST_BYTES = 8192
+
+    def __init__(self, broker: SSEBroker, host: str = "127.0.0.1", port: int = 0, heartbeat_seconds: float = 15,
+                 retry_ms: int = 3000, max_buffer_bytes: int = 256 * 1024):
+        self.broker = broker
+        self.host = host
+        self.requested_port = port
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retry_ms = retry_ms
+        self.max_buffer_bytes = max_buffer_bytes
+        self.port = None
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._woken = False
+        self._listener = None
+        self._wake_recv = self._wake_send = None
+        self._selector = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # --- Lifecycle ---
+    def start(self):
+        """Binds the listening socket (raises OSError if the port is taken) and starts the loop thread."""
+        if self.running:
+            return
+        listener = socket.create_server((self.host, self.requested_port), backlog=128)
+        listener.setblocking(False)
+        self._listener = listener
+        self.port = listener.getsockname()[1]
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(listener, selectors.EVENT_READ, "accept")
+        self._selector.register(self._wake_recv, selectors.EVENT_READ, "wake")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sse-server", daemon=True)
+        self._thread.start()
+        logger.info(f"SSE server listening on {self.host}:{self.port}.")
+
+    def stop(self, timeout: float = 5):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._wake()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("SSE server stopped.")
+
+    # --- Called from publishing threads ---
+    def send(self, connection: _Connection, text: str):
+        data = text.encode("utf-8")
+        with self._lock:
+            if connection.overflowed:
+                return
+            if len(connection.out) + len(data) > self.max_buffer_bytes:
+                connection.overflowed = True
+            else:
+                connection.out += data
+        self._wake()
+
+    def _wake(self):
+        with self._lock:
+            if self._woken:
+                return
+            self._woken = True
+        try:
+            self._wake_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    # --- Loop thread ---
+    def _run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat_seconds
+        try:
+            while not self._stopping.is_set():
+                self._update_interest()
+                timeout = max(0.0, next_heartbeat - time.monotonic())
+                for key, mask in self._selector.select(timeout):
+                    if key.data == "accept":
+                        self._accept()
+                    elif key.data == "wake":
+                        self._drain_wake()
+                    else:
+                        self._service(key.data, mask)
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    self._heartbeat(now)
+                    next_heartbeat = now + self.heartbeat_seconds
+        except Exception as e:
+            logger.error(f"SSE server loop failed: {e}", exc_info=True)
+        finally:
+            for connection in self._connections_snapshot():
+                self._close(connection)
+            self._selector.close()
+            self._listener.close()
+            self._wake_recv.close()
+            self._wake_send.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.warning(f"SSE server could not accept a connection: {e}")
+                return
+            sock.setblocking(False)
+            connection = _Connection(self, sock, address)
+            with self._lock:
+                self._connections.add(connection)
+            self._selector.register(sock, selectors.EVENT_READ, connection)
+
+    def _drain_wake(self):
+        with self._lock:
+            self._woken = False
+        try:
+            while self._wake_recv.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _connections_snapshot(self) -> list:
+        with self._lock:
+            return list(self._connections)
+
+    def _update_interest(self):
+        """Watches for writability only where output is pending; drops overflowed clients."""
+        for connection in self._connections_snapshot():
+            with self._lock:
+                pending, overflowed = bool(connection.out), connection.overflowed
+            if overflowed:
+                logger.warning("SSE client fell behind and was disconnected; it will replay on reconnect.")
+                self._close(connection)
+                continue
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+            if events != connection.events:
+                connection.events = events
+                self._selector.modify(connection.sock, events, connection)
+
+    def _service(self, connection: _Connection, mask: int):
+        if mask & selectors.EVENT_READ:
+            try:
+                data = connection.sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                data = None
+            except OSError:
+                data = b""
+            if data == b"":
+                self._close(connection)
+                return
+            if data and not connection.streaming and not connection.close_when_sent:
+                connection.request += data
+                self._handle_request(connection)
+        if mask & selectors.EVENT_WRITE and connection.sock.fileno() != -1:
+            self._flush(connection)
+
+    def _flush(self, connection: _Connection):
+        with self._lock:
+            data = bytes(connection.out)
+        try:
+            sent = connection.sock.send(data)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(connection)
+            return
+        with self._lock:
+            del connection.out[:sent]
+            done = not connection.out
+        if done and connection.close_when_sent:
+            self._close(connection)
+
+    def _heartbeat(self, now: float):
+        for connection in self._connections_snapshot():
+            if connection.streaming:
+                # Comment line: keeps proxies from closing an idle connection
+                self.send(connection, ": heartbeat\n\n")
+            elif now - connection.accepted_at > self.REQUEST_TIMEOUT_SECONDS:
+                self._close(connection)
+
+    def _close(self, connection: _Connection):
+        with self._lock:
+            if connection not in self._connections:
+                return
+            self._connections.discard(connection)
+        if connection.streaming:
+            self.broker._disconnect(connection)
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+
+    # --- HTTP ---
+    def _handle_request(self, connection: _Connection):
+        head, separator, _ = bytes(connection.request).partition(b"\r\n\r\n")
+        if not separator:
+            if len(connection.request) > self.MAX_REQUEST_BYTES:
+                self._respond(connection, "431 Request Header Fields Too Large")
+            return
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            self._respond(connection, "400 Bad Request")
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        if url.path != "/stream":
+            self._respond(connection, "404 Not Found")
+        elif method == "OPTIONS":
+            # Preflight of a cross-origin EventSource (the app redirects /stream here)
+            self._respond(connection, "204 No Content", "Access-Control-Allow-Headers: Last-Event-ID, Cache-Control\r\n"
+                                                        "Access-Control-Allow-Methods: GET\r\n")
+        elif method != "GET":
+            self._respond(connection, "405 Method Not Allowed")
+        else:
+            last_event_id = parse_last_event_id(headers.get("last-event-id")
+                                                or (parse_qs(url.query).get("last_event_id") or [None])[0])
+            self._open_stream(connection, last_event_id)
+
+    def _respond(self, connection: _Connection, status: str, extra_headers: str = ""):
+        response = (f"HTTP/1.1 {status}\r\nAccess-Control-Allow-Origin: *\r\n{extra_headers}"
+                    f"Content-Length: 0\r\nConnection: close\r\n\r\n")
+        connection.close_when_sent = True
+        with self._lock:
+            connection.out += response.encode("latin-1")
+
+    def _open_stream(self, connection: _Connection, last_event_id):
+        try:
+            _, replay = self.broker._connect(last_event_id, connection)
+        except TooManyClients as e:
+            logger.warning(f"Rejecting SSE connection: {e}")
+            self._respond(connection, "503 Service Unavailable", "Retry-After: 30\r\n")
+            return
+        connection.streaming = True
+        # No Content-Length and no chunking: the body ends when the connection closes
+        head = ("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                "Cache-Control: no-cache\r\nX-Accel-Buffering: no\r\nAccess-Control-Allow-Origin: *\r\n"
+                "Connection: keep-alive\r\n\r\n")
+        body = f"retry: {self.retry_ms}\n\n" + "".join(SSEBroker.format_event(event) for event in replay)
+        # Events published since _connect are already queued behind this
+        with self._lock:
+            connection.out[0:0] = (head + body).encode("utf-8")
+
+    def stats(self) -> dict:
+        with self._lock:
+            connections = len(self._connections)
+            buffered = sum(len(connection.out) for connection in self._connections)
+        return {"running": self.running, "port": self.port, "connections": connections, "buffered_bytes": buffered}
+
+
+def parse_last_event_id(value):
+    """Returns the Last-Event-ID header as an int, or None if absent/invalid."""
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
@@ -1,49 +1,82 @@
-import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 from db import SessionLocal
-from models import VoiceSession, VoicePrompt, VoiceResponse
-from .tts import tts_play
-from .stt import listen
+from .tts import tts_play, prefetch
+from .stt import ListenSession
+from .journal import DialogJournal, persist_dialog, SUCCESS, FAILED
+
+logger = logging.getLogger(__name__)
 
-def run_voice_dialog(schedule_id: int, prompt_texts: list[str], timeout: int = 5) -> dict[str, str]:
+def run_voice_dialog(schedule_id: int, prompt_texts: list[str], timeout: int = 5, audio_source=None,
+                     pipelined: bool = False, recognizer=None, answer_mapper=None) -> dict[str, str]:
     """
-    Run a voice dialog session:
-    1. Create a VoiceSession row with ACTIVE status.
+    Run a voice dialog session (one input stream and recognizer for all prompts;
+    pass audio_source, e.g. stt.PcmSource, to run from recorded audio, and recognizer
+    to reuse an existing stt.StreamingRecognizer):
+    1. Open a crash-safe journal for the session.
     2. For each prompt text:
        - Play via TTS
-       - Insert VoicePrompt
        - Listen for response via STT
-       - Insert VoiceResponse
-    3. Update session status to SUCCESS and set ended_at.
+       (both are only journaled; no database round trips between prompts)
+    3. Write the VoiceSession, VoicePrompts and VoiceResponses in one transaction
+       with status SUCCESS (FAILED if the dialog raised).
+
+    pipelined: render the next prompt's audio while the current answer is being recognized,
+    and move on as soon as an answer has been recognized (silence before it is ignored), so
+    a report takes about as long as the user speaks rather than the sum of the timeouts.
+
+    answer_mapper: matcher.AnswerMapper used to store the chosen option of each answer in
+    VoiceResponse.mapped_option (answer_mapper.to_form_responses turns the returned mapping
+    into GOOGLE_ENTRY_* answers for submit_google_form).
+
     Returns a mapping of prompt_text to recognized response.
     """
-    session = SessionLocal()
-    vs = VoiceSession(schedule_id=schedule_id)
-    session.add(vs)
-    session.commit()
-    session.refresh(vs)
-
+    journal = DialogJournal(schedule_id)
     responses = {}
-    for text in prompt_texts:
-        # play prompt
-        tts_play(text)
-        # record prompt
-        vp = VoicePrompt(session_id=vs.id, prompt_text=text)
-        session.add(vp)
-        session.commit()
-        session.refresh(vp)
-        # listen for response
-        resp_text = listen(duration=timeout)
-        # record response
-        vr = VoiceResponse(prompt_id=vp.id, recognized_text=resp_text)
-        session.add(vr)
-        session.commit()
-        session.refresh(vr)
-        responses[text] = resp_text
-
-    # finalize session
-    vs.ended_at = datetime.datetime.utcnow()
-    vs.session_status = "SUCCESS"
-    session.commit()
-    session.close()
+    status = FAILED
+    renderer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-prefetch") if pipelined else None
+    try:
+        upcoming = renderer.submit(prefetch, prompt_texts[0]) if renderer and prompt_texts else None
+        with ListenSession(source=audio_source, recognizer=recognizer) as listener:
+            for index, text in enumerate(prompt_texts):
+                if upcoming is not None:
+                    try:
+                        upcoming.result()
+                    except Exception as e:
+                        # tts_play renders (or speaks directly) itself
+                        logger.warning(f"Prefetching TTS for '{text}' failed: {e}")
+                # play prompt
+                tts_play(text)
+                journal.prompt(text)
+                if renderer and index + 1 < len(prompt_texts):
+                    upcoming = renderer.submit(prefetch, prompt_texts[index + 1])
+                # listen for response
+                resp_text = listener.listen(timeout=timeout, skip_empty=pipelined)
+                mapped = answer_mapper.map_option(text, resp_text) if answer_mapper else None
+                journal.response(resp_text, mapped)
+                responses[text] = resp_text
+        status = SUCCESS
+    finally:
+        # Cleanup errors are logged rather than raised over an exception from the dialog itself
+        if renderer:
+            try:
+                renderer.shutdown(wait=False)
+            except Exception as e:
+                logger.error(f"Stopping the TTS prefetch of schedule {schedule_id} failed: {e}")
+        # finalize session
+        try:
+            journal.end(status)
+            persist_dialog(SessionLocal, journal.records)
+            journal.discard()
+        except Exception as e:
+            # The journal stays on disk and is replayed at the next start
+            logger.error(f"Saving the voice dialog of schedule {schedule_id} failed: {e}", exc_info=True)
+            try:
+                journal.close()
+            except Exception as close_error:
+                logger.error(f"Closing the voice journal of schedule {schedule_id} failed: {close_error}")
+            if status == SUCCESS:
+                raise
 
     return responses
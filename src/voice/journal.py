@@ -0,0 +1,134 @@
+import datetime
+import json
+import logging
+import os
+import uuid
+
+from models import VoiceSession, VoicePrompt, VoiceResponse
+
+logger = logging.getLogger(__name__)
+
+VOICE_JOURNAL_DIR = os.getenv("VOICE_JOURNAL_DIR", "voice_journal")
+
+# Session statuses besides the model default "ACTIVE"
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+# Recovered from the journal of a dialog that never finished (process crash)
+INTERRUPTED = "INTERRUPTED"
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+class DialogJournal:
+    """
+    Append-only JSONL record of one voice dialog, fsynced line by line.
+
+    The dialog keeps its prompts and responses in memory and writes them to the database in one
+    transaction at the end (persist_dialog). If the process dies first, the journal is replayed
+    at the next start by recover_journals, so what was said is still recorded.
+    """
+    def __init__(self, schedule_id: int, directory: str = VOICE_JOURNAL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex}.jsonl")
+        self.records = []
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._append({"type": "session", "schedule_id": schedule_id, "at": _now()})
+
+    def prompt(self, text: str):
+        self._append({"type": "prompt", "text": text, "at": _now()})
+
+    def response(self, text: str, mapped_option: str = None):
+        self._append({"type": "response", "text": text, "mapped": mapped_option, "at": _now()})
+
+    def end(self, status: str):
+        self._append({"type": "end", "status": status, "at": _now()})
+
+    def _append(self, record: dict):
+        self.records.append(record)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def discard(self):
+        """Removes the journal once its content is committed."""
+        self._file.close()
+        os.remove(self.path)
+
+    def close(self):
+        self._file.close()
+
+
+def persist_dialog(session_factory, records: list) -> int:
+    """Writes a dialog's session, prompts and responses in one transaction. Returns the VoiceSession id."""
+    header = records[0]
+    end = next((r for r in records if r["type"] == "end"), None)
+    session = session_factory()
+    try:
+        voice_session = VoiceSession(
+            schedule_id=header["schedule_id"],
+            started_at=datetime.datetime.fromisoformat(header["at"]),
+            session_status=end["status"] if end else INTERRUPTED,
+            ended_at=datetime.datetime.fromisoformat(end["at"]) if end else None,
+        )
+        session.add(voice_session)
+        session.flush()
+
+        # Pair each response with the prompt before it
+        pairs = []
+        for record in records[1:]:
+            if record["type"] == "prompt":
+                prompt = VoicePrompt(session_id=voice_session.id, prompt_text=record["text"],
+                                     played_at=datetime.datetime.fromisoformat(record["at"]))
+                pairs.append([prompt, None])
+            elif record["type"] == "response" and pairs and pairs[-1][1] is None:
+                pairs[-1][1] = record
+        session.add_all(prompt for prompt, _ in pairs)
+        session.flush()  # prompt ids, in one multi-row insert
+        session.add_all(
+            VoiceResponse(prompt_id=prompt.id, recognized_text=response["text"],
+                          mapped_option=response.get("mapped"),
+                          responded_at=datetime.datetime.fromisoformat(response["at"]))
+            for prompt, response in pairs if response is not None
+        )
+        session.commit()
+        return voice_session.id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _read_journal(path: str) -> list:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Torn last line from the crash
+                break
+    return records
+
+
+def recover_journals(session_factory, directory: str = VOICE_JOURNAL_DIR) -> int:
+    """Persists dialogs left behind by a previous process. Returns how many were recovered."""
+    if not os.path.isdir(directory):
+        return 0
+    recovered = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            records = _read_journal(path)
+            if records and records[0].get("type") == "session":
+                session_id = persist_dialog(session_factory, records)
+                logger.warning(f"Recovered voice dialog journal {name} as VoiceSession {session_id}.")
+                recovered += 1
+            os.remove(path)
+        except Exception as e:
+            logger.error(f"Could not recover voice dialog journal {name}: {e}", exc_info=True)
+    return recovered
@@ -0,0 +1,265 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+from config import settings
+
+# Question definitions: [{"prompt": "...", "entry": "GOOGLE_ENTRY_1", "options": ["完了", {"value": "未完了", "aliases": ["みかんりょう"]}]}]
+VOICE_QUESTIONS_PATH = getattr(settings, "VOICE_QUESTIONS_PATH", None) or os.getenv("VOICE_QUESTIONS_PATH", "voice_questions.json")
+
+Match = namedtuple("Match", ["value", "score", "form"])
+
+# --- Normalization ---
+
+_ROMAJI = {
+    "a": "あ", "i": "い", "u": "う", "e": "え", "o": "お",
+    "shi": "し", "chi": "ち", "tsu": "つ", "fu": "ふ", "ji": "じ", "wo": "を", "n'": "ん",
+    "sha": "しゃ", "shu": "しゅ", "sho": "しょ", "cha": "ちゃ", "chu": "ちゅ", "cho": "ちょ",
+    "ja": "じゃ", "ju": "じゅ", "jo": "じょ",
+}
+_ROWS = {
+    "k": "かきくけこ", "s": "さしすせそ", "t": "たちつてと", "n": "なにぬねの", "h": "はひふへほ",
+    "m": "まみむめも", "r": "らりるれろ", "g": "がぎぐげご", "z": "ざじずぜぞ", "d": "だぢづでど",
+    "b": "ばびぶべぼ", "p": "ぱぴぷぺぽ",
+}
+for _consonant, _kana in _ROWS.items():
+    for _vowel, _char in zip("aiueo", _kana):
+        _ROMAJI.setdefault(_consonant + _vowel, _char)
+    # kya / nyu / ryo ...
+    for _vowel, _small in zip("auo", "ゃゅょ"):
+        _ROMAJI.setdefault(_consonant + "y" + _vowel, _kana[1] + _small)
+_ROMAJI.update({"ya": "や", "yu": "ゆ", "yo": "よ", "wa": "わ"})
+_ROMAJI_KEYS = sorted(_ROMAJI, key=len, reverse=True)
+_ROMAJI_RE = re.compile(r"[a-z']+")
+# Punctuation, symbols and spaces carry no meaning in recognized speech
+_IGNORED_RE = re.compile(r"[\s、。，．,.!?！？・「」『』（）()\[\]〜~ー-]")
+# Spaces and punctuation separate words (the recognizer emits words separated by spaces)
+_TOKEN_SEPARATOR_RE = re.compile(r"[\s、。，．,.!?！？・「」『』（）()\[\]]+")
+
+
+def _romaji_to_hiragana(word: str) -> str:
+    out = []
+    i = 0
+    while i < len(word):
+        # Doubled consonant -> small tsu (katta -> かった)
+        if i + 1 < len(word) and word[i] == word[i + 1] and word[i] not in "aiueon":
+            out.append("っ")
+            i += 1
+            continue
+        for key in _ROMAJI_KEYS:
+            if word.startswith(key, i):
+                out.append(_ROMAJI[key])
+                i += len(key)
+                break
+        else:
+            if word[i] == "n":
+                out.append("ん")
+            else:
+                # Not romaji (e.g. an English word): keep it
+                return word
+            i += 1
+    return "".join(out)
+
+
+def normalize(text: str) -> str:
+    """NFKC, lower case, katakana -> hiragana, romaji -> hiragana, punctuation and spaces removed."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+    text = _ROMAJI_RE.sub(lambda m: _romaji_to_hiragana(m.group()), text)
+    return _IGNORED_RE.sub("", text)
+
+
+def tokenize(text: str) -> list:
+    """Normalized words of text, split at spaces and punctuation."""
+    tokens = (normalize(token) for token in _TOKEN_SEPARATOR_RE.split(unicodedata.normalize("NFKC", text or "")))
+    return [token for token in tokens if token]
+
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (returning limit + 1) once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Shared prefix / suffix never change the distance; answers usually differ in a few characters
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        return len(a) + len(b)
+    # Only cells within `limit` of the diagonal can stay within the limit
+    too_far = limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [too_far] * (len(b) + 1)
+        if low == 1:
+            current[0] = i
+        for j in range(low, high + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+        if min(current[low - 1:high + 1]) > limit:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+class OptionMatcher:
+    """
+    Maps recognized text to one of a question's allowed options.
+
+    Every option (and its aliases, e.g. kana readings of a kanji option) is normalized once and
+    indexed by character bigrams. A lookup tries an exact hit, then options contained in the
+    answer ("はい、完了です" -> 完了), then edit distance on the few candidates sharing the most
+    distinctive bigrams. Lookup cost depends on the answer length, not on the number of options.
+
+    A contained option must be whole words of the answer, or cover at least min_contained_share
+    of the word it is part of: "未完了です" -> 未完了, but "はいってない" does not contain はい.
+    """
+    # Candidate counting stops once this many index entries have been visited (rarest bigrams
+    # first); common bigrams shared by thousands of options add cost but little information.
+    POSTINGS_BUDGET = 2000
+
+    def __init__(self, options: list, min_score: float = 0.6, max_candidates: int = 8,
+                 min_contained_share: float = 0.5):
+        self.min_score = min_score
+        self.min_contained_share = min_contained_share
+        self.max_candidates = max_candidates
+        self._exact = {}
+        self._forms = []  # (normalized form, option value)
+        self._bigram_index = defaultdict(set)
+        for option in options:
+            if isinstance(option, dict):
+                value, aliases = option["value"], option.get("aliases", [])
+            else:
+                value, aliases = option, []
+            for form in [value, *aliases]:
+                normalized = normalize(form)
+                if not normalized or normalized in self._exact:
+                    continue
+                self._exact[normalized] = value
+                form_id = len(self._forms)
+                self._forms.append((normalized, value))
+                for gram in _bigrams(normalized):
+                    self._bigram_index[gram].add(form_id)
+
+    def match(self, text: str):
+        """Best Match(value, score, form) for the recognized text, or None below min_score."""
+        tokens = tokenize(text)
+        answer = "".join(tokens)
+        if not answer:
+            return None
+        if answer in self._exact:
+            return Match(self._exact[answer], 1.0, answer)
+
+        contained = self._contained(tokens)
+        if contained is not None:
+            return contained
+
+        postings = sorted((self._bigram_index[gram] for gram in _bigrams(answer) if gram in self._bigram_index), key=len)
+        hits = defaultdict(int)
+        visited = 0
+        for used, form_ids in enumerate(postings):
+            visited += len(form_ids)
+            if visited > self.POSTINGS_BUDGET and used >= 2:
+                break
+            for form_id in form_ids:
+                hits[form_id] += 1
+        if not hits:
+            return None
+
+        best = None
+        candidates = sorted(hits, key=hits.get, reverse=True)[:self.max_candidates]
+        for form_id in candidates:
+            form, value = self._forms[form_id]
+            longest = max(len(form), len(answer))
+            limit = int(longest * (1 - self.min_score))
+            distance = _edit_distance(answer, form, limit)
+            if distance > limit:
+                continue
+            score = 1 - distance / longest
+            if best is None or score > best.score:
+                best = Match(value, round(score, 3), form)
+        return best
+
+    def _contained(self, tokens: list):
+        """The longest option made of whole words, or covering enough of one word, or None."""
+        # Runs of consecutive words: "はい 完了 です" -> はい, 完了, はい完了, 完了です
+        runs = [("".join(tokens[start:end]), 0.95)
+                for start in range(len(tokens)) for end in range(start + 1, len(tokens) + 1)
+                if end - start < len(tokens)]
+        # Part of one word: "未完了です" -> 未完了 (not "はいってない" -> はい)
+        for token in tokens:
+            shortest = max(2, math.ceil(len(token) * self.min_contained_share))
+            runs.extend((token[start:start + length], 0.9)
+                        for length in range(len(token) - 1, shortest - 1, -1)
+                        for start in range(len(token) - length + 1))
+        # Longest first, so "未完了です" maps to 未完了 rather than 完了
+        for form, score in sorted(runs, key=lambda run: (-len(run[0]), -run[1])):
+            value = self._exact.get(form)
+            if value is not None:
+                return Match(value, score, form)
+        return None
+
+
+class AnswerMapper:
+    """
+    Turns a dialog's recognized answers into structured answers: the matched option per
+    prompt (VoiceResponse.mapped_option) and the GOOGLE_ENTRY_* keys for submit_google_form.
+    Questions without options pass the recognized text through.
+    """
+    def __init__(self, questions: list):
+        self._questions = {}
+        for question in questions:
+            options = question.get("options")
+            matcher = OptionMatcher(options, question.get("min_score", 0.6)) if options else None
+            self._questions[question["prompt"]] = (question.get("entry"), matcher)
+
+    @classmethod
+    def from_file(cls, path: str = VOICE_QUESTIONS_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def prompts(self) -> list:
+        return list(self._questions)
+
+    def map_option(self, prompt: str, recognized_text: str):
+        """The option value for one answer, or None (free-text question or no confident match)."""
+        _, matcher = self._questions.get(prompt, (None, None))
+        if matcher is None:
+            return None
+        match = matcher.match(recognized_text)
+        return match.value if match else None
+
+    def to_form_responses(self, responses: dict) -> dict:
+        """{prompt: recognized text} -> {GOOGLE_ENTRY_x: answer} (unmatched option answers are left out)."""
+        form_responses = {}
+        for prompt, text in responses.items():
+            entry, matcher = self._questions.get(prompt, (None, None))
+            if not entry:
+                continue
+            if matcher is None:
+                if text:
+                    form_responses[entry] = text
+                continue
+            value = self.map_option(prompt, text)
+            if value is not None:
+                form_responses[entry] = value
+        return form_responses
+
+
+def load_answer_mapper():
+    """AnswerMapper for VOICE_QUESTIONS_PATH, or None if no question file exists."""
+    if not os.path.exists(VOICE_QUESTIONS_PATH):
+        return None
+    return AnswerMapper.from_file(VOICE_QUESTIONS_PATH)
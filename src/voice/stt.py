@@ -1,52 +1,237 @@
 import json
 import queue
 import sys
+import threading
 import time
-import sounddevice as sd
-from vosk import Model, KaldiRecognizer
+import wave
+from collections import namedtuple
 from config import settings
 import os
 
 # Load Vosk model path and sample rate from settings or defaults
 MODEL_PATH = getattr(settings, "VOSK_MODEL_PATH", "models/vosk-model-small-ja-0.22")
 SAMPLE_RATE = int(getattr(settings, "VOSK_SAMPLE_RATE", 16000))
+# Frames per audio block (0.25 s at 16 kHz): the granularity of partial results and of end-of-utterance detection
+BLOCK_FRAMES = 4000
 
 # Lazy-load Vosk model to avoid import-time errors
 _model = None
+_model_lock = threading.Lock()
+
+# kind is "partial" (hypothesis so far, may still change) or "final" (end of utterance)
+RecognitionResult = namedtuple("RecognitionResult", ["kind", "text"])
+
 
 def _load_model():
     global _model
-    if _model is None:
-        if not MODEL_PATH or not os.path.isdir(MODEL_PATH):
-            raise RuntimeError(f"Vosk model path '{MODEL_PATH}' not found. Please download and unpack the model under this path.")
-        _model = Model(MODEL_PATH)
+    with _model_lock:
+        if _model is None:
+            from vosk import Model
+            if not MODEL_PATH or not os.path.isdir(MODEL_PATH):
+                raise RuntimeError(f"Vosk model path '{MODEL_PATH}' not found. Please download and unpack the model under this path.")
+            _model = Model(MODEL_PATH)
     return _model
 
-def listen(duration: int = 5) -> str:
+
+# --- Audio sources ---
+# A source returns 16-bit mono PCM blocks from read(timeout), b"" when nothing arrived in time
+# and None once the input has ended.
+
+class MicrophoneSource:
     """
-    Listen to microphone for up to 'duration' seconds and return recognized text.
+    One sounddevice input stream, kept open across the prompts of a dialog.
+    The audio callback feeds a blocking queue, so waiting for audio costs no CPU.
     """
-    rec = KaldiRecognizer(_load_model(), SAMPLE_RATE)
-    q = queue.Queue()
+    def __init__(self, sample_rate: int = SAMPLE_RATE, block_frames: int = BLOCK_FRAMES):
+        self.sample_rate = sample_rate
+        self._block_frames = block_frames
+        self._queue = queue.Queue()
+        self._stream = None
 
-    def callback(indata, frames, time_info, status):
+    def _callback(self, indata, frames, time_info, status):
         if status:
             print(status, file=sys.stderr)
-        q.put(bytes(indata))
+        self._queue.put(bytes(indata))
 
-    with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=8000, dtype='int16', channels=1, callback=callback):
-        result_text = ""
-        start_time = time.time()
+    def start(self):
+        if self._stream is None:
+            import sounddevice as sd
+            self._stream = sd.RawInputStream(samplerate=self.sample_rate, blocksize=self._block_frames,
+                                             dtype='int16', channels=1, callback=self._callback)
+            self._stream.start()
+        return self
+
+    def read(self, timeout: float):
+        try:
+            return self._queue.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return b""
+
+    def drain(self):
+        """Drops audio captured so far (e.g. our own TTS prompt) before listening for an answer."""
         while True:
-            if not q.empty():
-                data = q.get()
-                if rec.AcceptWaveform(data):
-                    res = json.loads(rec.Result())
-                    result_text = res.get("text", "")
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PcmSource:
+    """
+    Recorded 16-bit mono PCM (raw bytes or a WAV file) served in blocks, for offline runs and benchmarks.
+    With realtime=True blocks are delivered at the pace of the recording, like a microphone.
+    """
+    def __init__(self, pcm: bytes, sample_rate: int = SAMPLE_RATE, block_frames: int = BLOCK_FRAMES, realtime: bool = False):
+        self.sample_rate = sample_rate
+        self._pcm = pcm
+        self._block_bytes = block_frames * 2
+        self._pos = 0
+        self._realtime = realtime
+        self._started = None
+
+    @classmethod
+    def from_wav(cls, path: str, **kwargs):
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit mono PCM, got {wav.getnchannels()} channels / {wav.getsampwidth() * 8}-bit")
+            return cls(wav.readframes(wav.getnframes()), sample_rate=wav.getframerate(), **kwargs)
+
+    @property
+    def duration(self) -> float:
+        return len(self._pcm) / 2 / self.sample_rate
+
+    def start(self):
+        self._started = time.monotonic()
+        return self
+
+    def read(self, timeout: float):
+        if self._pos >= len(self._pcm):
+            return None
+        if self._realtime:
+            if self._started is None:
+                self.start()
+            # Block until this chunk would have been recorded
+            available_at = self._started + (self._pos + self._block_bytes) / 2 / self.sample_rate
+            delay = available_at - time.monotonic()
+            if delay > timeout:
+                time.sleep(max(timeout, 0))
+                return b""
+            if delay > 0:
+                time.sleep(delay)
+        block = self._pcm[self._pos:self._pos + self._block_bytes]
+        self._pos += len(block)
+        return block
+
+    def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Recognition ---
+
+class StreamingRecognizer:
+    """
+    One KaldiRecognizer on the shared model, reused for every utterance of a session.
+
+    stream() yields partial results as the hypothesis changes and a final result as soon as Vosk
+    detects the end of the utterance (or when the timeout / end of input is reached). With
+    skip_empty, endpoints without any recognized text (silence before the answer) do not end it.
+    """
+    def __init__(self, model=None, sample_rate: int = SAMPLE_RATE, recognizer=None):
+        if recognizer is None:
+            from vosk import KaldiRecognizer
+            recognizer = KaldiRecognizer(model or _load_model(), sample_rate)
+        self._recognizer = recognizer
+
+    def stream(self, source, timeout: float = 5, skip_empty: bool = False):
+        recognizer = self._recognizer
+        deadline = time.monotonic() + timeout
+        last_partial = ""
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                data = source.read(remaining)
+                if data is None:
                     break
-            if time.time() - start_time > duration:
-                break
-        if not result_text:
-            res = json.loads(rec.FinalResult())
-            result_text = res.get("text", "")
-    return result_text
+                if not data:
+                    continue
+                if recognizer.AcceptWaveform(data):
+                    text = json.loads(recognizer.Result()).get("text", "")
+                    if skip_empty and not text:
+                        continue
+                    yield RecognitionResult("final", text)
+                    return
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    yield RecognitionResult("partial", partial)
+            # Timed out or input ended mid-utterance: flush what was heard
+            yield RecognitionResult("final", json.loads(recognizer.FinalResult()).get("text", ""))
+        finally:
+            recognizer.Reset()
+
+    def recognize(self, source, timeout: float = 5, skip_empty: bool = False) -> str:
+        """Text of the first final result."""
+        text = ""
+        for result in self.stream(source, timeout, skip_empty):
+            if result.kind == "final":
+                text = result.text
+        return text
+
+
+class ListenSession:
+    """
+    Shared input stream and recognizer for all prompts of one dialog:
+        with ListenSession() as listener:
+            answer = listener.listen(timeout=5)
+    """
+    def __init__(self, source=None, recognizer: StreamingRecognizer = None):
+        self.source = source or MicrophoneSource()
+        self.recognizer = recognizer or StreamingRecognizer(sample_rate=self.source.sample_rate)
+
+    def stream(self, timeout: float = 5, skip_empty: bool = False):
+        """Generator of RecognitionResult for the next utterance."""
+        self.source.drain()
+        return self.recognizer.stream(self.source, timeout, skip_empty)
+
+    def listen(self, timeout: float = 5, skip_empty: bool = False) -> str:
+        self.source.drain()
+        return self.recognizer.recognize(self.source, timeout, skip_empty)
+
+    def __enter__(self):
+        self.source.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.source.close()
+
+
+def listen(duration: int = 5) -> str:
+    """
+    Listen to microphone for up to 'duration' seconds and return recognized text.
+    Opens its own input stream; use ListenSession to reuse one across several prompts.
+    """
+    with ListenSession() as listener:
+        return listener.listen(timeout=duration)
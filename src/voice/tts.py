@@ -1,17 +1,179 @@
-import pyttsx3
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rendered prompts are kept on disk and replayed instead of being synthesized again
+TTS_CACHE_DIR = getattr(settings, "TTS_CACHE_DIR", None) or os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = float(getattr(settings, "TTS_CACHE_MAX_MB", None) or os.getenv("TTS_CACHE_MAX_MB", "50"))
+TTS_CACHE_ENABLED = (getattr(settings, "TTS_CACHE_ENABLED", None) or os.getenv("TTS_CACHE_ENABLED", "true")).lower() in ("1", "true", "yes", "on")
+# Optional voice id (see pyttsx3 engine.getProperty('voices'))
+TTS_VOICE = getattr(settings, "TTS_VOICE", None) or os.getenv("TTS_VOICE")
 
 _engine = None
+# pyttsx3 engines (sapi5 / nsss in particular) must be created and driven on one thread:
+# every engine call, including the init, runs on this single dedicated TTS thread
+_tts_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+_tts_thread_ident = None
 
-def tts_play(text: str, rate: int = None, volume: float = None):
-    """
-    Play text-to-speech for given text using pyttsx3.
-    """
-    global _engine
+
+def _on_tts_thread(fn, *args):
+    """Runs fn(engine, *args) on the TTS thread and returns its result (blocking the caller)."""
+    if threading.get_ident() == _tts_thread_ident:
+        return fn(_get_engine(), *args)
+    return _tts_thread.submit(lambda: fn(_get_engine(), *args)).result()
+
+
+def _get_engine():
+    """The pyttsx3 engine, initialized on first use. Only called on the TTS thread."""
+    global _engine, _tts_thread_ident
+    _tts_thread_ident = threading.get_ident()
     if _engine is None:
+        import pyttsx3
         _engine = pyttsx3.init()
+        if TTS_VOICE:
+            _engine.setProperty('voice', TTS_VOICE)
+    return _engine
+
+
+def init_engine():
+    """Initializes the engine on the TTS thread ahead of the first prompt (used by the warmup)."""
+    _on_tts_thread(lambda engine: None)
+
+
+def _save_to_file(engine, text, path, rate, volume, voice):
+    _apply_properties(engine, rate, volume, voice)
+    engine.save_to_file(text, path)
+    engine.runAndWait()
+
+
+def _speak(engine, text, rate, volume):
+    _apply_properties(engine, rate, volume, None)
+    engine.say(text)
+    engine.runAndWait()
+
+
+class TTSCache:
+    """
+    Disk cache of rendered prompts, keyed by a hash of (text, rate, volume, voice),
+    evicting the least recently played files once the directory exceeds max_bytes.
+    """
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = int(TTS_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        # Rebuild the LRU order from the files' modification times (touched on every hit)
+        files = [entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith(".wav")]
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+            self._entries[entry.name[:-4]] = entry.stat().st_size
+            self._total += entry.stat().st_size
+
+    @staticmethod
+    def key(text: str, rate=None, volume=None, voice=None) -> str:
+        return hashlib.sha1(f"{text}\x00{rate}\x00{volume}\x00{voice}".encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, text: str, rate=None, volume=None, voice=None):
+        """Path of the rendered prompt, or None if it is not cached."""
+        key = self.key(text, rate, volume, voice)
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._entries and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                os.utime(path)
+                return path
+            self._stats["misses"] += 1
+            return None
+
+    def render(self, text: str, rate=None, volume=None, voice=None) -> str:
+        """Synthesizes the prompt into the cache (unless present) and returns its path."""
+        path = self.get(text, rate, volume, voice)
+        if path:
+            return path
+        key = self.key(text, rate, volume, voice)
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        _on_tts_thread(_save_to_file, text, tmp_path, rate, volume, voice)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict_locked()
+        return path
+
+    def _evict_locked(self):
+        # Never evict the entry that was just added
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            self._stats["evictions"] += 1
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes, **self._stats}
+
+
+def _apply_properties(engine, rate, volume, voice):
     if rate is not None:
-        _engine.setProperty('rate', rate)
+        engine.setProperty('rate', rate)
     if volume is not None:
-        _engine.setProperty('volume', volume)
-    _engine.say(text)
-    _engine.runAndWait()
+        engine.setProperty('volume', volume)
+    if voice is not None:
+        engine.setProperty('voice', voice)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide TTSCache, or None if TTS_CACHE_ENABLED is off."""
+    global _cache
+    if not TTS_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
+
+
+def prefetch(text: str, rate: int = None, volume: float = None):
+    """Renders a prompt into the cache ahead of time. Returns its path, or None without a cache."""
+    cache = get_cache()
+    if cache is None:
+        return None
+    return cache.render(text, rate, volume, TTS_VOICE)
+
+
+def tts_play(text: str, rate: int = None, volume: float = None):
+    """
+    Play text-to-speech for given text using pyttsx3.
+    Prompts are rendered once into the TTS cache and replayed from disk afterwards.
+    """
+    cache = get_cache()
+    if cache is not None:
+        try:
+            from ..audio import play_file
+            play_file(cache.render(text, rate, volume, TTS_VOICE))
+            return
+        except Exception as e:
+            logger.warning(f"Cached TTS playback failed ({e}); speaking directly.")
+    _on_tts_thread(_speak, text, rate, volume)
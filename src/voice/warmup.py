@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+import time
+
+from config import settings
+from .. import integrations
+
+logger = logging.getLogger(__name__)
+
+# Fixed report prompts to pre-render into the TTS cache, separated by "|"
+VOICE_PROMPT_TEXTS = [
+    text.strip()
+    for text in (getattr(settings, "VOICE_PROMPT_TEXTS", None) or os.getenv("VOICE_PROMPT_TEXTS", "")).split("|")
+    if text.strip()
+]
+
+# Component states
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+# Optional dependency not installed / model not downloaded
+UNAVAILABLE = "unavailable"
+
+
+class VoiceWarmup:
+    """
+    Loads the Vosk model, initializes the TTS engine (on the TTS thread, see tts._on_tts_thread)
+    and pre-renders the fixed prompts on a background thread at app start, so the first dialog
+    does not stall. status() reports the
+    state of each component.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._components = {name: {"state": PENDING} for name in ("stt_model", "tts_engine", "tts_prompts")}
+
+    def start(self, prompt_texts: list[str] = None):
+        """Starts the preload thread (once). Returns immediately."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(VOICE_PROMPT_TEXTS if prompt_texts is None else prompt_texts,),
+                name="voice-warmup", daemon=True,
+            )
+            self._thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until the preload has finished. True if every component is usable."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.is_ready()
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(c["state"] == READY for c in self._components.values())
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "ready": all(c["state"] == READY for c in self._components.values()),
+                "components": {name: dict(c) for name, c in self._components.items()},
+            }
+
+    def _run(self, prompt_texts):
+        # The dialog's modules are imported through the registry like every other integration
+        integrations.load(integrations.VOICE_DIALOG)
+        from . import stt, tts
+        self._step("stt_model", stt._load_model)
+        self._step("tts_engine", tts.init_engine)
+        self._step("tts_prompts", lambda: self._render_prompts(tts, prompt_texts))
+
+    def _render_prompts(self, tts, prompt_texts):
+        cache = tts.get_cache()
+        if cache is None:
+            return "cache disabled"
+        for text in prompt_texts:
+            cache.render(text, voice=tts.TTS_VOICE)
+        return f"{len(prompt_texts)} prompts"
+
+    def _step(self, name: str, load):
+        self._set(name, state=LOADING)
+        started = time.perf_counter()
+        try:
+            detail = load()
+            elapsed = time.perf_counter() - started
+            self._set(name, state=READY, seconds=round(elapsed, 2), detail=detail if isinstance(detail, str) else None)
+            logger.info(f"Voice warmup: {name} ready in {elapsed:.1f}s")
+        except ImportError as e:
+            self._set(name, state=UNAVAILABLE, error=str(e))
+            logger.warning(f"Voice warmup: {name} unavailable: {e}")
+        except Exception as e:
+            state = UNAVAILABLE if isinstance(e, RuntimeError) and "not found" in str(e) else FAILED
+            self._set(name, state=state, error=str(e))
+            logger.error(f"Voice warmup: {name} failed: {e}")
+
+    def _set(self, name: str, **values):
+        with self._lock:
+            self._components[name] = values
+
+
+# Shared instance started by the app
+warmup = VoiceWarmup()
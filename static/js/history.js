@@ -1,87 +1,235 @@
+// 報告履歴はカーソル (next_cursor) で1ページずつ取得し、スクロールに合わせて追加読み込みする
+const HISTORY_PAGE_SIZE = 100;
+// 絞り込みの日付と月ごとのグループは日本時間で扱う (サーバーは UTC)
+const HISTORY_TIME_ZONE = 'Asia/Tokyo';
+const HISTORY_UTC_OFFSET = '+09:00';
+const SENTINEL_MARGIN_PX = 200;
+
+let loadedCount = 0;       // 読み込み済みのレコード数
+let nextCursor = null;     // 次ページのカーソル (null なら最後まで読み込み済み)
+let isLoading = false;
+let historyFilters = {};   // schedule_id / from / to
+let historyGeneration = 0; // 絞り込みのたびに増やし、古い結果を捨てる
+let abortController = null;
+let monthGroups = new Map(); // 年月 -> { button, tbody, count }
+
+const yearMonthFormat = new Intl.DateTimeFormat('ja-JP', { timeZone: HISTORY_TIME_ZONE, year: 'numeric', month: '2-digit' });
+
 document.addEventListener('DOMContentLoaded', function() {
-    fetchHistory();
+    const filterForm = document.getElementById('history-filter-form');
+    if (filterForm) {
+        filterForm.addEventListener('submit', function(event) {
+            event.preventDefault();
+            historyFilters = {
+                schedule_id: document.getElementById('filter-schedule-id').value,
+                from: document.getElementById('filter-from').value,
+                to: document.getElementById('filter-to').value,
+            };
+            resetHistory();
+        });
+    }
+
+    // 末尾の番兵要素が見えたら次のページを読み込む
+    const sentinel = document.getElementById('history-sentinel');
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreIfNeeded();
+        }
+    }, { rootMargin: `${SENTINEL_MARGIN_PX}px` });
+    observer.observe(sentinel);
+
+    resetHistory();
 });
 
-async function fetchHistory() {
+function resetHistory() {
+    // 読み込み中のページは破棄する (古い絞り込み条件の結果が混ざらないように)
+    if (abortController) {
+        abortController.abort();
+    }
+    historyGeneration += 1;
+    updateExportLink();
+    isLoading = false;
+    loadedCount = 0;
+    nextCursor = null;
+    monthGroups = new Map();
     const accordionContainer = document.getElementById('history-accordion');
     accordionContainer.innerHTML = '<div class="text-center p-3">履歴を読み込み中...</div>'; // ローディング表示
+    fetchHistoryPage();
+}
+
+function loadMoreIfNeeded() {
+    if (!nextCursor || isLoading) {
+        return;
+    }
+    // 短いページの後は番兵が見えたままで IntersectionObserver が再通知しないため、位置で判定する
+    const sentinel = document.getElementById('history-sentinel');
+    if (sentinel.getBoundingClientRect().top <= window.innerHeight + SENTINEL_MARGIN_PX) {
+        fetchHistoryPage();
+    }
+}
+
+function nextDay(dateValue) {
+    const [year, month, day] = dateValue.split('-').map(Number);
+    return new Date(Date.UTC(year, month - 1, day + 1)).toISOString().slice(0, 10);
+}
+
+function historyFilterParams() {
+    const params = new URLSearchParams();
+    if (historyFilters.schedule_id) {
+        params.set('schedule_id', historyFilters.schedule_id);
+    }
+    // 日付入力は日本時間の暦日: その日の 0:00 (JST) から翌日 0:00 (JST) の手前まで
+    if (historyFilters.from) {
+        params.set('from', `${historyFilters.from}T00:00:00${HISTORY_UTC_OFFSET}`);
+    }
+    if (historyFilters.to) {
+        params.set('to', `${nextDay(historyFilters.to)}T00:00:00${HISTORY_UTC_OFFSET}`);
+    }
+    return params;
+}
+
+function buildHistoryUrl() {
+    const params = historyFilterParams();
+    params.set('limit', HISTORY_PAGE_SIZE);
+    if (nextCursor) {
+        params.set('cursor', nextCursor);
+    }
+    return `/api/report_history?${params.toString()}`;
+}
+
+function updateExportLink() {
+    // CSVエクスポートは表示中の絞り込み条件で行う
+    const exportLink = document.getElementById('history-export-link');
+    if (exportLink) {
+        const params = historyFilterParams();
+        params.set('format', 'csv');
+        exportLink.href = `/api/report_history/export?${params.toString()}`;
+    }
+}
+
+async function fetchHistoryPage() {
+    const accordionContainer = document.getElementById('history-accordion');
+    const sentinel = document.getElementById('history-sentinel');
+    const generation = historyGeneration;
+    abortController = new AbortController();
+    isLoading = true;
+    sentinel.textContent = loadedCount > 0 ? 'さらに読み込み中...' : '';
 
     try {
-        const response = await fetch('/api/report_history');
+        const response = await fetch(buildHistoryUrl(), { signal: abortController.signal });
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
-        const historyData = await response.json();
+        const page = await response.json();
+        if (generation !== historyGeneration) {
+            return; // 絞り込みが変わった
+        }
+        if (loadedCount === 0) {
+            accordionContainer.innerHTML = ''; // ローディング表示をクリア
+        }
+        nextCursor = page.next_cursor;
+        appendHistory(accordionContainer, page.items);
+        loadedCount += page.items.length;
 
-        if (historyData.length === 0) {
+        if (loadedCount === 0) {
             accordionContainer.innerHTML = '<div class="text-center p-3">報告履歴はありません。</div>';
-            return;
         }
-
-        // 年月でグループ化
-        const groupedHistory = historyData.reduce((acc, record) => {
-            const completedDate = new Date(record.completed_at);
-            // completed_at は UTC で保存されていると仮定し、JSTに変換して年月を取得
-            const year = completedDate.getFullYear();
-            const month = completedDate.getMonth() + 1; // getMonthは0始まり
-            const yearMonth = `${year}年${String(month).padStart(2, '0')}月`;
-
-            if (!acc[yearMonth]) {
-                acc[yearMonth] = [];
-            }
-            acc[yearMonth].push(record);
-            return acc;
-        }, {});
-
-        // アコーディオン要素を生成
-        accordionContainer.innerHTML = ''; // ローディング表示をクリア
-        const sortedYearMonths = Object.keys(groupedHistory).sort().reverse(); // 新しい年月を上に
-
-        sortedYearMonths.forEach((yearMonth, index) => {
-            const records = groupedHistory[yearMonth];
-            const accordionItemId = `collapse-${index}`;
-            const isFirstItem = index === 0; // 最初の項目をデフォルトで開く
-
-            const accordionItem = document.createElement('div');
-            accordionItem.classList.add('accordion-item');
-            accordionItem.innerHTML = `
-                <h2 class="accordion-header" id="heading-${index}">
-                    <button class="accordion-button ${isFirstItem ? '' : 'collapsed'}" type="button" data-bs-toggle="collapse" data-bs-target="#${accordionItemId}" aria-expanded="${isFirstItem}" aria-controls="${accordionItemId}">
-                        ${yearMonth} (${records.length}件)
-                    </button>
-                </h2>
-                <div id="${accordionItemId}" class="accordion-collapse collapse ${isFirstItem ? 'show' : ''}" aria-labelledby="heading-${index}" data-bs-parent="#history-accordion">
-                    <div class="accordion-body">
-                        <table class="table table-sm table-hover">
-                            <thead>
-                                <tr>
-                                    <th>報告日時 (JST)</th>
-                                    <th>スケジュール名</th>
-                                    <th>スケジュールID</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                ${records.map(record => {
-                                    // completed_at を JST で表示
-                                    const completedDateJST = new Date(record.completed_at).toLocaleString('ja-JP', { timeZone: 'Asia/Tokyo' });
-                                    return `
-                                        <tr>
-                                            <td>${completedDateJST}</td>
-                                            <td>${record.schedule_description}</td>
-                                            <td>${record.schedule_id}</td>
-                                        </tr>
-                                    `;
-                                }).join('')}
-                            </tbody>
-                        </table>
-                    </div>
-                </div>
-            `;
-            accordionContainer.appendChild(accordionItem);
-        });
-
     } catch (error) {
+        if (generation !== historyGeneration) {
+            return; // 中断された古いリクエスト
+        }
         console.error('Error fetching history:', error);
         accordionContainer.innerHTML = '<div class="alert alert-danger">履歴の読み込み中にエラーが発生しました。</div>';
+        nextCursor = null;
+    } finally {
+        if (generation === historyGeneration) {
+            isLoading = false;
+            sentinel.textContent = nextCursor ? '' : (loadedCount > 0 ? 'すべての履歴を表示しました。' : '');
+            // 画面が埋まるまで続けて読み込む
+            requestAnimationFrame(loadMoreIfNeeded);
+        }
     }
 }
+
+function yearMonthOf(record) {
+    // completed_at は UTC。日本時間の年月でグループ化する
+    const parts = yearMonthFormat.formatToParts(new Date(record.completed_at));
+    const year = parts.find(part => part.type === 'year').value;
+    const month = parts.find(part => part.type === 'month').value;
+    return `${year}年${month}月`;
+}
+
+function createMonthGroup(accordionContainer, yearMonth) {
+    const index = monthGroups.size;
+    const accordionItemId = `collapse-${index}`;
+    const isOpen = index === 0; // 最初 (最新) の月だけ開く
+
+    const accordionItem = document.createElement('div');
+    accordionItem.classList.add('accordion-item');
+    accordionItem.innerHTML = `
+        <h2 class="accordion-header" id="heading-${index}">
+            <button class="accordion-button ${isOpen ? '' : 'collapsed'}" type="button" data-bs-toggle="collapse" data-bs-target="#${accordionItemId}" aria-expanded="${isOpen}" aria-controls="${accordionItemId}"></button>
+        </h2>
+        <div id="${accordionItemId}" data-year-month="${yearMonth}" class="accordion-collapse collapse ${isOpen ? 'show' : ''}" aria-labelledby="heading-${index}">
+            <div class="accordion-body">
+                <table class="table table-sm table-hover">
+                    <thead>
+                        <tr>
+                            <th>報告日時 (JST)</th>
+                            <th>スケジュール名</th>
+                            <th>スケジュールID</th>
+                        </tr>
+                    </thead>
+                    <tbody></tbody>
+                </table>
+            </div>
+        </div>
+    `;
+    accordionContainer.appendChild(accordionItem);
+    const group = {
+        yearMonth,
+        button: accordionItem.querySelector('.accordion-button'),
+        tbody: accordionItem.querySelector('tbody'),
+        count: 0,
+    };
+    monthGroups.set(yearMonth, group);
+    return group;
+}
+
+function createHistoryRow(record) {
+    const row = document.createElement('tr');
+    // completed_at を JST で表示
+    const cells = [
+        new Date(record.completed_at).toLocaleString('ja-JP', { timeZone: HISTORY_TIME_ZONE }),
+        record.schedule_description,
+        record.schedule_id,
+    ];
+    cells.forEach(value => {
+        const cell = document.createElement('td');
+        cell.textContent = value ?? '';
+        row.appendChild(cell);
+    });
+    return row;
+}
+
+function appendHistory(accordionContainer, records) {
+    // 新しい順に届くので、新しい月は常に末尾に追加される。既存の行・開閉状態はそのまま
+    const touched = new Set();
+    records.forEach(record => {
+        const yearMonth = yearMonthOf(record);
+        const group = monthGroups.get(yearMonth) || createMonthGroup(accordionContainer, yearMonth);
+        group.tbody.appendChild(createHistoryRow(record));
+        group.count += 1;
+        touched.add(group);
+    });
+
+    // 件数表示: 最後のグループは次ページにも続く可能性がある
+    const groups = Array.from(monthGroups.values());
+    const lastGroup = groups[groups.length - 1];
+    groups.forEach(group => {
+        if (touched.has(group) || group === lastGroup || group.button.textContent.includes('+')) {
+            const countLabel = (group === lastGroup && nextCursor) ? `${group.count}件+` : `${group.count}件`;
+            group.button.textContent = `${group.yearMonth} (${countLabel})`;
+        }
+    });
+}
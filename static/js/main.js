@@ -34,6 +34,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         schedules.forEach(schedule => {
             const row = document.createElement('tr');
+            row.dataset.scheduleId = schedule.id; // SSE イベントから行を特定するため
             const isActiveText = schedule.is_active ? '有効' : '無効';
             const toggleClass = schedule.is_active ? 'btn-secondary' : 'btn-success';
             const toggleButtonText = schedule.is_active ? '無効化' : '有効化';
@@ -41,7 +42,7 @@ document.addEventListener('DOMContentLoaded', function() {
             row.innerHTML = `
                 <td>${schedule.id}</td>
                 <td>${escapeHtml(schedule.description)}</td>
-                <td>${schedule.interval_minutes ?? 'N/A'}</td>
+                <td>${schedule.cron_expr ? `<code>${escapeHtml(schedule.cron_expr)}</code>` : (schedule.interval_minutes ?? 'N/A')}</td>
                 <td>${escapeHtml(schedule.excel_path) || '-'}</td>
                 <td>${schedule.google_form_url ? `<a href="${schedule.google_form_url}" target="_blank">Link</a>` : ''}</td>
                 <td>${isActiveText}</td>
@@ -51,7 +52,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     <button class="btn btn-danger btn-sm delete-button" data-schedule-id="${schedule.id}">削除</button>
                     <button class="btn ${toggleClass} btn-sm toggle-active-button" data-schedule-id="${schedule.id}" data-is-active="${schedule.is_active}">${toggleButtonText}</button>
                 </td>
-                <td>
+                <td class="report-status-cell">
                     <button class="btn btn-info btn-sm report-completed-button" data-schedule-id="${schedule.id}">報告完了</button>
                 </td>
             `;
@@ -63,13 +64,14 @@ document.addEventListener('DOMContentLoaded', function() {
     addForm.addEventListener('submit', async function(event) {
         event.preventDefault();
         const description = document.getElementById('description').value;
-        const interval_minutes = parseInt(document.getElementById('interval_minutes').value, 10);
+        const cron_expr = document.getElementById('cron_expr').value.trim();
+        const interval_minutes = cron_expr ? 0 : parseInt(document.getElementById('interval_minutes').value, 10);
         const excel_path = document.getElementById('excel_path').value;
         const google_form_url = document.getElementById('google_form_url').value;
 
-        // Basic validation
-        if (isNaN(interval_minutes) || interval_minutes <= 0) {
-            alert('Please enter a valid interval in minutes (must be greater than 0).');
+        // Basic validation (cron式は サーバー側で検証)
+        if (!cron_expr && (isNaN(interval_minutes) || interval_minutes <= 0)) {
+            alert('Please enter a valid interval in minutes (must be greater than 0) or a cron expression.');
             return;
         }
 
@@ -79,7 +81,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ description, interval_minutes, excel_path, google_form_url }),
+                body: JSON.stringify({ description, interval_minutes, cron_expr, excel_path, google_form_url }),
             });
             if (!response.ok) {
                  const errorData = await response.json();
@@ -150,6 +152,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     document.getElementById('edit-schedule-id').value = schedule.id;
                     document.getElementById('edit-description').value = schedule.description || '';
                     document.getElementById('edit-interval_minutes').value = schedule.interval_minutes || '';
+                    document.getElementById('edit-cron_expr').value = schedule.cron_expr || '';
                     document.getElementById('edit-excel-path').value = schedule.excel_path || ''; // IDを修正
                     document.getElementById('edit_google_form_url').value = schedule.google_form_url || '';
                     document.getElementById('edit-is_active').checked = schedule.is_active;
@@ -244,7 +247,7 @@ document.addEventListener('DOMContentLoaded', function() {
         else if (target.classList.contains('report-completed-button')) {
             console.log("Report completed button action for", scheduleId);
             if (confirm(`スケジュール ID: ${scheduleId} の報告を完了として記録しますか？`)) {
-                fetch(`/api/schedules/${scheduleId}/report_completed`, { method: 'POST' })
+                fetch(`/api/schedules/${scheduleId}/mark_completed`, { method: 'POST' })
                     .then(response => {
                         if (!response.ok) {
                             return response.json().then(err => { throw new Error(err.message || `HTTP error! status: ${response.status}`) });
@@ -271,13 +274,14 @@ document.addEventListener('DOMContentLoaded', function() {
     saveEditButton.addEventListener('click', async function() {
         const id = document.getElementById('edit-schedule-id').value;
         const description = document.getElementById('edit-description').value;
-        const interval_minutes = parseInt(document.getElementById('edit-interval_minutes').value, 10);
+        const cron_expr = document.getElementById('edit-cron_expr').value.trim();
+        const interval_minutes = cron_expr ? 0 : parseInt(document.getElementById('edit-interval_minutes').value, 10);
         const excel_path = document.getElementById('edit-excel-path').value; // IDを修正
         const google_form_url = document.getElementById('edit_google_form_url').value;
 
         // Basic validation
-        if (isNaN(interval_minutes) || interval_minutes <= 0) {
-            alert('Please enter a valid interval in minutes (must be greater than 0).');
+        if (!cron_expr && (isNaN(interval_minutes) || interval_minutes <= 0)) {
+            alert('Please enter a valid interval in minutes (must be greater than 0) or a cron expression.');
             return;
         }
 
@@ -287,7 +291,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ description, interval_minutes, excel_path, google_form_url }),
+                body: JSON.stringify({ description, interval_minutes, cron_expr, excel_path, google_form_url }),
             });
             if (!response.ok) {
                 const errorData = await response.json();
@@ -301,6 +305,30 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // --- cron式のプレビュー (次回以降の実行予定) ---
+    const cronInput = document.getElementById('cron_expr');
+    const cronPreview = document.getElementById('cron-preview');
+    let cronPreviewTimer = null;
+    cronInput.addEventListener('input', function() {
+        clearTimeout(cronPreviewTimer);
+        const expr = cronInput.value.trim();
+        if (!expr) {
+            cronPreview.textContent = '';
+            return;
+        }
+        cronPreviewTimer = setTimeout(async function() {
+            try {
+                const response = await fetch(`/api/cron/preview?expr=${encodeURIComponent(expr)}&count=3`);
+                const data = await response.json();
+                cronPreview.textContent = response.ok
+                    ? '次回: ' + data.next_fire_times.map(t => new Date(t).toLocaleString()).join(', ')
+                    : data.error;
+            } catch (error) {
+                cronPreview.textContent = '';
+            }
+        }, 300);
+    });
+
     // --- 初期読み込み --- 
     loadSchedules();
 
@@ -327,10 +355,44 @@ document.addEventListener('DOMContentLoaded', function() {
     };
 
     eventSource.onerror = function(err) {
-        console.error('SSE error:', err);
-        // Optionally attempt to reconnect or notify the user
+        // ブラウザが Last-Event-ID 付きで自動再接続し、取りこぼしたイベントはサーバー側で再送される
+        console.warn('SSE connection interrupted, the browser will reconnect:', err);
     };
 
+    // 短時間に複数のイベントが届いても一覧の再読み込みは1回にまとめる
+    let reloadTimer = null;
+    function scheduleReload() {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(loadSchedules, 300);
+    }
+
+    eventSource.addEventListener('schedule_changed', function(event) {
+        console.log('Received schedule_changed event:', event.data);
+        scheduleReload();
+    });
+
+    eventSource.addEventListener('report_completed', function(event) {
+        console.log('Received report_completed event:', event.data);
+        try {
+            const data = JSON.parse(event.data);
+            const row = scheduleListBody.querySelector(`tr[data-schedule-id='${data.schedule_id}']`);
+            const reportStatusCell = row ? row.querySelector('.report-status-cell') : null;
+            if (reportStatusCell) {
+                reportStatusCell.innerHTML = `
+                    <button class="btn btn-info btn-sm report-completed-button" data-schedule-id="${data.schedule_id}">報告完了</button>
+                `;
+            }
+        } catch (e) {
+            console.error('Error parsing SSE data:', e);
+        }
+    });
+
+    // 再送できないほど古い Last-Event-ID で再接続した場合は一覧を取り直す
+    eventSource.addEventListener('resync', function() {
+        console.log('Received resync event, reloading schedules.');
+        scheduleReload();
+    });
+
     // Listen for 'alert_triggered' events from the server
     eventSource.addEventListener('alert_triggered', function(event) {
         console.log('Received alert_triggered event:', event.data);
@@ -385,6 +447,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     document.getElementById('edit-schedule-id').value = schedule.id;
                     document.getElementById('edit-description').value = schedule.name;
                     document.getElementById('edit-interval_minutes').value = schedule.interval_minutes;
+                    document.getElementById('edit-cron_expr').value = schedule.cron_expr || '';
                     document.getElementById('edit-excel-path').value = schedule.excel_path || '';
                     document.getElementById('edit-google_form_url').value = schedule.google_form_url || '';
                     editModal.show(); // Show modal programmatically
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# db.py builds its engine at import: point it at a scratch database, never the real app.db
+_scratch = tempfile.mkdtemp(prefix="easyreport-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'app.db')}"
+os.environ["SCHEDULER_JOBSTORE_URL"] = f"sqlite:///{os.path.join(_scratch, 'jobs.sqlite')}"
+os.environ["COMPLETION_SPOOL_PATH"] = os.path.join(_scratch, "completion_spool.jsonl")
+os.environ["VOICE_JOURNAL_DIR"] = os.path.join(_scratch, "voice_journal")
+os.environ["VOICE_WARMUP"] = "false"
+os.environ["AUDIO_BACKEND"] = "null"
+# Ephemeral port: never collides with a running app
+os.environ["SSE_PORT"] = "0"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """A sessionmaker on a fresh SQLite file with all tables created."""
+    from sqlalchemy.orm import sessionmaker
+    import models  # noqa: F401 (registers the tables)
+    from db import Base, create_db_engine
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def schedule_id(session_factory):
+    """ID of one active schedule."""
+    from models import Schedule
+
+    session = session_factory()
+    try:
+        schedule = Schedule(description="daily report", interval_minutes=60, is_active=True)
+        session.add(schedule)
+        session.commit()
+        return schedule.id
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """Flask test client of src.app (imported once; it starts the scheduler and workers)."""
+    from src.app import app
+
+    return app.test_client()
@@ -0,0 +1,103 @@
+import uuid
+
+from db import SessionLocal
+from models import Schedule
+
+
+def _job_code():
+    return f"job-{uuid.uuid4().hex[:8]}"
+
+
+def _schedule(job_code):
+    session = SessionLocal()
+    try:
+        return session.query(Schedule).filter(Schedule.job_code == job_code).one()
+    finally:
+        session.close()
+
+
+def test_creates_and_updates_by_job_code(app_client):
+    job_code = _job_code()
+    row = {"job_code": job_code, "description": "weekly", "interval_minutes": 60, "is_active": False}
+
+    response = app_client.post("/api/schedules/bulk", json=[row])
+    assert response.status_code == 200
+    assert response.json["created"] == 1
+
+    response = app_client.post("/api/schedules/bulk", json=[{**row, "description": "weekly (renamed)"}])
+    assert response.json["updated"] == 1
+    assert _schedule(job_code).description == "weekly (renamed)"
+
+    response = app_client.post("/api/schedules/bulk", json=[{**row, "description": "weekly (renamed)"}])
+    assert response.json["unchanged"] == 1
+
+
+def test_invalid_row_rejects_whole_import(app_client):
+    job_code = _job_code()
+    response = app_client.post("/api/schedules/bulk", json=[
+        {"job_code": job_code, "description": "ok", "interval_minutes": 5, "is_active": False},
+        {"job_code": _job_code(), "description": "bad cron", "cron_expr": "61 * * * *", "is_active": False},
+    ])
+    assert response.status_code == 400
+    assert [error["row"] for error in response.json["errors"]] == [2]
+    session = SessionLocal()
+    try:
+        assert session.query(Schedule).filter(Schedule.job_code == job_code).count() == 0
+    finally:
+        session.close()
+
+
+def test_interval_row_clears_existing_cron_expr(app_client):
+    job_code = _job_code()
+    app_client.post("/api/schedules/bulk", json=[
+        {"job_code": job_code, "description": "cron", "cron_expr": "0 17 * * mon-fri", "is_active": False},
+    ])
+    assert _schedule(job_code).cron_expr == "0 17 * * mon-fri"
+
+    response = app_client.post("/api/schedules/bulk", json=[
+        {"job_code": job_code, "description": "cron", "interval_minutes": 30, "is_active": False},
+    ])
+
+    assert response.json["updated"] == 1
+    schedule = _schedule(job_code)
+    assert schedule.cron_expr is None
+    assert schedule.interval_minutes == 30
+
+
+def test_scheduling_failure_leaves_dispatcher_and_index_unchanged(app_client, monkeypatch):
+    from src import app as app_module
+
+    codes = [_job_code(), _job_code()]
+    app_client.post("/api/schedules/bulk", json=[
+        {"job_code": code, "description": "cron", "cron_expr": "0 9 * * *", "is_active": True} for code in codes
+    ])
+    ids = [_schedule(code).id for code in codes]
+    before = {schedule_id: (app_module.cron_dispatcher.next_fire_time(schedule_id), app_module.next_run_index.get(schedule_id))
+              for schedule_id in ids}
+    dispatched_before = app_module.cron_dispatcher.schedule_ids()
+    assert all(fire_time is not None for fire_time, _ in before.values())
+
+    register = app_module.add_or_update_jobs_for_schedule
+    calls = []
+
+    def fail_halfway(schedule, fingerprint_updates=None):
+        calls.append(schedule.id)
+        if len(calls) == 2:
+            return False
+        return register(schedule, fingerprint_updates)
+
+    monkeypatch.setattr(app_module, "add_or_update_jobs_for_schedule", fail_halfway)
+    new_code = _job_code()
+    response = app_client.post("/api/schedules/bulk", json=[
+        {"job_code": codes[0], "description": "cron", "cron_expr": "30 17 * * *", "is_active": True},
+        {"job_code": codes[1], "description": "cron", "cron_expr": "30 17 * * *", "is_active": True},
+        {"job_code": new_code, "description": "new", "cron_expr": "30 17 * * *", "is_active": True},
+    ])
+    monkeypatch.undo()
+
+    assert response.status_code == 500
+    assert calls[:2] == ids
+    assert app_module.cron_dispatcher.schedule_ids() == dispatched_before
+    for schedule_id in ids:
+        assert (app_module.cron_dispatcher.next_fire_time(schedule_id), app_module.next_run_index.get(schedule_id)) == before[schedule_id]
+        assert _schedule(codes[ids.index(schedule_id)]).cron_expr == "0 9 * * *"
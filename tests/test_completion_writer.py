@@ -0,0 +1,92 @@
+import datetime
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from db import create_db_engine
+from models import ReportHistory
+from src.completion_writer import CompletionWriter, SPOOLED, WRITTEN
+
+
+def _spool_line(schedule_id, completed_at):
+    return json.dumps({"schedule_id": schedule_id, "completed_at": completed_at.isoformat()}) + "\n"
+
+
+def _history(session_factory):
+    session = session_factory()
+    try:
+        return sorted(row.completed_at for row in session.query(ReportHistory))
+    finally:
+        session.close()
+
+
+def test_submit_writes_row(session_factory, schedule_id, tmp_path):
+    writer = CompletionWriter(session_factory, flush_interval_ms=10, spool_path=str(tmp_path / "spool.jsonl"))
+    writer.start()
+    try:
+        assert writer.submit(schedule_id, wait=True, timeout=5) == WRITTEN
+    finally:
+        writer.stop()
+    assert len(_history(session_factory)) == 1
+
+
+def test_failed_flush_is_spooled_and_replayed_on_start(session_factory, schedule_id, tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    # No tables in this database: every flush fails
+    broken_engine = create_db_engine(f"sqlite:///{tmp_path / 'broken.db'}")
+    writer = CompletionWriter(sessionmaker(bind=broken_engine), flush_interval_ms=10, spool_path=str(spool_path))
+    writer.start()
+    try:
+        assert writer.submit(schedule_id, wait=True, timeout=5) == SPOOLED
+    finally:
+        writer.stop()
+        broken_engine.dispose()
+    assert spool_path.exists()
+
+    CompletionWriter(session_factory, spool_path=str(spool_path))._replay_spool()
+    assert len(_history(session_factory)) == 1
+    assert not spool_path.exists()
+    assert not (tmp_path / "spool.jsonl.replay").exists()
+
+
+def test_replay_left_over_from_crash_is_not_lost(session_factory, schedule_id, tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    first = datetime.datetime(2026, 1, 1, 9, 0)
+    second = datetime.datetime(2026, 1, 2, 9, 0)
+    # A previous start crashed after moving the spool aside; more was spooled since
+    (tmp_path / "spool.jsonl.replay").write_text(_spool_line(schedule_id, first), encoding="utf-8")
+    spool_path.write_text(_spool_line(schedule_id, second), encoding="utf-8")
+
+    CompletionWriter(session_factory, spool_path=str(spool_path))._replay_spool()
+
+    assert _history(session_factory) == [first, second]
+    assert not (tmp_path / "spool.jsonl.replay").exists()
+
+
+def test_replay_skips_truncated_line(session_factory, schedule_id, tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    completed_at = datetime.datetime(2026, 1, 1, 9, 0)
+    spool_path.write_text(_spool_line(schedule_id, completed_at) + '{"schedule_id": ', encoding="utf-8")
+
+    CompletionWriter(session_factory, spool_path=str(spool_path))._replay_spool()
+
+    assert _history(session_factory) == [completed_at]
+
+
+def test_replay_after_a_crash_past_the_commit_is_idempotent(session_factory, schedule_id, tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    first = datetime.datetime(2026, 1, 1, 9, 0, 0, 250000)
+    second = datetime.datetime(2026, 1, 2, 9, 0)
+    lines = _spool_line(schedule_id, first) + _spool_line(schedule_id, second)
+    replay_path = tmp_path / "spool.jsonl.replay"
+    replay_path.write_text(lines, encoding="utf-8")
+    writer = CompletionWriter(session_factory, spool_path=str(spool_path))
+    writer._replay_spool()
+    # The process died after the commit, before the replay file was removed
+    replay_path.write_text(lines + _spool_line(schedule_id, second), encoding="utf-8")
+
+    writer._replay_spool()
+
+    assert _history(session_factory) == [first, second]
+    assert writer.stats()["rows_replay_skipped"] == 3
+    assert not replay_path.exists()
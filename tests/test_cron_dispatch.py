@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from src.cron_dispatch import crontab_day_of_week, parse_cron_expr, preview_fire_times
+
+TOKYO = pytz.timezone("Asia/Tokyo")
+# A Sunday
+NOW = TOKYO.localize(datetime(2026, 10, 18, 12, 0))
+
+
+def _weekdays(expr, count=7):
+    """Names of the days the next `count` fire times fall on."""
+    return [fire_time.strftime("%a").lower() for fire_time in preview_fire_times(expr, TOKYO, count, now=NOW)]
+
+
+def test_weekday_range_uses_crontab_numbering():
+    assert _weekdays("0 17 * * 1-5", 5) == ["mon", "tue", "wed", "thu", "fri"]
+
+
+@pytest.mark.parametrize("expr", ["0 17 * * 0", "0 17 * * 7", "0 17 * * sun"])
+def test_zero_and_seven_are_sunday(expr):
+    assert _weekdays(expr, 3) == ["sun", "sun", "sun"]
+    assert preview_fire_times(expr, TOKYO, 1, now=NOW)[0] == TOKYO.localize(datetime(2026, 10, 18, 17, 0))
+
+
+def test_lists_steps_and_ranges_through_sunday():
+    assert set(_weekdays("0 9 * * 1,3,5")) == {"mon", "wed", "fri"}
+    assert set(_weekdays("0 9 * * */2")) == {"sun", "tue", "thu", "sat"}
+    assert set(_weekdays("0 9 * * 5-7")) == {"fri", "sat", "sun"}
+
+
+def test_day_of_week_rewrite():
+    assert crontab_day_of_week("*") == "*"
+    assert crontab_day_of_week("1-5") == "mon,tue,wed,thu,fri"
+    assert crontab_day_of_week("mon-fri") == "mon,tue,wed,thu,fri"
+    assert crontab_day_of_week("0,7") == "sun"
+
+
+@pytest.mark.parametrize("expr", ["0 17 * * 8", "0 17 * * 5-1", "0 17 * *", "61 * * * *", "0 17 * * 1/0"])
+def test_invalid_expressions_raise_value_error(expr):
+    with pytest.raises(ValueError):
+        parse_cron_expr(expr, TOKYO)
+
+
+def test_day_of_month_or_day_of_week_as_in_cron():
+    # Fires on the 1st (a Sunday in November 2026) and on every Monday, not only on Mondays the 1st
+    fire_times = preview_fire_times("0 9 1 * 1", TOKYO, 4, now=NOW)
+    assert [fire_time.strftime("%m-%d %a") for fire_time in fire_times] == [
+        "10-19 Mon", "10-26 Mon", "11-01 Sun", "11-02 Mon"]
+
+
+def test_day_step_keeps_both_fields_required():
+    # A field starting with '*' does not restrict on its own: both must match
+    assert _weekdays("0 9 */2 * 1", 3) == ["mon", "mon", "mon"]
+    assert all(fire_time.day % 2 == 1 for fire_time in preview_fire_times("0 9 */2 * 1", TOKYO, 3, now=NOW))
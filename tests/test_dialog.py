@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from src.voice import dialog
+
+
+class _Source:
+    sample_rate = 16000
+
+    def start(self):
+        pass
+
+    def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Recognizer:
+    def recognize(self, source, timeout, skip_empty):
+        return "完了"
+
+
+@pytest.fixture
+def journal_paths(monkeypatch):
+    """Paths of the journals the dialogs open."""
+    paths = []
+    journal_class = dialog.DialogJournal
+
+    def journal(schedule_id):
+        opened = journal_class(schedule_id)
+        paths.append(opened.path)
+        return opened
+
+    monkeypatch.setattr(dialog, "DialogJournal", journal)
+    yield paths
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _fail_persist(session_factory, records):
+    raise RuntimeError("database is locked")
+
+
+def _run(pipelined=False):
+    return dialog.run_voice_dialog(1, ["進捗は？"], audio_source=_Source(), recognizer=_Recognizer(), pipelined=pipelined)
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_cleanup_failure_does_not_hide_the_dialog_error(monkeypatch, journal_paths, pipelined):
+    def broken_speaker(text):
+        raise OSError("no audio device")
+
+    monkeypatch.setattr(dialog, "tts_play", broken_speaker)
+    monkeypatch.setattr(dialog, "prefetch", lambda text: None)
+    monkeypatch.setattr(dialog, "persist_dialog", _fail_persist)
+    with pytest.raises(OSError, match="no audio device"):
+        _run(pipelined)
+    # Kept for recover_journals
+    assert os.path.exists(journal_paths[0])
+
+
+def test_save_failure_of_a_finished_dialog_is_raised(monkeypatch, journal_paths):
+    monkeypatch.setattr(dialog, "tts_play", lambda text: None)
+    monkeypatch.setattr(dialog, "persist_dialog", _fail_persist)
+    with pytest.raises(RuntimeError, match="database is locked"):
+        _run()
+    assert os.path.exists(journal_paths[0])
@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from models import Schedule
+from src import events
+from src.excel_paths import ExcelPathCache, check
+
+
+@pytest.fixture
+def published():
+    """schedule_ids of every EXCEL_PATHS_CHANGED event published during the test."""
+    changes = []
+
+    def handler(schedule_ids):
+        changes.append(sorted(schedule_ids))
+
+    events.bus.subscribe(events.EXCEL_PATHS_CHANGED, handler)
+    yield changes
+    events.bus.unsubscribe(events.EXCEL_PATHS_CHANGED, handler)
+
+
+@pytest.fixture
+def workbook(session_factory, schedule_id, tmp_path):
+    """An existing .xlsx file set as the schedule's excel_path; returns its path."""
+    path = tmp_path / "reports" / "daily.xlsx"
+    path.parent.mkdir()
+    path.write_bytes(b"xlsx")
+    session = session_factory()
+    try:
+        session.get(Schedule, schedule_id).excel_path = str(path)
+        session.commit()
+    finally:
+        session.close()
+    return path
+
+
+def _stored(session_factory, schedule_id):
+    session = session_factory()
+    try:
+        schedule = session.get(Schedule, schedule_id)
+        return schedule.excel_resolved_path, schedule.excel_missing_since
+    finally:
+        session.close()
+
+
+def test_check_resolves_existing_and_missing_files(workbook, tmp_path):
+    entry = check(str(workbook))
+    assert (entry.path, entry.missing_since, entry.error) == (str(workbook), None, None)
+    missing = check(str(tmp_path / "nope.xlsx"))
+    assert missing.missing_since is not None and missing.error is None
+    # Still missing: the first time it was seen missing is kept
+    assert check(str(tmp_path / "nope.xlsx"), missing).missing_since == missing.missing_since
+
+
+def test_unchanged_directory_is_not_rescanned(session_factory, schedule_id, workbook):
+    cache = ExcelPathCache(session_factory)
+    cache.put(schedule_id, check(str(workbook)))
+    assert cache.check_once() == []
+    assert cache.check_once() == []
+    assert cache.stats()["dir_scans"] == 1
+
+
+def test_deleted_file_is_flagged_and_restored(session_factory, schedule_id, workbook, published):
+    cache = ExcelPathCache(session_factory)
+    cache.put(schedule_id, check(str(workbook)))
+    cache.check_once()
+
+    os.remove(workbook)
+    assert cache.check_once() == [schedule_id]
+    assert set(cache.missing()) == {schedule_id}
+    path, missing_since = _stored(session_factory, schedule_id)
+    assert path == str(workbook) and missing_since is not None
+
+    workbook.write_bytes(b"xlsx again")
+    assert cache.check_once() == [schedule_id]
+    assert cache.missing() == {}
+    assert _stored(session_factory, schedule_id) == (str(workbook), None)
+    assert published == [[schedule_id], [schedule_id]]
+
+
+def test_replaced_file_updates_identity_without_an_event(session_factory, schedule_id, workbook, published):
+    cache = ExcelPathCache(session_factory)
+    cache.put(schedule_id, check(str(workbook)))
+    cache.check_once()
+
+    replacement = workbook.with_name("daily.xlsx.tmp")
+    replacement.write_bytes(b"saved by Excel")
+    os.replace(replacement, workbook)
+    assert cache.check_once() == []
+    assert cache.lookup(schedule_id, str(workbook)).inode == os.stat(workbook).st_ino
+    assert published == []
+
+
+def test_edited_schedule_is_not_overwritten_by_a_stale_check(session_factory, schedule_id, workbook, tmp_path):
+    cache = ExcelPathCache(session_factory)
+    cache.put(schedule_id, check(str(workbook)))
+    cache.check_once()
+    os.remove(workbook)
+    # Saved with another path before the watcher runs
+    cache.put(schedule_id, check(str(tmp_path / "other.xlsx")))
+    cache.check_once()
+    assert cache.lookup(schedule_id, str(tmp_path / "other.xlsx")).path == str(tmp_path / "other.xlsx")
+
+
+def test_update_schedule_caches_the_path_only_once_committed(app_client, monkeypatch, tmp_path):
+    from sqlalchemy.orm import Session
+
+    from db import SessionLocal
+    from src.app import excel_path_cache
+
+    old_path, new_path = tmp_path / "old.xlsx", tmp_path / "new.xlsx"
+    old_path.write_bytes(b"xlsx")
+    new_path.write_bytes(b"xlsx")
+    session = SessionLocal()
+    try:
+        schedule = Schedule(description="excel", interval_minutes=60, is_active=False, excel_path=str(old_path))
+        session.add(schedule)
+        session.commit()
+        schedule_id = schedule.id
+    finally:
+        session.close()
+    excel_path_cache.put(schedule_id, check(str(old_path)))
+
+    def failing_commit(self):
+        raise RuntimeError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Session, "commit", failing_commit)
+        response = app_client.put(f"/api/schedules/{schedule_id}", json={"excel_path": str(new_path)})
+    assert response.status_code == 500
+    assert _cached(excel_path_cache, schedule_id, old_path)
+
+    response = app_client.put(f"/api/schedules/{schedule_id}", json={"excel_path": str(new_path)})
+    assert response.status_code == 200
+    assert _cached(excel_path_cache, schedule_id, new_path)
+
+
+def _cached(cache, schedule_id, path) -> bool:
+    """True if the cache already held this path for the schedule (a lookup hit)."""
+    hits = cache.stats()["hits"]
+    return cache.lookup(schedule_id, str(path)).path == str(path) and cache.stats()["hits"] == hits + 1
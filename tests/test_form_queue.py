@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+import requests
+
+from config import settings
+from models import FormSubmission
+from src import google_forms
+from src.form_queue import (FAILED, PENDING, SUCCESS, FormSubmissionSender, enqueue_form_submission,
+                            make_idempotency_key)
+
+FIRST_RUN = datetime.datetime(2026, 10, 19, 9, 0)
+SECOND_RUN = datetime.datetime(2026, 10, 19, 17, 0)
+
+
+@pytest.fixture(autouse=True)
+def entry_ids(monkeypatch):
+    monkeypatch.setitem(settings._snapshot.values, "GOOGLE_FORM_ID", "form")
+    monkeypatch.setattr(google_forms, "form_data", lambda responses: {f"entry.{key}": value for key, value in responses.items()})
+
+
+def _enqueue(session_factory, schedule_id, run_key, answer="完了"):
+    session = session_factory()
+    try:
+        submission, created = enqueue_form_submission(session, schedule_id, {"1": answer}, run_key, form_id="form")
+        session.commit()
+        return submission.id, created
+    finally:
+        session.close()
+
+
+def _rows(session_factory):
+    session = session_factory()
+    try:
+        return [(row.status, row.attempts) for row in session.query(FormSubmission).order_by(FormSubmission.id)]
+    finally:
+        session.close()
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code}", response=response)
+
+
+def test_key_depends_on_the_run():
+    data = {"entry.1": "完了"}
+    assert make_idempotency_key(1, "form", data, FIRST_RUN) == make_idempotency_key(1, "form", data, FIRST_RUN)
+    assert make_idempotency_key(1, "form", data, FIRST_RUN) != make_idempotency_key(1, "form", data, SECOND_RUN)
+    assert make_idempotency_key(1, "form", data, 41) != make_idempotency_key(1, "form", data, 42)
+
+
+def test_retried_run_is_queued_once(session_factory, schedule_id):
+    first_id, created = _enqueue(session_factory, schedule_id, FIRST_RUN)
+    assert created
+    assert _enqueue(session_factory, schedule_id, FIRST_RUN) == (first_id, False)
+    assert len(_rows(session_factory)) == 1
+
+
+def test_second_run_of_the_day_is_queued(session_factory, schedule_id):
+    _enqueue(session_factory, schedule_id, FIRST_RUN)
+    _, created = _enqueue(session_factory, schedule_id, SECOND_RUN)
+    assert created
+    assert len(_rows(session_factory)) == 2
+
+
+@pytest.mark.parametrize("error, status", [
+    (None, SUCCESS),
+    (_http_error(503), PENDING),
+    (_http_error(429), PENDING),
+    (requests.exceptions.ConnectionError("refused"), PENDING),
+    (_http_error(400), FAILED),
+    (_http_error(404), FAILED),
+])
+def test_retry_and_permanent_failure(session_factory, schedule_id, error, status):
+    def post(data, form_id):
+        assert (data, form_id) == ({"entry.1": "完了"}, "form")
+        if error is not None:
+            raise error
+
+    _enqueue(session_factory, schedule_id, FIRST_RUN)
+    sender = FormSubmissionSender(session_factory, post=post, retry_base=60)
+    assert sender.send_once() == 1
+    assert _rows(session_factory) == [(status, 1)]
+    # A retry waits for its backoff
+    assert sender.send_once() == 0
+
+
+def test_gives_up_after_max_attempts(session_factory, schedule_id):
+    def post(data, form_id):
+        raise _http_error(503)
+
+    _enqueue(session_factory, schedule_id, FIRST_RUN)
+    sender = FormSubmissionSender(session_factory, post=post, max_attempts=2, retry_base=0)
+    sender.send_once()
+    sender.send_once()
+    assert _rows(session_factory) == [(FAILED, 2)]
+    assert sender.stats() == {"submitted": 0, "retried": 1, "failed": 1, "pending": 0}
@@ -0,0 +1,195 @@
+import json
+import random
+
+import pytest
+import requests
+
+from src.graph_excel import FAILED, SUCCESS, UNCHANGED, GraphExcelWriter, diff_ranges, range_address
+from src.http_client import GRAPH, get_client
+
+
+def _apply(sheet, ranges):
+    """The sheet after writing every range, as a dict of non-empty cells."""
+    cells = {(row, col): value for row, values in enumerate(sheet) for col, value in enumerate(values)}
+    for top, left, values in ranges:
+        for row_offset, row_values in enumerate(values):
+            for col_offset, value in enumerate(row_values):
+                cells[(top + row_offset, left + col_offset)] = value
+    return {cell: value for cell, value in cells.items() if value not in ("", None)}
+
+
+def _cells(sheet):
+    return _apply(sheet, [])
+
+
+@pytest.mark.parametrize("box, address", [
+    ((0, 0, 0, 0), "A1"),
+    ((1, 1, 2, 3), "B2:D3"),
+    ((0, 25, 0, 26), "Z1:AA1"),
+    ((9, 701, 9, 702), "ZZ10:AAA10"),
+])
+def test_range_address(box, address):
+    assert range_address(*box) == address
+
+
+def test_unchanged_sheet_needs_no_write():
+    sheet = [["a", "b"], ["c", "d"]]
+    assert diff_ranges(sheet, [row[:] for row in sheet]) == []
+
+
+def test_single_changed_cell():
+    assert diff_ranges([["a", "b"], ["c", "d"]], [["a", "b"], ["c", "x"]]) == [(1, 1, [["x"]])]
+
+
+def test_nearby_changes_share_one_rectangle():
+    old = [["1", "2", "3", "4"], ["5", "6", "7", "8"]]
+    new = [["x", "2", "3", "y"], ["z", "6", "7", "w"]]
+    # Gap of two unchanged cells per row is bridged, then the rows merge into one box
+    assert diff_ranges(old, new, gap=2) == [(0, 0, new)]
+
+
+def test_distant_changes_are_separate_writes():
+    old = [[""] * 200 for _ in range(200)]
+    new = [row[:] for row in old]
+    new[0][0] = "top left"
+    new[199][199] = "bottom right"
+    assert diff_ranges(old, new) == [(0, 0, [["top left"]]), (199, 199, [["bottom right"]])]
+
+
+def test_removed_cells_are_cleared():
+    ranges = diff_ranges([["a", "b", "c"], ["d"]], [["a"]])
+    assert _apply([["a", "b", "c"], ["d"]], ranges) == {(0, 0): "a"}
+
+
+def test_none_and_empty_are_the_same():
+    assert diff_ranges([["a", None]], [["a", ""]]) == []
+
+
+def test_random_edits_reproduce_the_new_sheet():
+    rng = random.Random(7)
+    for _ in range(50):
+        rows, cols = rng.randint(1, 30), rng.randint(1, 12)
+        old = [[rng.choice(["", "a", "b", "c"]) for _ in range(cols)] for _ in range(rows)]
+        new = [[rng.choice([value, value, value, "d", ""]) for value in row] for row in old]
+        new = new[:rng.randint(0, rows + 3)] + [["e"] * rng.randint(0, cols)] * rng.randint(0, 3)
+        assert _apply(old, diff_ranges(old, new)) == _cells(new)
+
+
+class _GraphStub:
+    """Stands in for the pooled Graph session: records each $batch and answers it from `statuses`."""
+    def __init__(self):
+        self.batches = []
+        # One entry per $batch: {request address: status or (status, headers)}; missing ones succeed
+        self.statuses = []
+
+    def request(self, method, url, **kwargs):
+        assert (method, url) == ("POST", "https://graph.test/v1.0/$batch")
+        batch = kwargs["json"]["requests"]
+        self.batches.append(batch)
+        answers = self.statuses.pop(0) if self.statuses else {}
+        responses = []
+        for request in batch:
+            answer = answers.get(_address(request), 200)
+            status, headers = answer if isinstance(answer, tuple) else (answer, {})
+            responses.append({"id": request["id"], "status": status, "headers": headers, "body": {}})
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"responses": responses}).encode()
+        return response
+
+
+def _address(request) -> str:
+    """The sheet and range a batched PATCH writes, e.g. "Sheet1!B2"."""
+    sheet = request["url"].split("/worksheets/")[1].split("/")[0]
+    address = request["url"].split("address='")[1].rstrip("')")
+    return f"{sheet}!{address}"
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    stub = _GraphStub()
+    monkeypatch.setattr(get_client(GRAPH).session, "request", stub.request)
+    return stub
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+@pytest.fixture
+def writer(graph, sleeps):
+    return GraphExcelWriter(token_provider=lambda: "token", base_url="https://graph.test/v1.0", sleep=sleeps.append)
+
+
+def _sheet(rows=50, cols=10):
+    return [[f"{row}-{col}" for col in range(cols)] for row in range(rows)]
+
+
+def _edited(sheet, *cells):
+    edited = [row[:] for row in sheet]
+    for row, col in cells:
+        edited[row][col] = "changed"
+    return edited
+
+
+def _seed(writer, graph, *sheets):
+    """Writes the sheets once so the writer holds their snapshots; forgets those batches."""
+    for name, values in sheets:
+        writer.queue("reports/daily.xlsx", name, values)
+    writer.flush()
+    graph.batches.clear()
+
+
+def test_changed_ranges_are_sent_in_one_batch(writer, graph):
+    first, second = _sheet(), _sheet()
+    _seed(writer, graph, ("Sheet1", first), ("Sheet2", second))
+
+    writer.queue("reports/daily.xlsx", "Sheet1", _edited(first, (1, 1), (40, 8)))
+    writer.queue("reports/daily.xlsx", "Sheet2", _edited(second, (3, 2)))
+    writer.queue("reports/daily.xlsx", "Sheet3", [])
+    results = writer.flush()
+
+    assert len(graph.batches) == 1
+    batch = graph.batches[0]
+    assert [_address(request) for request in batch] == ["Sheet1!B2", "Sheet1!I41", "Sheet2!C4"]
+    assert all(request["body"]["values"] == [["changed"]] for request in batch)
+    # Writes to the same workbook are chained
+    assert [request.get("dependsOn") for request in batch] == [None, ["0"], ["1"]]
+    assert {sheet: result["status"] for (_, sheet), result in results.items()} == {
+        "Sheet1": SUCCESS, "Sheet2": SUCCESS, "Sheet3": UNCHANGED}
+
+
+@pytest.mark.parametrize("status", [429, 424])
+def test_throttled_parts_are_retried_after_retry_after(writer, graph, sleeps, status):
+    sheet = _sheet()
+    _seed(writer, graph, ("Sheet1", sheet))
+    graph.statuses = [{"Sheet1!I41": (status, {"Retry-After": "7"})}]
+
+    result = writer.write("reports/daily.xlsx", "Sheet1", _edited(sheet, (1, 1), (40, 8)))
+
+    assert sleeps == [7.0]
+    assert [[_address(request) for request in batch] for batch in graph.batches] == [["Sheet1!B2", "Sheet1!I41"], ["Sheet1!I41"]]
+    assert result["status"] == SUCCESS
+    assert writer.stats()["retried"] == 1
+
+
+def test_snapshot_only_advances_for_sheets_written_in_full(writer, graph):
+    first, second = _sheet(), _sheet()
+    _seed(writer, graph, ("Sheet1", first), ("Sheet2", second))
+    new_first, new_second = _edited(first, (0, 0)), _edited(second, (0, 0), (45, 9))
+    graph.statuses = [{"Sheet2!J46": 400}]
+
+    writer.queue("reports/daily.xlsx", "Sheet1", new_first)
+    writer.queue("reports/daily.xlsx", "Sheet2", new_second)
+    results = writer.flush()
+    assert [result["status"] for result in results.values()] == [SUCCESS, FAILED]
+
+    # The same values again: the written sheet is up to date, the failed one is diffed against
+    # its last complete write, so both of its ranges are sent again
+    graph.batches.clear()
+    writer.queue("reports/daily.xlsx", "Sheet1", new_first)
+    writer.queue("reports/daily.xlsx", "Sheet2", new_second)
+    results = writer.flush()
+    assert [result["status"] for result in results.values()] == [UNCHANGED, SUCCESS]
+    assert [_address(request) for request in graph.batches[0]] == ["Sheet2!A1", "Sheet2!J46"]
@@ -0,0 +1,104 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from config import settings
+from src import outbox
+from src.http_client import IntegrationClient
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def _reply(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        with server.lock:
+            server.hits.append(self.command)
+            status = server.statuses.pop(0) if server.statuses else 200
+        if status == "slow":
+            time.sleep(0.5)
+            status = 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Stub server answering with the statuses queued in server.statuses (then 200)."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    httpd.lock = threading.Lock()
+    httpd.hits = []
+    httpd.statuses = []
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client():
+    client = IntegrationClient("test", read_timeout=0.2, max_retries=2, sleep=lambda delay: None)
+    yield client
+    client.close()
+
+
+def test_get_retries_5xx(server, client):
+    server.statuses = [503, 502]
+    assert client.get(server.url).status_code == 200
+    assert server.hits == ["GET"] * 3
+
+
+def test_post_is_not_retried_on_5xx(server, client):
+    server.statuses = [503]
+    assert client.post(server.url, json={}).status_code == 503
+    assert server.hits == ["POST"]
+
+
+def test_post_is_retried_on_429(server, client):
+    server.statuses = [429]
+    assert client.post(server.url, json={}).status_code == 200
+    assert server.hits == ["POST", "POST"]
+
+
+def test_post_is_not_retried_on_read_timeout(server, client):
+    server.statuses = ["slow"]
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post(server.url, json={})
+    assert server.hits == ["POST"]
+    assert client.stats()["retries"] == 0
+
+
+def test_post_is_retried_when_connection_refused(client):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(f"http://127.0.0.1:{port}/", json={})
+    assert client.stats()["attempts"] == 3
+
+
+def test_max_retries_override(server, client):
+    server.statuses = [429]
+    assert client.post(server.url, json={}, max_retries=0).status_code == 429
+    assert server.hits == ["POST"]
+
+
+def test_outbox_delivery_leaves_retries_to_the_outbox(server, monkeypatch):
+    monkeypatch.setitem(settings._snapshot.values, "TEAMS_WEBHOOK_URL", server.url)
+    server.statuses = [429]
+    with pytest.raises(requests.exceptions.HTTPError):
+        outbox._default_send_message("reminder", server.url)
+    assert server.hits == ["POST"]
@@ -0,0 +1,45 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from config import settings
+from src import integrations
+
+
+@pytest.fixture
+def fake_integration(monkeypatch):
+    """Registers a 'fake' integration enabled by FAKE_SETTING, backed by an importable module."""
+    module = types.ModuleType("src.fake_integration")
+    monkeypatch.setitem(sys.modules, "src.fake_integration", module)
+    integration = integrations.Integration("fake", ".fake_integration", "FAKE_SETTING", "test")
+    monkeypatch.setitem(integrations.REGISTRY, "fake", integration)
+    monkeypatch.setitem(integrations._import_locks, "fake", threading.Lock())
+    yield module
+    integrations._load_seconds.pop("fake", None)
+
+
+def test_disabled_integration_is_not_loaded(monkeypatch, fake_integration):
+    monkeypatch.setitem(settings._snapshot.values, "FAKE_SETTING", "")
+    with pytest.raises(integrations.IntegrationDisabled):
+        integrations.load("fake")
+    assert integrations.status()["fake"] == {"description": "test", "enabled": False, "loaded": False, "load_ms": None}
+
+
+def test_enabled_integration_is_loaded_and_timed(monkeypatch, fake_integration):
+    monkeypatch.setitem(settings._snapshot.values, "FAKE_SETTING", "on")
+    assert integrations.load("fake") is fake_integration
+    status = integrations.status()["fake"]
+    assert status["enabled"] and status["loaded"] and status["load_ms"] is not None
+
+
+def test_slow_import_does_not_block_other_integrations(monkeypatch, fake_integration):
+    # Another integration's import is in progress (its lock is held)
+    monkeypatch.setitem(settings._snapshot.values, "FAKE_SETTING", "on")
+    with integrations._import_locks[integrations.VOICE_MATCHER]:
+        loaded = []
+        thread = threading.Thread(target=lambda: loaded.append(integrations.load("fake")))
+        thread.start()
+        thread.join(5)
+        assert loaded == [fake_integration]
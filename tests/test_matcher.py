@@ -0,0 +1,46 @@
+import pytest
+
+from src.voice.matcher import OptionMatcher
+
+OPTIONS = [
+    {"value": "完了", "aliases": ["かんりょう", "はい", "終わりました", "おわりました"]},
+    {"value": "未完了", "aliases": ["みかんりょう", "いいえ", "まだです"]},
+]
+
+
+@pytest.fixture
+def matcher():
+    return OptionMatcher(OPTIONS)
+
+
+@pytest.mark.parametrize("text, value", [
+    ("完了", "完了"),
+    ("カンリョウ", "完了"),
+    ("hai", "完了"),
+    ("終わりました。", "完了"),
+    ("はい、完了です", "完了"),
+    ("kanryou desu", "完了"),
+    ("未完了です", "未完了"),
+    ("はい 未完了 です", "未完了"),
+    ("いいえまだです", "未完了"),
+    ("かんりよう", "完了"),
+])
+def test_maps_answers_to_options(matcher, text, value):
+    assert matcher.match(text).value == value
+
+
+@pytest.mark.parametrize("text", ["はいってない", "完了していません", "わかりません", ""])
+def test_option_inside_another_word_is_not_a_match(matcher, text):
+    assert matcher.match(text) is None
+
+
+def test_whole_word_beats_part_of_a_word(matcher):
+    match = matcher.match("はい 未完了 です")
+    assert (match.form, match.score) == ("未完了", 0.95)
+    assert matcher.match("未完了です").score < 0.95
+
+
+def test_many_options_are_told_apart():
+    matcher = OptionMatcher([f"オプション{i}番目の選択肢" for i in range(2000)])
+    for i in (0, 7, 1234, 1999):
+        assert matcher.match(f"おぷしょん{i}番目の選択し").value == f"オプション{i}番目の選択肢"
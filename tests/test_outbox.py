@@ -0,0 +1,114 @@
+import requests
+
+from models import Notification, OutboxMessage, TeamsPost
+from src.outbox import FAILED, PENDING, SENT, OutboxDispatcher, enqueue_teams_message
+
+WEBHOOK = "https://example.invalid/webhook/a"
+OTHER_WEBHOOK = "https://example.invalid/webhook/b"
+
+
+class _Teams:
+    """Records what the dispatcher sends; raises `error` instead if set."""
+    def __init__(self):
+        self.messages = []
+        self.cards = []
+        self.error = None
+
+    def send_message(self, message, webhook_url):
+        if self.error:
+            raise self.error
+        self.messages.append((message, webhook_url))
+
+    def send_card(self, title, lines, webhook_url):
+        if self.error:
+            raise self.error
+        self.cards.append((title, list(lines), webhook_url))
+
+
+def _enqueue(session_factory, schedule_id, messages):
+    session = session_factory()
+    try:
+        for message, webhook_url in messages:
+            enqueue_teams_message(session, schedule_id, message, webhook_url)
+        session.commit()
+    finally:
+        session.close()
+
+
+def _statuses(session_factory, model=OutboxMessage):
+    session = session_factory()
+    try:
+        return [row.status for row in session.query(model).order_by(model.id)]
+    finally:
+        session.close()
+
+
+def _dispatcher(session_factory, teams, **options):
+    options = {"merge_window": 0, "rate_per_webhook": 100, "burst": 10, **options}
+    return OutboxDispatcher(session_factory, send_message=teams.send_message, send_card=teams.send_card, **options)
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code}", response=response)
+
+
+def test_messages_to_one_webhook_are_merged_into_a_card(session_factory, schedule_id):
+    teams = _Teams()
+    _enqueue(session_factory, schedule_id, [("a", WEBHOOK), ("b", WEBHOOK), ("c", WEBHOOK), ("d", OTHER_WEBHOOK)])
+    assert _dispatcher(session_factory, teams).dispatch_once() == 0.0
+
+    assert teams.cards == [("リマインダー (3件)", ["a", "b", "c"], WEBHOOK)]
+    assert teams.messages == [("d", OTHER_WEBHOOK)]
+    assert _statuses(session_factory) == [SENT] * 4
+    assert _statuses(session_factory, Notification) == ["SUCCESS"] * 4
+    assert _statuses(session_factory, TeamsPost) == ["SUCCESS"] * 4
+
+
+def test_merge_window_holds_fresh_messages(session_factory, schedule_id):
+    teams = _Teams()
+    _enqueue(session_factory, schedule_id, [("a", WEBHOOK)])
+    delay = _dispatcher(session_factory, teams, merge_window=60).dispatch_once()
+    assert 0 < delay <= 60
+    assert teams.messages == [] and _statuses(session_factory) == [PENDING]
+
+
+def test_webhook_is_rate_limited(session_factory, schedule_id):
+    teams = _Teams()
+    _enqueue(session_factory, schedule_id, [(str(i), WEBHOOK) for i in range(12)])
+    dispatcher = _dispatcher(session_factory, teams, max_merge=5, rate_per_webhook=0.01, burst=2)
+    dispatcher.dispatch_once()
+
+    # Two tokens: two cards of five, the last two messages wait for the bucket to refill
+    assert [len(lines) for _, lines, _ in teams.cards] == [5, 5]
+    assert _statuses(session_factory) == [SENT] * 10 + [PENDING] * 2
+    assert dispatcher.stats()["rate_limited"] == 1
+    assert dispatcher.dispatch_once() > 0
+    assert len(teams.cards) == 2
+
+
+def test_server_errors_are_retried_and_rejected_webhooks_fail(session_factory, schedule_id):
+    teams = _Teams()
+    dispatcher = _dispatcher(session_factory, teams, retry_base=60)
+    _enqueue(session_factory, schedule_id, [("a", WEBHOOK)])
+    teams.error = _http_error(503)
+    dispatcher.dispatch_once()
+    assert _statuses(session_factory) == [PENDING]
+
+    _enqueue(session_factory, schedule_id, [("b", OTHER_WEBHOOK)])
+    teams.error = _http_error(404)
+    dispatcher.dispatch_once()
+    assert _statuses(session_factory) == [PENDING, FAILED]
+    assert _statuses(session_factory, Notification) == [PENDING, FAILED]
+
+
+def test_gives_up_after_max_attempts(session_factory, schedule_id):
+    teams = _Teams()
+    teams.error = _http_error(503)
+    dispatcher = _dispatcher(session_factory, teams, max_attempts=2, retry_base=0)
+    _enqueue(session_factory, schedule_id, [("a", WEBHOOK)])
+    dispatcher.dispatch_once()
+    dispatcher.dispatch_once()
+    assert _statuses(session_factory) == [FAILED]
+    assert dispatcher.stats()["retried"] == 1 and dispatcher.stats()["failed"] == 1
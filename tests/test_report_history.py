@@ -0,0 +1,63 @@
+import datetime
+
+from sqlalchemy import text
+
+from db import SessionLocal, engine, normalize_sqlite_timestamps
+from models import ReportHistory, Schedule
+
+NOON = datetime.datetime(2026, 3, 1, 12, 0)
+
+
+def _schedule_with_history():
+    """A schedule whose history mixes ORM rows and server-default style rows (no fraction) at the same instants."""
+    session = SessionLocal()
+    try:
+        schedule = Schedule(description="history", interval_minutes=60, is_active=False)
+        session.add(schedule)
+        session.flush()
+        for seconds in (0, 0, 1, 1, 2):
+            session.add(ReportHistory(schedule_id=schedule.id, completed_at=NOON + datetime.timedelta(seconds=seconds)))
+        for seconds in (0, 1, 2):
+            session.execute(text("INSERT INTO report_history (schedule_id, completed_at) VALUES (:schedule_id, :completed_at)"),
+                            {"schedule_id": schedule.id, "completed_at": f"2026-03-01 12:00:0{seconds}"})
+        session.commit()
+        return schedule.id
+    finally:
+        session.close()
+
+
+def _ids_newest_first(schedule_id):
+    session = SessionLocal()
+    try:
+        rows = session.query(ReportHistory).filter(ReportHistory.schedule_id == schedule_id).all()
+        return [row.id for row in sorted(rows, key=lambda row: (row.completed_at, row.id), reverse=True)]
+    finally:
+        session.close()
+
+
+def test_normalize_rewrites_short_timestamps(app_client):
+    schedule_id = _schedule_with_history()
+    assert normalize_sqlite_timestamps(ReportHistory.completed_at, engine) >= 3
+    with engine.connect() as connection:
+        stored = connection.execute(text("SELECT DISTINCT completed_at FROM report_history WHERE schedule_id = :id ORDER BY 1"),
+                                    {"id": schedule_id}).scalars().all()
+    assert stored == [f"2026-03-01 12:00:0{seconds}.000000" for seconds in (0, 1, 2)]
+
+
+def test_pages_follow_the_datetime_order(app_client):
+    schedule_id = _schedule_with_history()
+    normalize_sqlite_timestamps(ReportHistory.completed_at, engine)
+
+    seen, cursor = [], None
+    while True:
+        query = {"schedule_id": schedule_id, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = app_client.get("/api/report_history", query_string=query).json
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == _ids_newest_first(schedule_id)
+
+
+def test_bad_cursor_is_rejected(app_client):
+    assert app_client.get("/api/report_history", query_string={"cursor": "not-a-cursor"}).status_code == 400
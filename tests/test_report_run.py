@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from src import executor, jobs
+
+
+class _Recorder:
+    """Builds fake actions and records the order they finish in."""
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def action(self, name, delay=0.0, result=True):
+        def run(*args):
+            time.sleep(delay)
+            with self._lock:
+                self.calls.append(name)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return run
+
+
+@pytest.fixture
+def actions(monkeypatch):
+    action_executor = executor.ActionExecutor()
+    monkeypatch.setattr(executor, "get_action_executor", lambda: action_executor)
+    monkeypatch.setattr(jobs, "notify_report_completed", lambda schedule_id: None)
+    yield _Recorder()
+    action_executor.shutdown()
+
+
+def test_actions_run_in_order_even_when_the_first_is_slow(actions, monkeypatch):
+    monkeypatch.setattr(jobs, "play_alert_sound", actions.action("alert", delay=0.2))
+    monkeypatch.setattr(jobs, "open_local_file", actions.action("excel"))
+    monkeypatch.setattr(jobs, "open_google_form", actions.action("form"))
+
+    outcomes = jobs.run_report(1, "report.xlsx", "https://example.invalid/form", wait=True, timeout=5)
+
+    assert actions.calls == ["alert", "excel", "form"]
+    assert outcomes == {executor.ALERT_SOUND: jobs.ACTION_SUCCESS, executor.EXCEL: jobs.ACTION_SUCCESS,
+                        executor.GOOGLE_FORM: jobs.ACTION_SUCCESS, executor.VOICE_REPORT: jobs.ACTION_SKIPPED}
+
+
+def test_failed_action_does_not_stop_the_run(actions, monkeypatch):
+    monkeypatch.setattr(jobs, "play_alert_sound", actions.action("alert", result=RuntimeError("no audio")))
+    monkeypatch.setattr(jobs, "open_local_file", actions.action("excel", result=False))
+    monkeypatch.setattr(jobs, "open_google_form", actions.action("form"))
+
+    outcomes = jobs.run_report(1, "report.xlsx", "https://example.invalid/form", wait=True, timeout=5)
+
+    assert actions.calls == ["alert", "excel", "form"]
+    assert outcomes[executor.ALERT_SOUND] == jobs.ACTION_FAILED
+    assert outcomes[executor.EXCEL] == jobs.ACTION_FAILED
+    assert outcomes[executor.GOOGLE_FORM] == jobs.ACTION_SUCCESS
+
+
+def test_unconfigured_actions_are_skipped_and_caller_is_not_blocked(actions, monkeypatch):
+    monkeypatch.setattr(jobs, "play_alert_sound", actions.action("alert", delay=0.2))
+    monkeypatch.setattr(jobs, "open_google_form", actions.action("form"))
+
+    started = time.monotonic()
+    outcomes = jobs.run_report(1, None, "https://example.invalid/form")
+
+    assert time.monotonic() - started < 0.1
+    assert outcomes == {executor.ALERT_SOUND: jobs.ACTION_PENDING, executor.EXCEL: jobs.ACTION_SKIPPED,
+                        executor.GOOGLE_FORM: jobs.ACTION_PENDING, executor.VOICE_REPORT: jobs.ACTION_SKIPPED}
+
+
+class _VoiceReport:
+    """Voice report set up with one question; the dialog answers "はい"."""
+    def __init__(self, monkeypatch, session_factory):
+        from config import settings
+        from src import google_forms
+        from src.voice import matcher
+
+        self.dialogs = 0
+        mapper = matcher.AnswerMapper([{"prompt": "完了しましたか？", "entry": "GOOGLE_ENTRY_1",
+                                        "options": [{"value": "完了", "aliases": ["はい"]}, "未完了"]}])
+        monkeypatch.setattr(matcher, "load_answer_mapper", lambda: mapper)
+        monkeypatch.setitem(settings._snapshot.values, "GOOGLE_FORM_ID", "form")
+        monkeypatch.setattr(google_forms, "form_data", lambda responses: {f"entry.{key}": value for key, value in responses.items()})
+        monkeypatch.setattr(jobs, "voice_dialog_job", self.dialog)
+        monkeypatch.setattr(jobs, "SessionLocal", session_factory)
+        monkeypatch.setattr(jobs, "VOICE_REPORT_ENABLED", True)
+        monkeypatch.setattr(jobs, "play_alert_sound", lambda schedule_id: True)
+
+    def dialog(self, schedule_id, prompts, answer_mapper):
+        self.dialogs += 1
+        return {prompt: "はい" for prompt in prompts}
+
+
+def _submissions(session_factory):
+    from models import FormSubmission
+
+    session = session_factory()
+    try:
+        return [(row.schedule_id, row.status, row.payload_json) for row in session.query(FormSubmission)]
+    finally:
+        session.close()
+
+
+def test_fired_run_queues_exactly_one_form_submission(actions, monkeypatch, session_factory, schedule_id):
+    import pytz
+    from datetime import datetime
+
+    from src import events
+    from src.cron_dispatch import CronDispatcher
+
+    voice = _VoiceReport(monkeypatch, session_factory)
+    finished = threading.Event()
+
+    def on_finished(**_):
+        finished.set()
+
+    events.bus.subscribe(events.REPORT_RUN_FINISHED, on_finished)
+    try:
+        tokyo = pytz.timezone("Asia/Tokyo")
+        dispatcher = CronDispatcher(tokyo, submit=lambda fn, *args: fn(*args), run=jobs.run_report)
+        dispatcher.set(schedule_id, "0 9 * * *", [schedule_id, None, None], now=tokyo.localize(datetime(2026, 10, 19, 8, 59)))
+        dispatcher.tick(now=tokyo.localize(datetime(2026, 10, 19, 9, 0)))
+        assert finished.wait(5)
+        assert _submissions(session_factory) == [(schedule_id, "PENDING", '{"entry.GOOGLE_ENTRY_1": "完了"}')]
+
+        # The same run again (e.g. retried after a crash) does not queue a second submission
+        assert jobs.report_job(schedule_id, run_key=tokyo.localize(datetime(2026, 10, 19, 9, 0))) is True
+        assert len(_submissions(session_factory)) == 1
+
+        # The next fire is a new run
+        finished.clear()
+        dispatcher.tick(now=tokyo.localize(datetime(2026, 10, 20, 9, 0)))
+        assert finished.wait(5)
+        assert len(_submissions(session_factory)) == 2
+        assert voice.dialogs == 3
+    finally:
+        events.bus.unsubscribe(events.REPORT_RUN_FINISHED, on_finished)
@@ -0,0 +1,121 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from src.sse import SSEBroker, SSEServer
+
+
+@pytest.fixture
+def broker():
+    return SSEBroker(max_clients=500)
+
+
+@pytest.fixture
+def server(broker):
+    server = SSEServer(broker, port=0, heartbeat_seconds=0.2)
+    server.start()
+    yield server
+    server.stop()
+
+
+def _open(server, last_event_id=None):
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    header = f"Last-Event-ID: {last_event_id}\r\n" if last_event_id is not None else ""
+    sock.sendall(f"GET /stream HTTP/1.1\r\nHost: localhost\r\n{header}\r\n".encode())
+    return sock
+
+
+def _read_until(sock, marker: bytes, received=b"") -> bytes:
+    deadline = time.monotonic() + 5
+    while marker not in received:
+        assert time.monotonic() < deadline, f"{marker!r} not received: {received!r}"
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        received += chunk
+    return received
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_streams_events_with_ids(broker, server):
+    sock = _open(server)
+    try:
+        head = _read_until(sock, b"retry: 3000\n\n")
+        assert head.startswith(b"HTTP/1.1 200 OK\r\n")
+        assert b"Content-Type: text/event-stream" in head
+        _wait_for(lambda: broker.client_count == 1)
+        event_id = broker.publish("report_completed", {"schedule_id": 7})
+        received = _read_until(sock, b'{"schedule_id": 7}\n\n')
+        assert f"id: {event_id}\nevent: report_completed\n".encode() in received
+        assert b": heartbeat" in _read_until(sock, b": heartbeat")
+    finally:
+        sock.close()
+    _wait_for(lambda: broker.client_count == 0)
+
+
+def test_last_event_id_replays_missed_events(broker, server):
+    first = broker.publish("schedule_changed", {"n": 1})
+    broker.publish("schedule_changed", {"n": 2})
+    broker.publish("schedule_changed", {"n": 3})
+    sock = _open(server, last_event_id=first)
+    try:
+        received = _read_until(sock, b'{"n": 3}')
+        assert b'{"n": 1}' not in received and b'{"n": 2}' in received
+    finally:
+        sock.close()
+
+
+def test_many_clients_share_one_thread(broker, server):
+    threads_before = threading.active_count()
+    sockets = [_open(server) for _ in range(200)]
+    try:
+        for sock in sockets:
+            _read_until(sock, b"retry:")
+        _wait_for(lambda: broker.client_count == 200)
+        assert threading.active_count() == threads_before
+        broker.publish("alert_triggered", {"schedule_id": 1})
+        for sock in sockets:
+            _read_until(sock, b"alert_triggered")
+    finally:
+        for sock in sockets:
+            sock.close()
+    _wait_for(lambda: broker.client_count == 0)
+
+
+def test_client_limit_is_a_safety_valve(server):
+    server.broker.max_clients = 1
+    first = _open(server)
+    try:
+        _read_until(first, b"retry:")
+        second = _open(server)
+        try:
+            assert _read_until(second, b"\r\n\r\n").startswith(b"HTTP/1.1 503")
+        finally:
+            second.close()
+    finally:
+        first.close()
+
+
+def test_other_paths_are_not_found(server):
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    try:
+        sock.sendall(b"GET /api/schedules HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        assert _read_until(sock, b"\r\n\r\n").startswith(b"HTTP/1.1 404")
+    finally:
+        sock.close()
+
+
+def test_app_hands_stream_over_to_sse_server(app_client):
+    from src.app import sse_server
+
+    response = app_client.get("/stream", headers={"Last-Event-ID": "12"})
+    assert response.status_code == 307
+    assert response.headers["Location"] == f"http://localhost:{sse_server.port}/stream?last_event_id=12"
@@ -0,0 +1,66 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from src.voice import tts
+
+
+class FakeEngine:
+    """Records the thread of every engine call."""
+    def __init__(self, calls):
+        self.calls = calls
+        self.calls.append(("init", threading.get_ident()))
+
+    def setProperty(self, name, value):
+        self.calls.append(("setProperty", threading.get_ident()))
+
+    def say(self, text):
+        self.calls.append(("say", threading.get_ident()))
+
+    def save_to_file(self, text, path):
+        self.calls.append(("save_to_file", threading.get_ident()))
+        with open(path, "wb") as f:
+            f.write(b"RIFF")
+
+    def runAndWait(self):
+        self.calls.append(("runAndWait", threading.get_ident()))
+
+
+@pytest.fixture
+def engine_calls(monkeypatch):
+    calls = []
+    monkeypatch.setitem(sys.modules, "pyttsx3", types.SimpleNamespace(init=lambda: FakeEngine(calls)))
+    monkeypatch.setattr(tts, "_engine", None)
+    return calls
+
+
+def _in_thread(fn, *args):
+    thread = threading.Thread(target=fn, args=args)
+    thread.start()
+    thread.join(5)
+
+
+def test_engine_is_created_and_used_on_one_thread(engine_calls, monkeypatch):
+    monkeypatch.setattr(tts, "TTS_CACHE_ENABLED", False)
+    _in_thread(tts.init_engine)          # warmup thread
+    _in_thread(tts.tts_play, "こんにちは")  # dialog thread
+    tts.tts_play("もう一度")               # another caller
+
+    names = [name for name, _ in engine_calls]
+    assert names.count("init") == 1
+    assert names.count("say") == 2
+    threads = {ident for _, ident in engine_calls}
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+
+
+def test_cache_render_runs_on_the_tts_thread(engine_calls, tmp_path):
+    cache = tts.TTSCache(str(tmp_path), max_bytes=1024)
+    path = cache.render("本日の作業は完了しましたか？")
+
+    assert open(path, "rb").read() == b"RIFF"
+    assert cache.get("本日の作業は完了しましたか？") == path
+    assert len({ident for _, ident in engine_calls}) == 1
+    assert threading.get_ident() not in {ident for _, ident in engine_calls}